@@ -1,20 +1,34 @@
+import json
+
 from agents import Agent, RunContextWrapper, Runner, function_tool
 
 from app.ai.contexts.research_scope_context import ResearchScopeContext
 from app.ai.prompts.agents_prompts import KEYWORD_GENERATOR_PROMPT
 from app.models.keyword_model import Keyword
 from app.models.research_trace_model import ResearchTrace
-from app.utils.agent_utils import PrintHooks
+from app.utils.agent_input import AGENT_INPUT_MAX_TOKENS, InputSection, agent_run_config, assemble_input, \
+    json_items, scope_text
+from app.utils.agent_utils import LogHooks
+from app.utils.logger import setup_logger
+from app.utils.report_input import rank_traces
 from app.utils.research_utils import research_event
+from app.utils.tracing import stage
+
+logger = setup_logger(__name__)
 
 keyword_agent = Agent[ResearchScopeContext](
     name="keyword_agent",
     instructions=KEYWORD_GENERATOR_PROMPT,
-    hooks=PrintHooks("Keyword Agent"),
+    hooks=LogHooks("Keyword Agent"),
     model="o4-mini"
 )
 
 
+def summarise_keywords(dropped: list[str]) -> str:
+    """Older keywords that didn't fit, by name only, so they aren't searched again."""
+    return f"Also searched before: {'; '.join(json.loads(item)['search_keyword'] for item in dropped)}"
+
+
 @function_tool
 async def spawn_keyword_agent(context: RunContextWrapper[ResearchScopeContext], instructions: str) -> str:
     """
@@ -22,67 +36,57 @@ async def spawn_keyword_agent(context: RunContextWrapper[ResearchScopeContext],
     """
     research_event(context.context.research_id, "planning")
     
-    res = ResearchTrace.find({'research_id': context.context.research_id, 'is_relevant': True})
-    research_history = [
-        {
-            'search_keyword': doc.get('search_keyword'),
-            'relevant_parts': doc.get('relevant_parts'),
-            'legal_provisions': doc.get('legal_provisions')
-        }
-        for doc in res
-    ] if res else "No relevant results found"
-    
-    keyword_history = Keyword.find({'research_id': context.context.research_id})
-    keyword_history = [
-        {
-            'search_keyword': doc.get('search_keyword'),
-            'analysed_results': doc.get('analysed_results'),
-            'relevant_results': doc.get('relevant_results'),
-        }
-        for doc in keyword_history
-    ] if keyword_history else "No keyword history yet"
+    scope = context.context
+    query = ' '.join(filter(None, [scope.problem_description, scope.question]))
+    # Histories are kept by relevance and recency but sent in creation order, so consecutive calls share a prefix
+    traces = ResearchTrace.find({'research_id': scope.research_id, 'is_relevant': True}, sort=[('_id', 1)])
+    trace_positions = {id(trace): position for position, trace in enumerate(traces)}
+    research_history = rank_traces(traces, query)
+    # Most recent first, they matter most for choosing the next keyword
+    keyword_history = list(reversed(Keyword.find({'research_id': scope.research_id}, sort=[('_id', 1)])))
+
+    agent_input = assemble_input([
+        InputSection('scope', [scope_text(scope)], required=True),
+        InputSection(
+            'research_history',
+            json_items([
+                {
+                    'search_keyword': doc.get('search_keyword'),
+                    'relevant_parts': doc.get('relevant_parts'),
+                    'legal_provisions': doc.get('legal_provisions')
+                }
+                for doc in research_history
+            ]),
+            positions=[trace_positions[id(doc)] for doc in research_history],
+            title="Relevant court cases:",
+            empty="No relevant results found",
+            priority=1,
+        ),
+        InputSection(
+            'keyword_history',
+            json_items([
+                {
+                    'search_keyword': doc.get('search_keyword'),
+                    'analysed_results': doc.get('analysed_results'),
+                    'relevant_results': doc.get('relevant_results'),
+                }
+                for doc in keyword_history
+            ]),
+            positions=list(range(len(keyword_history) - 1, -1, -1)),
+            title="Keyword history:",
+            empty="No keyword history yet",
+            summarise=summarise_keywords,
+        ),
+        InputSection('instructions', [instructions], required=True),
+    ], AGENT_INPUT_MAX_TOKENS['keyword_agent'])
+    logger.info(f"Keyword agent input: {agent_input.report()}")
     
-    res = await Runner.run(
-        starting_agent=keyword_agent,
-        input=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "input_text",
-                        "text": context.context.model_dump_json(exclude={'research_id'})
-                    }
-                ]
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "input_text",
-                        "text": f"Relevant court cases: {research_history}"
-                    }
-                ]
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "input_text",
-                        "text": f"Keyword history: {keyword_history}"
-                    }
-                ]
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "input_text",
-                        "text": instructions
-                    }
-                ]
-            }
-        ],
-        context=context.context,
-    )
+    with stage('keywords', context, input_tokens=agent_input.tokens):
+        res = await Runner.run(
+            starting_agent=keyword_agent,
+            input=agent_input.messages,
+            context=context.context,
+            run_config=agent_run_config(keyword_agent.name, scope),
+        )
     
     return res.final_output
\ No newline at end of file
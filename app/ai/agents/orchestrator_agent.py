@@ -6,7 +6,7 @@ from app.ai.contexts.research_scope_context import ResearchScopeContext, set_res
 from app.ai.function_tools.get_search_results_tool import get_research_results
 from app.ai.function_tools.search_results_tool import search_results
 from app.ai.prompts.agents_prompts import ORCHESTRATOR_PROMPT
-from app.utils.agent_utils import PrintHooks
+from app.utils.agent_utils import LogHooks
 
 orchestrator_agent = Agent[ResearchScopeContext](
     name="orchestrator_agent",
@@ -18,6 +18,6 @@ orchestrator_agent = Agent[ResearchScopeContext](
         get_research_results,
         spawn_report_agent,
     ],
-    hooks=PrintHooks("Orchestrator Agent"),
+    hooks=LogHooks("Orchestrator Agent"),
     model="o4-mini"
 )
\ No newline at end of file
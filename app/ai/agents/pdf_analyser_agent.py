@@ -7,7 +7,7 @@ from pydantic import BaseModel, Field
 
 from app.ai.contexts.research_scope_context import ResearchScopeContext
 from app.ai.prompts.agents_prompts import PDF_ANALYSER_PROMPT
-from app.utils.agent_utils import PrintHooks
+from app.utils.agent_utils import LogHooks
 
 
 class PDFAnalyserResult(BaseModel):
@@ -22,6 +22,6 @@ pdf_analyser_agent = Agent[ResearchScopeContext](
     name="pdf_analyser_agent",
     instructions=PDF_ANALYSER_PROMPT,
     output_type=PDFAnalyserResult,
-    hooks=PrintHooks("PDF Analyser Agent"),
+    hooks=LogHooks("PDF Analyser Agent", sampled=True),
     model="gpt-4.1"
 )
\ No newline at end of file
@@ -1,16 +1,17 @@
-import base64
 import os
 
 from agents import Agent, RunContextWrapper, Runner, function_tool
 
 from app.ai.contexts.research_scope_context import ResearchScopeContext
 from app.ai.prompts.agents_prompts import PDF_READER_PROMPT
-from app.utils.agent_utils import PrintHooks
+from app.utils.agent_input import agent_run_config, scope_text
+from app.utils.agent_utils import LogHooks
+from app.utils.pdf_text import pdf_input_content
 
 pdf_reader_agent = Agent[ResearchScopeContext](
     name="pdf_reader_agent",
     instructions=PDF_READER_PROMPT,
-    hooks=PrintHooks("PDF Reader Agent"),
+    hooks=LogHooks("PDF Reader Agent"),
     model="gpt-4.1"
 )
 
@@ -23,42 +24,37 @@ async def spawn_pdf_reader_agent(context: RunContextWrapper[ResearchScopeContext
     with open(pdf_path, "rb") as f:
         pdf_content = f.read()
         
-    pdf_content = base64.b64encode(pdf_content).decode("utf-8")
-    filename = os.path.basename(pdf_path)
+    pdf_content = await pdf_input_content(os.path.basename(pdf_path), pdf_content, instructions)
         
     res = await Runner.run(
         starting_agent=pdf_reader_agent,
+        # The scope and the PDF stay the same between questions about it, so they go before the question
         input=[
             {
                 "role": "user",
                 "content": [
                     {
                         "type": "input_text",
-                        "text": context.context.model_dump_json(exclude={'research_id'})
+                        "text": scope_text(context.context)
                     }
                 ]
             },
             {
                 "role": "user",
-                "content": [
-                    {
-                        "type": "input_text",
-                        "text": instructions
-                    }
-                ]
+                "content": pdf_content
             },
             {
                 "role": "user",
                 "content": [
                     {
-                        "type": "input_file",
-                        "filename": filename,   
-                        "file_data": f"data:application/pdf;base64,{pdf_content}",
+                        "type": "input_text",
+                        "text": instructions
                     }
                 ]
             }
         ],
         context=context.context,
+        run_config=agent_run_config(pdf_reader_agent.name, context.context),
     )
     
     return res.final_output
\ No newline at end of file
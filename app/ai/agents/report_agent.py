@@ -1,27 +1,36 @@
-import base64
+from typing import Optional
 
-import requests
-from agents import Agent, RunContextWrapper, Runner, function_tool
+from agents import Agent, RunConfig, RunContextWrapper, Runner, Tool, function_tool
 
 from app.ai.agents.law_agent import law_agent
 from app.ai.contexts.research_scope_context import ResearchScopeContext
 from app.ai.prompts.agents_prompts import REPORT_AGENT_PROMPT
-from app.config.core import API_URL
 from app.models.research_model import Research
-from app.models.research_trace_model import ResearchTrace
-from app.utils.agent_utils import PrintHooks
+from app.utils.agent_input import AGENT_INPUT_MAX_TOKENS, InputSection, agent_run_config, assemble_input, \
+    item_tokens, scope_text
+from app.utils.agent_utils import LogHooks
+from app.utils.logger import setup_logger
+from app.utils.report_input import build_report_input
 from app.utils.research_utils import research_event
+from app.utils.tokenisor import MESSAGE_OVERHEAD_TOKENS
+from app.utils.tracing import stage
+
+logger = setup_logger(__name__)
+
+
+def law_agent_tool(run_config: Optional[RunConfig] = None) -> Tool:
+    return law_agent.as_tool(
+        tool_name="law_agent",
+        tool_description="A tool to lookup Slovak laws and legal provisions.",
+        run_config=run_config,
+    )
+
 
 report_agent = Agent[ResearchScopeContext](
     name="report_agent",
     instructions=REPORT_AGENT_PROMPT,
-    hooks=PrintHooks("Report Agent"),
-    tools=[
-        law_agent.as_tool(
-            tool_name="law_agent",
-            tool_description="A tool to lookup Slovak laws and legal provisions.",
-        ),
-    ],
+    hooks=LogHooks("Report Agent"),
+    tools=[law_agent_tool()],
     model="o4-mini"
 )
 
@@ -33,69 +42,34 @@ async def spawn_report_agent(context: RunContextWrapper[ResearchScopeContext], i
     """
     research_event(context.context.research_id, "writing_report")
     
-    research_results = ResearchTrace.find({'research_id': context.context.research_id})
-    research_results = [
-        {
-            'metadata': doc.get('metadata'),
-            'pdf_file_name': doc.get('pdf_file_name'),
-        }
-        for doc in research_results
-    ] 
-    
-    input_data = []
-    for doc in research_results:
-        response = requests.get(
-            f"{API_URL}/pdf/{doc.get('pdf_file_name')}",
-            proxies={'http': None, 'https': None}, 
-            timeout=30
+    scope = scope_text(context.context)
+    query = ' '.join(filter(None, [context.context.problem_description, context.context.question, instructions]))
+    max_tokens = AGENT_INPUT_MAX_TOKENS['report_agent']
+    # Cases get what the scope and instructions leave of the budget
+    with stage('report input', context) as span:
+        report_input = await build_report_input(
+            context.context.research_id, query,
+            max_tokens=max_tokens - sum(item_tokens([scope, instructions])) - 3 * MESSAGE_OVERHEAD_TOKENS,
         )
-        response.raise_for_status()
-        pdf_content = response.content
-        pdf_content = base64.b64encode(pdf_content).decode("utf-8")
-        filename = doc.get('pdf_file_name')
+        if span:
+            span.set(cases=report_input.cases, tokens=report_input.tokens)
+    agent_input = assemble_input([
+        InputSection('scope', [scope], required=True),
+        InputSection('cases', report_input.content, empty="No relevant results found. Respond with error message."),
+        InputSection('instructions', [instructions], required=True),
+    ], max_tokens)
+    logger.info(f"Report agent input: {agent_input.report()}, cases by level {report_input.levels}")
         
-        input_data.append({
-            "type": "input_file",
-            "filename": filename,
-            "file_data": f"data:application/pdf;base64,{pdf_content}",
-        })
-        
-    append_input_data = input_data if input_data else [
-        {
-            "type": "input_text",
-            "text": "No relevant results found. Respond with error message."
-        }
-    ]
-        
-    res = await Runner.run(
-        starting_agent=report_agent,
-        input=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "input_text",
-                        "text": context.context.model_dump_json(exclude={'research_id'})
-                    }
-                ]
-            },
-            {
-                "role": "user",
-                "content": append_input_data
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "input_text",
-                        "text": instructions
-                    }
-                ]
-            }
-        ],
-        context=context.context,
-        max_turns=20,
-    )
+    with stage('report', context, input_tokens=agent_input.tokens):
+        # The law agent runs with its own run config, the model provider is only known at run time
+        agent = report_agent.clone(tools=[law_agent_tool(agent_run_config(law_agent.name, context.context))])
+        res = await Runner.run(
+            starting_agent=agent,
+            input=agent_input.messages,
+            context=context.context,
+            max_turns=20,
+            run_config=agent_run_config(report_agent.name, context.context),
+        )
     
     # Set report as research result
     if research := Research.find_by_id(context.context.research_id):
@@ -5,7 +5,7 @@ from pydantic import BaseModel, Field
 
 from app.ai.contexts.research_scope_context import ResearchScopeContext
 from app.ai.prompts.agents_prompts import RESULTS_ANALYSER_PROMPT
-from app.utils.agent_utils import PrintHooks
+from app.utils.agent_utils import LogHooks
 
 
 class ResultsAnalyserResult(BaseModel):
@@ -16,6 +16,6 @@ results_analyser_agent = Agent[ResearchScopeContext](
     name="results_analyser_agent",
     instructions=RESULTS_ANALYSER_PROMPT,
     output_type=ResultsAnalyserResult,
-    hooks=PrintHooks("Results Analyser Agent"),
+    hooks=LogHooks("Results Analyser Agent"),
     model="o4-mini"
 )
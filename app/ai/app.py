@@ -7,6 +7,7 @@ from agents import Runner, trace
 from app.ai.agents.orchestrator_agent import orchestrator_agent
 from app.ai.contexts.research_scope_context import ResearchScopeContext
 from app.config.config import load_env
+from app.utils.agent_input import agent_run_config
 
 # Initialize colorama for cross-platform color support
 init(autoreset=True)
@@ -24,6 +25,7 @@ async def main():
             input=msg,
             max_turns=40,
             context=context,
+            run_config=agent_run_config(orchestrator_agent.name),
         )
         
     print(f"\033[32m{result}\033[0m")
@@ -2,6 +2,8 @@ from agents import RunContextWrapper, function_tool
 
 from app.ai.contexts.research_scope_context import ResearchScopeContext
 from app.models.research_trace_model import ResearchTrace
+from app.utils.agent_input import AGENT_INPUT_MAX_TOKENS, fit_items, json_items
+from app.utils.report_input import rank_traces
 from app.utils.research_utils import research_event
 
 
@@ -11,12 +13,16 @@ async def get_research_results(context: RunContextWrapper[ResearchScopeContext])
     Get the research result for a given research ID.
     """
     research_event(context.context.research_id, "planning")
-    res = ResearchTrace.find({'research_id': context.context.research_id})
+    scope = context.context
+    res = rank_traces(
+        ResearchTrace.find({'research_id': scope.research_id, 'is_relevant': True}),
+        ' '.join(filter(None, [scope.problem_description, scope.question])),
+    )
     
     if not res:
         return "No relevant results found"
     
-    return [
+    results = [
         {
             'search_keyword': doc.search_keyword,
             'metadata': doc.metadata,
@@ -26,4 +32,9 @@ async def get_research_results(context: RunContextWrapper[ResearchScopeContext])
             'legal_provisions': doc.legal_provisions
         }
         for doc in res
-    ]
\ No newline at end of file
+    ]
+    kept, dropped, _ = fit_items(json_items(results), AGENT_INPUT_MAX_TOKENS['research_results'])
+    if dropped:
+        # Least relevant cases are the ones left out
+        return results[:len(kept)] + [{'note': f"{len(dropped)} further relevant cases left out to fit the output size"}]
+    return results
@@ -1,16 +1,41 @@
-import base64
+import asyncio
+import weakref
+from datetime import datetime
 from typing import Any
 
-import requests
+import httpx
 from agents import RunContextWrapper, Runner, function_tool
+from pymongo.errors import DuplicateKeyError
 
 from app.ai.agents.pdf_analyser_agent import PDFAnalyserResult, pdf_analyser_agent
 from app.ai.agents.results_analyser_agent import results_analyser_agent
 from app.ai.contexts.research_scope_context import ResearchScopeContext
-from app.config.core import API_URL
+from app.config.core import PDF_ANALYSIS_CONCURRENCY, PDF_ANALYSIS_TIMEOUT_S
 from app.models.keyword_model import Keyword
 from app.models.research_trace_model import ResearchTrace
+from app.utils.agent_input import AGENT_INPUT_MAX_TOKENS, InputSection, agent_run_config, assemble_input, \
+    json_items, scope_text
+from app.utils.court_api_client import CircuitOpenError, court_api_client
+from app.utils.logger import setup_logger
+from app.utils.pdf_analysis_cache import get_cached_analysis, store_analysis
+from app.utils.pdf_cache import get_pdf, sha256
+from app.utils.pdf_text import pdf_input_content
 from app.utils.research_utils import research_event
+from app.utils.result_ranker import prerank_results
+from app.utils.search_cache import cached_search
+from app.utils.tracing import SPAN_KIND_CLIENT, stage
+
+logger = setup_logger(__name__)
+
+# Bound on the PDF analyses of all researches of the process, a semaphore only works on the loop it was used on
+_analysis_slots: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = weakref.WeakKeyDictionary()
+
+
+def analysis_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if (slots := _analysis_slots.get(loop)) is None:
+        slots = _analysis_slots[loop] = asyncio.Semaphore(PDF_ANALYSIS_CONCURRENCY)
+    return slots
 
 
 async def analyse_pdf(context: RunContextWrapper[ResearchScopeContext], pdf_file_name: str, *, search_keyword: str = None) -> PDFAnalyserResult:
@@ -34,15 +59,10 @@ async def analyse_pdf(context: RunContextWrapper[ResearchScopeContext], pdf_file
     
     # Fetch PDF from API endpoint
     try:
-        response = requests.get(
-            f"{API_URL}/pdf/{pdf_file_name}",
-            proxies={'http': None, 'https': None}, 
-            timeout=30
-        )
-        response.raise_for_status()
-        pdf_content = response.content
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching PDF {pdf_file_name}: {e}")
+        with stage('pdf download', kind=SPAN_KIND_CLIENT):
+            pdf_content = await get_pdf(pdf_file_name)
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        logger.warning(f"Error fetching PDF {pdf_file_name}: {e}", extra={'pdf_file_name': pdf_file_name})
         return PDFAnalyserResult(
             is_relevant=False,
             metadata=f"Error: Could not fetch PDF {pdf_file_name}",
@@ -50,12 +70,51 @@ async def analyse_pdf(context: RunContextWrapper[ResearchScopeContext], pdf_file
             relevant_parts=None,
             legal_provisions=None,
         )
-        
-    pdf_content = base64.b64encode(pdf_content).decode("utf-8")
-    filename = pdf_file_name
-    
-    print(f"### Analyse pdf: \033[91m{pdf_file_name} {search_keyword}\033[0m\n")
+
     research_event(context.context.research_id, "analysing_pdf", {"pdf_file_name": pdf_file_name})
+
+    pdf_content_hash = sha256(pdf_content)
+    if not (analysis := get_cached_analysis(pdf_content_hash, context.context, search_keyword=search_keyword)):
+        with stage('pdf analysis'):
+            analysis = await run_pdf_analyser(context, pdf_file_name, pdf_content, search_keyword=search_keyword)
+        store_analysis(pdf_content_hash, context.context, analysis, search_keyword=search_keyword)
+
+    # Irrelevant verdicts are recorded too, so the PDF is skipped when another keyword finds it again
+    try:
+        ResearchTrace.find_one_and_update(
+            {'research_id': context.context.research_id, 'pdf_file_name': pdf_file_name},
+            {
+                '$setOnInsert': {
+                    'search_keyword': search_keyword,
+                    'is_relevant': analysis.is_relevant,
+                    'metadata': analysis.metadata,
+                    'summary': analysis.summary,
+                    'problem_description': context.context.problem_description,
+                    'question': context.context.question,
+                    'relevant_parts': analysis.relevant_parts,
+                    'legal_provisions': analysis.legal_provisions,
+                    'created_at': datetime.now(),
+                    'updated_at': datetime.now(),
+                },
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # Already recorded by a concurrent analysis of the same PDF
+        pass
+    
+    return analysis
+
+
+async def run_pdf_analyser(context: RunContextWrapper[ResearchScopeContext], pdf_file_name: str, pdf_content: bytes, *,
+                           search_keyword: str = None) -> PDFAnalyserResult:
+    scope = context.context
+    pdf_content = await pdf_input_content(
+        pdf_file_name, pdf_content, ' '.join(filter(None, [scope.problem_description, scope.question, search_keyword]))
+    )
+    
+    logger.info(f"Analyse pdf {pdf_file_name}", extra={'pdf_file_name': pdf_file_name, 'search_keyword': search_keyword,
+                                                     'sampled': True})
     
     res = await Runner.run(
         starting_agent=pdf_analyser_agent,
@@ -65,105 +124,127 @@ async def analyse_pdf(context: RunContextWrapper[ResearchScopeContext], pdf_file
                 "content": [
                     {
                         "type": "input_text",
-                        "text": context.context.model_dump_json(exclude={'research_id'})
+                        "text": scope_text(context.context)
                     }
                 ]
             },
             {
                 "role": "user",
-                "content": [
-                    {
-                        "type": "input_file",
-                        "filename": filename,
-                        "file_data": f"data:application/pdf;base64,{pdf_content}",
-                    }
-                ]
-             }
+                "content": pdf_content
+            }
         ],
-        context=context.context
+        context=context.context,
+        run_config=agent_run_config(pdf_analyser_agent.name, context.context),
     )
     
-    if res.final_output.is_relevant:
-        ResearchTrace.create({
-            'research_id': context.context.research_id, 
-            'search_keyword': search_keyword,
-            'metadata': res.final_output.metadata,
-            'pdf_file_name': pdf_file_name,
-            'summary': res.final_output.summary,
-            'problem_description': context.context.problem_description,
-            'question': context.context.question,
-            'relevant_parts': res.final_output.relevant_parts,
-            'legal_provisions': res.final_output.legal_provisions,
-        })
-    
     return res.final_output
 
+async def analyse_pdfs(context: RunContextWrapper[ResearchScopeContext], pdf_file_names: list[str], *,
+                       search_keyword: str = None) -> list[PDFAnalyserResult | None]:
+    """
+    Analyse PDF files concurrently, at most PDF_ANALYSIS_CONCURRENCY at a time in the process.
+    A PDF whose analysis fails or times out yields None instead of failing the whole batch.
+    """
+    async def analyse(pdf_file_name: str) -> PDFAnalyserResult | None:
+        async with analysis_slots():
+            try:
+                with stage('pdf', pdf_file_name=pdf_file_name):
+                    return await asyncio.wait_for(
+                        analyse_pdf(context, pdf_file_name, search_keyword=search_keyword),
+                        timeout=PDF_ANALYSIS_TIMEOUT_S,
+                    )
+            except asyncio.TimeoutError:
+                logger.warning(f"Analysis of PDF {pdf_file_name} timed out after {PDF_ANALYSIS_TIMEOUT_S}s",
+                               extra={'pdf_file_name': pdf_file_name})
+            except Exception as e:
+                logger.exception(f"Error analysing PDF {pdf_file_name}: {e}", extra={'pdf_file_name': pdf_file_name})
+            return None
+
+    return await asyncio.gather(*[analyse(pdf_file_name) for pdf_file_name in pdf_file_names])
+
+
+def skip_analysed_results(research_id: str, results: list) -> tuple[list, int]:
+    """Drop search results whose PDF already has a verdict in this research, returning the rest and the skipped count."""
+    analysed_pdf_file_names = ResearchTrace.analysed_pdf_file_names(research_id)
+    if not analysed_pdf_file_names:
+        return results, 0
+
+    remaining = [
+        result for result in results
+        if not isinstance(result, dict)
+        or (result.get('metadata') or {}).get('file_name') not in analysed_pdf_file_names
+    ]
+    return remaining, len(results) - len(remaining)
+
+
 async def analyse_scraping_results(context: RunContextWrapper[ResearchScopeContext], scraping_results: dict, *, search_keyword: str) -> dict[str, Any]:
     if scraping_results.get('error'):
         return f"Error: {scraping_results.get('error')}"
     
+    results, skipped_results = skip_analysed_results(context.context.research_id, scraping_results.get('results', []))
     analysis_result = {
         "search_keyword": search_keyword,
-        "analysed_results": len(scraping_results.get('results', [])),
+        "analysed_results": len(results),
         "relevant_results": 0,
+        "skipped_results": skipped_results,
+        "pruned_results": 0,
     }
     
-    if scraping_results.get('results', []):
+    if results:
         research_event(context.context.research_id, "analysing_results")
-        scraping_results_analyser_agent_res = await Runner.run(
-            starting_agent=results_analyser_agent,
-            input=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "input_text",
-                            "text": context.context.model_dump_json(exclude={'research_id'})
-                        }
-                    ]
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "input_text",
-                            "text": str(scraping_results.get('results', []))    
-                        }
-                    ]
-                }
-            ],
-            context=context.context
+        # Only the best matching candidates, compacted, go to the results analyser
+        candidates = prerank_results(
+            results,
+            problem_description=context.context.problem_description,
+            question=context.context.question,
+            search_keyword=search_keyword,
         )
+        analysis_result['pruned_results'] = len(results) - len(candidates)
+        with stage('results analysis', context, results=len(results), candidates=len(candidates)):
+            agent_input = assemble_input([
+                InputSection('scope', [scope_text(context.context)], required=True),
+                InputSection('search_results', json_items(candidates)),
+            ], AGENT_INPUT_MAX_TOKENS['results_analyser_agent'])
+            analysis_result['pruned_results'] += agent_input.dropped.get('search_results', 0)
+            scraping_results_analyser_agent_res = await Runner.run(
+                starting_agent=results_analyser_agent,
+                input=agent_input.messages,
+                context=context.context,
+                run_config=agent_run_config(results_analyser_agent.name, context.context),
+            )
         pdf_file_names = scraping_results_analyser_agent_res.final_output.pdf_file_names
     
         if pdf_file_names:
-            for file_name in pdf_file_names:
-                analysis_res = await analyse_pdf(context, file_name, search_keyword=search_keyword)
-                if analysis_res.is_relevant:
-                    analysis_result['relevant_results'] += 1
+            # Duplicates would be analysed concurrently and stored twice
+            analysed_pdf_file_names = ResearchTrace.analysed_pdf_file_names(context.context.research_id)
+            pdf_file_names = [name for name in dict.fromkeys(pdf_file_names) if name not in analysed_pdf_file_names]
+            with stage('pdf analyses', context, pdfs=len(pdf_file_names)):
+                analysis_results = await analyse_pdfs(context, pdf_file_names, search_keyword=search_keyword)
+            analysis_result['relevant_results'] += sum(1 for res in analysis_results if res and res.is_relevant)
                 
-    # update keyword history
-    if keyword := Keyword.find_one({'research_id': context.context.research_id, 'search_keyword': search_keyword}):
-        keyword.update(
-            {
-                'analysed_results': (keyword.analysed_results or 0) + analysis_result['analysed_results'],
-                'relevant_results': (keyword.relevant_results or 0) + analysis_result['relevant_results'],
-            }
-        )
-    else:
-        Keyword.create({
-            'research_id': context.context.research_id,
-            'search_keyword': search_keyword,
-            'analysed_results': analysis_result['analysed_results'],
-            'relevant_results': analysis_result['relevant_results'],
-        })
+    # update keyword history, atomically as the same keyword may be searched by concurrent tool calls
+    Keyword.find_one_and_update(
+        {'research_id': context.context.research_id, 'search_keyword': search_keyword},
+        {
+            '$inc': {
+                'analysed_results': analysis_result['analysed_results'],
+                'relevant_results': analysis_result['relevant_results'],
+                'skipped_results': analysis_result['skipped_results'],
+                'pruned_results': analysis_result['pruned_results'],
+            },
+            '$setOnInsert': {'created_at': datetime.now()},
+            '$currentDate': {'updated_at': True},
+        },
+        upsert=True,
+    )
         
     return analysis_result
 
 
-def get_search_results(query: str, limit: int = 50) -> dict[str, Any]:
+async def get_search_results(query: str, limit: int = 50) -> dict[str, Any]:
     """
     Search the vector database for court cases using the provided query.
+    Results are cached per normalised query, see cached_search.
     
     Args:
         query: Search term for court decisions
@@ -172,22 +253,15 @@ def get_search_results(query: str, limit: int = 50) -> dict[str, Any]:
     Returns:
         Dict containing search results and metadata
     """
+    return await cached_search(query, limit, lambda: search_court_decisions(query, limit))
+
+
+async def search_court_decisions(query: str, limit: int) -> dict[str, Any]:
     try:
         # Make API call to the vector database
-        response = requests.get(
-            f"{API_URL}/search",
-            params={
-                "query": query,
-                "n_results": limit
-            },
-            proxies={'http': None, 'https': None},  # Disable proxy usage
-            timeout=30
-        )
-        response.raise_for_status()
-        
-        return response.json()
+        return await court_api_client.search(query, limit)
         
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, CircuitOpenError) as e:
         return {
             "results": [],
             "total_results": 0,
@@ -213,5 +287,6 @@ async def search_results(context: RunContextWrapper[ResearchScopeContext], searc
         Dict with results, total count, page info, and PDFs
     """
     research_event(context.context.research_id, "searching", {"search_keyword": search_keyword, "limit": limit})
-    res = get_search_results(search_keyword, limit)
+    with stage('search', context, kind=SPAN_KIND_CLIENT, search_keyword=search_keyword, limit=limit):
+        res = await get_search_results(search_keyword, limit)
     return await analyse_scraping_results(context, res, search_keyword=search_keyword)
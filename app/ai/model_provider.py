@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+from typing import Any, AsyncIterator, Optional
+
+from agents import ModelProvider, ModelResponse, ModelSettings, ModelTracing, Tool
+from agents.models.interface import Model
+from agents.models.multi_provider import MultiProvider
+from agents.usage import InputTokensDetails, OutputTokensDetails, Usage
+from openai.types.responses import Response, ResponseCompletedEvent, ResponseOutputItem, ResponseUsage
+from pydantic import TypeAdapter
+
+# live: the OpenAI API. record: the OpenAI API, saving every response. replay: recorded responses only.
+# scripted: deterministic stand-in responses, see ScriptedModel. Replay falls back to scripted responses
+# for inputs that were never recorded when LLM_REPLAY_FALLBACK is "scripted".
+LLM_MODE = os.getenv('LLM_MODE', 'live')
+LLM_REPLAY_DIR = os.getenv('LLM_REPLAY_DIR', os.path.join(os.getcwd(), 'cache', 'llm_replay'))
+LLM_REPLAY_FALLBACK = os.getenv('LLM_REPLAY_FALLBACK', 'error')
+
+# Fields that differ between runs of the same research without changing what the model is asked
+VOLATILE_KEYS = {'id', 'call_id', 'research_id', 'timestamp', 'created_at', 'updated_at'}
+OBJECT_ID = re.compile(r'\b[0-9a-f]{24}\b')
+TIMESTAMP = re.compile(r'\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(\.\d+)?')
+
+_output_items = TypeAdapter(list[ResponseOutputItem])
+_model_provider: Optional[ModelProvider] = None
+
+
+class ReplayMissError(Exception):
+
+    def __init__(self, agent_name: str, key: str):
+        super().__init__(f"No recorded response of {agent_name} for input {key}")
+
+
+def normalise_input(value: Any) -> Any:
+    """Model input without ids, timestamps and file contents, which are replaced by their hash."""
+    if isinstance(value, dict):
+        return {
+            key: hashlib.sha256(item.encode('utf-8')).hexdigest() if key == 'file_data' and isinstance(item, str)
+            else normalise_input(item)
+            for key, item in sorted(value.items()) if key not in VOLATILE_KEYS
+        }
+    if isinstance(value, (list, tuple)):
+        return [normalise_input(item) for item in value]
+    if isinstance(value, str):
+        return TIMESTAMP.sub('<timestamp>', OBJECT_ID.sub('<id>', value))
+    if hasattr(value, 'model_dump'):
+        return normalise_input(value.model_dump(exclude_none=True))
+    return value
+
+
+def agent_name_for(system_instructions: Optional[str]) -> str:
+    """Name of the agent with these instructions, models only get the instructions."""
+    # Imported here, the agents import this module through agent_input
+    from app.ai.agents.orchestrator_agent import orchestrator_agent
+    from app.ai.agents.pdf_reader_agent import pdf_reader_agent
+    from app.ai.agents.report_agent import report_agent
+    from app.ai.agents.law_agent import law_agent
+    from app.ai.agents.keyword_agent import keyword_agent
+    from app.ai.agents.pdf_analyser_agent import pdf_analyser_agent
+    from app.ai.agents.results_analyser_agent import results_analyser_agent
+
+    for agent in (orchestrator_agent, keyword_agent, results_analyser_agent, pdf_analyser_agent, pdf_reader_agent,
+                  report_agent, law_agent):
+        if agent.instructions == system_instructions:
+            return agent.name
+    return 'agent'
+
+
+def response_key(system_instructions: Optional[str], input: str | list, tools: list[Tool], output_schema) -> str:
+    payload = {
+        'instructions': hashlib.sha256((system_instructions or '').encode('utf-8')).hexdigest(),
+        'input': normalise_input(input),
+        'tools': sorted(tool.name for tool in tools),
+        'output_schema': output_schema.name() if output_schema else None,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+def usage_to_dict(usage: Usage) -> dict[str, int]:
+    return {
+        'requests': usage.requests,
+        'input_tokens': usage.input_tokens,
+        'cached_tokens': usage.input_tokens_details.cached_tokens or 0,
+        'output_tokens': usage.output_tokens,
+        'reasoning_tokens': usage.output_tokens_details.reasoning_tokens or 0,
+    }
+
+
+def usage_from_dict(data: dict[str, int]) -> Usage:
+    return Usage(
+        requests=data.get('requests', 1),
+        input_tokens=data.get('input_tokens', 0),
+        input_tokens_details=InputTokensDetails(cached_tokens=data.get('cached_tokens', 0), cache_write_tokens=0),
+        output_tokens=data.get('output_tokens', 0),
+        output_tokens_details=OutputTokensDetails(reasoning_tokens=data.get('reasoning_tokens', 0)),
+        total_tokens=data.get('input_tokens', 0) + data.get('output_tokens', 0),
+    )
+
+
+def completed_event(model_name: Optional[str], response: ModelResponse) -> ResponseCompletedEvent:
+    """A whole response as the only event of a stream, for models that don't stream."""
+    return ResponseCompletedEvent(type='response.completed', sequence_number=0, response=Response(
+        id=response.response_id or f"resp_{uuid.uuid4().hex}", created_at=time.time(), model=model_name or '',
+        object='response', output=response.output, parallel_tool_calls=False, tool_choice='auto', tools=[],
+        usage=ResponseUsage(input_tokens=response.usage.input_tokens,
+                            input_tokens_details=response.usage.input_tokens_details,
+                            output_tokens=response.usage.output_tokens,
+                            output_tokens_details=response.usage.output_tokens_details,
+                            total_tokens=response.usage.total_tokens),
+    ))
+
+
+class ReplayModel(Model):
+    """
+    Model answering from recorded responses, keyed by agent and normalised input. In record mode the
+    responses of the wrapped model are saved first.
+    """
+
+    def __init__(self, model_name: str, provider: 'ReplayModelProvider'):
+        self.model_name = model_name
+        self.provider = provider
+
+    async def get_response(self, system_instructions, input, model_settings: ModelSettings, tools: list[Tool],
+                           output_schema, handoffs, tracing: ModelTracing, *, previous_response_id=None,
+                           conversation_id=None, prompt=None) -> ModelResponse:
+        agent_name = agent_name_for(system_instructions)
+        key = response_key(system_instructions, input, tools, output_schema)
+
+        if self.provider.mode == 'record':
+            started_at = time.monotonic()
+            response = await self.provider.live.get_model(self.model_name).get_response(
+                system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+                previous_response_id=previous_response_id, conversation_id=conversation_id, prompt=prompt,
+            )
+            self.provider.save(agent_name, key, self.model_name, response, time.monotonic() - started_at)
+            return response
+
+        if (recording := self.provider.load(agent_name, key)) is not None:
+            self.provider.stats['hits'] += 1
+            return ModelResponse(output=_output_items.validate_python(recording['output']),
+                                 usage=usage_from_dict(recording['usage']), response_id=None)
+
+        self.provider.stats['misses'] += 1
+        if self.provider.fallback is None:
+            raise ReplayMissError(agent_name, key)
+        return await self.provider.fallback.get_model(self.model_name).get_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+            previous_response_id=previous_response_id, conversation_id=conversation_id, prompt=prompt,
+        )
+
+    async def stream_response(self, system_instructions, input, model_settings: ModelSettings, tools: list[Tool],
+                              output_schema, handoffs, tracing: ModelTracing, *, previous_response_id=None,
+                              conversation_id=None, prompt=None) -> AsyncIterator[ResponseCompletedEvent]:
+        """The response of get_response in one event, so streamed runs are recorded and replayed the same way."""
+        yield completed_event(self.model_name, await self.get_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+            previous_response_id=previous_response_id, conversation_id=conversation_id, prompt=prompt,
+        ))
+
+
+class ReplayModelProvider(ModelProvider):
+    """Records responses of the live provider to `directory`, or replays them, one JSON file per response."""
+
+    def __init__(self, mode: str = 'replay', directory: str = LLM_REPLAY_DIR, *, fallback: ModelProvider = None):
+        self.mode = mode
+        self.directory = directory
+        self.fallback = fallback
+        self.live = MultiProvider()
+        self.stats = {'hits': 0, 'misses': 0, 'recorded': 0}
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        return ReplayModel(model_name, self)
+
+    def path(self, agent_name: str, key: str) -> str:
+        return os.path.join(self.directory, agent_name, f"{key}.json")
+
+    def load(self, agent_name: str, key: str) -> Optional[dict[str, Any]]:
+        try:
+            with open(self.path(agent_name, key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, agent_name: str, key: str, model_name: str, response: ModelResponse, latency_s: float) -> None:
+        path = self.path(agent_name, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({
+                'agent': agent_name,
+                'model': model_name,
+                'output': [item.model_dump(exclude_none=True) for item in response.output],
+                'usage': usage_to_dict(response.usage),
+                'latency_s': round(latency_s, 3),
+            }, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+        self.stats['recorded'] += 1
+
+
+def model_provider_for(mode: str, directory: str = LLM_REPLAY_DIR, *, fallback: str = LLM_REPLAY_FALLBACK) -> Optional[ModelProvider]:
+    """Provider of an LLM_MODE, None for live, the SDK's default."""
+    # Imported here, it imports the agent definitions
+    from app.ai.scripted_model import ScriptedModelProvider
+
+    if mode == 'live':
+        return None
+    if mode == 'scripted':
+        return ScriptedModelProvider()
+    if mode in ('record', 'replay'):
+        return ReplayModelProvider(mode, directory,
+                                   fallback=ScriptedModelProvider() if fallback == 'scripted' else None)
+    raise ValueError(f"Unknown LLM_MODE {mode}")
+
+
+def get_model_provider() -> Optional[ModelProvider]:
+    global _model_provider
+    if _model_provider is None and LLM_MODE != 'live':
+        _model_provider = model_provider_for(LLM_MODE)
+    return _model_provider
+
+
+def set_model_provider(provider: Optional[ModelProvider]) -> None:
+    """Use another provider for all agent runs of this process, e.g. a replay provider in benchmarks."""
+    global _model_provider
+    _model_provider = provider
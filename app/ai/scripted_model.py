@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import re
+from typing import Any, AsyncIterator, Optional
+
+from agents import ModelProvider, ModelResponse, ModelSettings, ModelTracing, Tool
+from agents.models.interface import Model
+from openai.types.responses import ResponseCompletedEvent, ResponseFunctionToolCall, ResponseOutputMessage, \
+    ResponseOutputText
+
+from app.ai.model_provider import agent_name_for, completed_event, usage_from_dict
+from app.utils.tokenisor import estimate_input_tokens, num_tokens_from_string
+
+# Shape of a scripted research
+LLM_SCRIPTED_KEYWORDS = int(os.getenv('LLM_SCRIPTED_KEYWORDS', 3))
+LLM_SCRIPTED_PDFS_PER_KEYWORD = int(os.getenv('LLM_SCRIPTED_PDFS_PER_KEYWORD', 5))
+LLM_SCRIPTED_SEARCH_LIMIT = int(os.getenv('LLM_SCRIPTED_SEARCH_LIMIT', 50))
+
+FILE_NAME = re.compile(r'"file_name":\s*"([^"]+)"|file_name="([^"]+)"')
+
+
+def _digest(*parts: Any) -> str:
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _texts(input: str | list) -> list[str]:
+    """User texts and tool outputs of a model input, in order."""
+    if isinstance(input, str):
+        return [input]
+    texts = []
+    for item in input:
+        item = item if isinstance(item, dict) else item.model_dump()
+        if item.get('type') == 'function_call_output':
+            texts.append(str(item.get('output')))
+            continue
+        content = item.get('content')
+        for part in content if isinstance(content, list) else [content]:
+            if isinstance(part, str):
+                texts.append(part)
+            elif isinstance(part, dict) and part.get('type') in ('input_text', 'output_text'):
+                texts.append(part.get('text') or '')
+            elif isinstance(part, dict) and part.get('filename'):
+                texts.append(f'file_name="{part["filename"]}"')
+    return texts
+
+
+def _calls(input: str | list) -> list[dict]:
+    if isinstance(input, str):
+        return []
+    items = [item if isinstance(item, dict) else item.model_dump() for item in input]
+    return [item for item in items if item.get('type') == 'function_call']
+
+
+class ScriptedModel(Model):
+    """
+    Deterministic stand-in for the agents' models, for running the research pipeline offline.
+
+    The orchestrator sets the scope, asks the keyword agent for keywords, searches each of them at once,
+    reads the results and has the report written. The results analyser selects the first PDFs of each batch
+    and the PDF analyser finds about half of the decisions relevant, by a hash of their file name. Usage is
+    estimated from the input and output sizes, so cost accounting works as with a live model.
+    """
+
+    def __init__(self, model_name: Optional[str], *, keywords: int = LLM_SCRIPTED_KEYWORDS,
+                 pdfs_per_keyword: int = LLM_SCRIPTED_PDFS_PER_KEYWORD, search_limit: int = LLM_SCRIPTED_SEARCH_LIMIT):
+        self.model_name = model_name
+        self.keywords = keywords
+        self.pdfs_per_keyword = pdfs_per_keyword
+        self.search_limit = search_limit
+
+    async def get_response(self, system_instructions, input, model_settings: ModelSettings, tools: list[Tool],
+                           output_schema, handoffs, tracing: ModelTracing, *, previous_response_id=None,
+                           conversation_id=None, prompt=None) -> ModelResponse:
+        agent_name = agent_name_for(system_instructions)
+        texts = _texts(input)
+        key = _digest(agent_name, *texts)
+
+        if agent_name == 'orchestrator_agent':
+            output = self._orchestrate(texts, _calls(input), key)
+        elif agent_name == 'keyword_agent':
+            output = [self._message(self._keywords(texts), key)]
+        elif agent_name == 'results_analyser_agent':
+            output = [self._message(json.dumps({'pdf_file_names': self._select_pdfs(texts)}), key)]
+        elif agent_name == 'pdf_analyser_agent':
+            output = [self._message(json.dumps(self._analyse_pdf(texts), ensure_ascii=False), key)]
+        else:
+            output = [self._message(f"Odpoveď agenta {agent_name}.", key)]
+
+        output_text = ''.join(
+            item.arguments if isinstance(item, ResponseFunctionToolCall) else item.content[0].text for item in output
+        )
+        usage = usage_from_dict({
+            'requests': 1,
+            'input_tokens': estimate_input_tokens(input) + num_tokens_from_string(system_instructions or ''),
+            'output_tokens': num_tokens_from_string(output_text),
+        })
+        return ModelResponse(output=output, usage=usage, response_id=None)
+
+    async def stream_response(self, system_instructions, input, model_settings: ModelSettings, tools: list[Tool],
+                              output_schema, handoffs, tracing: ModelTracing, *, previous_response_id=None,
+                              conversation_id=None, prompt=None) -> AsyncIterator[ResponseCompletedEvent]:
+        """The response of get_response in one event."""
+        yield completed_event(self.model_name, await self.get_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing,
+            previous_response_id=previous_response_id, conversation_id=conversation_id, prompt=prompt,
+        ))
+
+    def _orchestrate(self, texts: list[str], calls: list[dict], key: str) -> list:
+        called = {call.get('name') for call in calls}
+        query = texts[0] if texts else ''
+        if 'set_research_scope' not in called:
+            return [self._call('set_research_scope', {'problem_description': query, 'question': query}, key)]
+        if 'spawn_keyword_agent' not in called:
+            return [self._call('spawn_keyword_agent', {'instructions': "Navrhni kľúčové slová na vyhľadávanie."}, key)]
+        if 'search_results' not in called:
+            keywords = [line.strip() for line in texts[-1].splitlines() if line.strip()][:self.keywords]
+            return [
+                self._call('search_results', {'search_keyword': keyword, 'limit': self.search_limit}, f"{key}{i}")
+                for i, keyword in enumerate(keywords)
+            ]
+        if 'get_research_results' not in called:
+            return [self._call('get_research_results', {}, key)]
+        if 'spawn_report_agent' not in called:
+            return [self._call('spawn_report_agent', {'instructions': "Napíš záverečnú správu."}, key)]
+        return [self._message("Výskum je dokončený, správa bola vytvorená.", key)]
+
+    def _keywords(self, texts: list[str]) -> str:
+        # The first text is the scope, as JSON
+        try:
+            scope = ' '.join(str(value) for value in json.loads(texts[0]).values() if value)
+        except (IndexError, ValueError, AttributeError):
+            scope = texts[0] if texts else ''
+        words = re.findall(r'\w{4,}', scope) or ['rozhodnutie']
+        return '\n'.join(f"{words[i % len(words)]} {words[(i + 1) % len(words)]}" for i in range(self.keywords))
+
+    def _select_pdfs(self, texts: list[str]) -> list[str]:
+        names = [match[0] or match[1] for text in texts for match in FILE_NAME.findall(text)]
+        return list(dict.fromkeys(names))[:self.pdfs_per_keyword]
+
+    def _analyse_pdf(self, texts: list[str]) -> dict[str, Any]:
+        names = [match[0] or match[1] for text in texts for match in FILE_NAME.findall(text)]
+        pdf_file_name = names[0] if names else 'decision.pdf'
+        is_relevant = int(_digest(pdf_file_name), 16) % 2 == 0
+        return {
+            'metadata': f"NS SR, {pdf_file_name}",
+            'summary': f"Súd rozhodoval vo veci {pdf_file_name}.",
+            'is_relevant': is_relevant,
+            'relevant_parts': ["Podľa § 420 Občianskeho zákonníka každý zodpovedá za škodu."] if is_relevant else None,
+            'legal_provisions': ["§ 420 Občianskeho zákonníka"] if is_relevant else None,
+        }
+
+    @staticmethod
+    def _message(text: str, key: str) -> ResponseOutputMessage:
+        return ResponseOutputMessage(
+            id=f"msg_{_digest(key, text)[:16]}", type='message', role='assistant', status='completed',
+            content=[ResponseOutputText(type='output_text', text=text, annotations=[])],
+        )
+
+    @staticmethod
+    def _call(name: str, arguments: dict, key: str) -> ResponseFunctionToolCall:
+        return ResponseFunctionToolCall(
+            id=f"fc_{_digest(key, name)[:16]}", call_id=f"call_{_digest(key, name)[:16]}", type='function_call',
+            name=name, arguments=json.dumps(arguments, ensure_ascii=False), status='completed',
+        )
+
+
+class ScriptedModelProvider(ModelProvider):
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        return ScriptedModel(model_name, **self.kwargs)
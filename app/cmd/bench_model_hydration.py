@@ -0,0 +1,75 @@
+import argparse
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.models.keyword_model import Keyword
+from app.models.model_base import ModelBase
+from app.models.research_trace_model import ResearchTrace
+from app.models.utils.model_schema import ModelSchema
+
+
+def uncached(model_cls: type[ModelBase]) -> type[ModelBase]:
+    """Subclass that resolves its schema on every access, the way ModelBase did before the schema was compiled."""
+    return type(f"Uncached{model_cls.__name__}", (model_cls,), {
+        'schema': classmethod(lambda cls: ModelSchema.compile(cls)),
+    })
+
+
+def research_trace_row() -> dict:
+    return {
+        '_id': ObjectId(),
+        'research_id': str(ObjectId()),
+        'problem_description': 'Zamestnávateľ okamžite skončil pracovný pomer.',
+        'question': 'Je okamžité skončenie pracovného pomeru platné?',
+        'search_keyword': 'okamžité skončenie pracovného pomeru',
+        'is_relevant': True,
+        'summary': 'Súd posudzoval platnosť okamžitého skončenia.',
+        'pdf_file_name': 'decision.pdf',
+        'relevant_parts': ['§ 68 ods. 1 Zákonníka práce'],
+        'legal_provisions': ['§ 68 Zákonníka práce'],
+        'metadata': 'NS SR, 1Cdo/1/2020, 1.1.2020',
+        'created_at': datetime.now(),
+        'updated_at': datetime.now(),
+    }
+
+
+def keyword_row() -> dict:
+    return {
+        '_id': ObjectId(),
+        'research_id': str(ObjectId()),
+        'search_keyword': 'okamžité skončenie pracovného pomeru',
+        'analysed_results': 50,
+        'relevant_results': 3,
+        'created_at': datetime.now(),
+        'updated_at': datetime.now(),
+    }
+
+
+def hydrate(model_cls: type[ModelBase], rows: list[dict]) -> float:
+    """Hydrate, mutate and serialise every row, returning rows per second."""
+    start = time.perf_counter()
+    for row in rows:
+        instance = model_cls(**row)
+        instance.set('search_keyword', row['search_keyword'])
+        instance.dict()
+    return len(rows) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ModelBase hydration with and without the compiled schema.")
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    for model_cls, row_factory in ((ResearchTrace, research_trace_row), (Keyword, keyword_row)):
+        rows = [row_factory() for _ in range(args.rows)]
+        before = max(hydrate(uncached(model_cls), rows) for _ in range(args.repeat))
+        after = max(hydrate(model_cls, rows) for _ in range(args.repeat))
+        print(f"{model_cls.__name__:<14} before: {before:>10.0f} rows/s  after: {after:>10.0f} rows/s  "
+              f"speedup: {after / before:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
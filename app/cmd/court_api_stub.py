@@ -0,0 +1,134 @@
+import argparse
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+COURTS = ["NS SR", "NSS SR", "ÚS SR", "KS Bratislava", "OS Košice I"]
+
+
+STUB_SENTENCES = [
+    "Zalobca sa domahal nahrady skody sposobenej porusenim zmluvy o dielo.",
+    "Odvolaci sud dospel k zaveru, ze najomca zodpoveda za skodu na byte.",
+    "Dovolatel namietal nespravne pravne posudenie veci a nedostatok odovodnenia.",
+    "Podla paragrafu 420 Obcianskeho zakonnika kazdy zodpoveda za skodu, ktoru sposobil porusenim pravnej povinnosti.",
+    "Pracovny pomer skoncil vypovedou zo strany zamestnavatela pre nadbytocnost.",
+    "Sud prveho stupna vykonal dokazovanie vypocutim svedkov a listinnymi dokazmi.",
+]
+
+
+def stub_decision_lines(pdf_file_name: str) -> list[str]:
+    """Text of a stub decision laid out like a real one: header, verdict, reasoning and instruction."""
+    seed = int(hashlib.sha256(pdf_file_name.encode('utf-8')).hexdigest(), 16)
+    lines = [f"Rozhodnutie {pdf_file_name}", "NAJVYSSI SUD SLOVENSKEJ REPUBLIKY", "",
+             "Najvyssi sud Slovenskej republiky v spore zalobcu proti zalovanemu rozhodol takto:", "",
+             "Dovolanie zamieta.", "", "Odovodnenie", ""]
+    for paragraph in range(8):
+        lines += [STUB_SENTENCES[(seed >> (paragraph * 3 + line)) % len(STUB_SENTENCES)] for line in range(4)] + [""]
+    return lines + ["Poucenie: Proti tomuto rozhodnutiu opravny prostriedok nie je pripustny."]
+
+
+def stub_pdf(pdf_file_name: str) -> bytes:
+    """A small but valid single page PDF with a text layer, deterministic for a file name."""
+    lines = [line.replace('\\', '').replace('(', '').replace(')', '') for line in stub_decision_lines(pdf_file_name)]
+    stream = b"BT /F1 9 Tf 11 TL 40 760 Td " + b" ".join(
+        b"(" + line.encode('latin-1', 'replace') + b") Tj T*" for line in lines
+    ) + b" ET"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return pdf
+
+
+def stub_search_results(query: str, n_results: int) -> dict:
+    """Deterministic search results for a query, overlapping between similar queries like the real index."""
+    results = []
+    for word in query.lower().split() or [""]:
+        seed = int(hashlib.sha256(word.encode('utf-8')).hexdigest(), 16)
+        for i in range(n_results):
+            decision = (seed + i * 7919) % 5000
+            results.append({
+                "content": f"Súd rozhodol vo veci týkajúcej sa {word} (rozhodnutie {decision}).",
+                "metadata": {
+                    "file_name": f"decision_{decision}.pdf",
+                    "court": COURTS[decision % len(COURTS)],
+                    "case_number": f"{decision % 9 + 1}Cdo/{decision}/20{decision % 25:02d}",
+                    "date": f"20{decision % 25:02d}-{decision % 12 + 1:02d}-{decision % 28 + 1:02d}",
+                },
+                "distance": round((i + 1) / (n_results + 1), 4),
+            })
+
+    results = sorted(results, key=lambda result: result["distance"])[:n_results]
+    return {"results": results, "total_results": len(results)}
+
+
+class CourtApiStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client connection pooling is exercised
+    latency_ms = 0
+    error_rate = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency_ms / 1000)
+        if random.random() < self.error_rate:
+            return self._respond(503, b'{"error": "stub failure"}', "application/json")
+
+        url = urlparse(self.path)
+        if url.path == "/search":
+            params = parse_qs(url.query)
+            query = params.get("query", [""])[0]
+            n_results = int(params.get("n_results", ["50"])[0])
+            body = json.dumps(stub_search_results(query, n_results), ensure_ascii=False).encode('utf-8')
+            return self._respond(200, body, "application/json")
+
+        if url.path.startswith("/pdf/"):
+            return self._respond(200, stub_pdf(unquote(url.path[len("/pdf/"):])), "application/pdf")
+
+        self._respond(404, b'{"error": "not found"}', "application/json")
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8000, *, latency_ms: int = 0,
+                error_rate: float = 0.0) -> ThreadingHTTPServer:
+    handler = type("ConfiguredCourtApiStubHandler", (CourtApiStubHandler,), {
+        "latency_ms": latency_ms,
+        "error_rate": error_rate,
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in for the court decisions API (/search and /pdf).")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency-ms', type=int, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, latency_ms=args.latency_ms, error_rate=args.error_rate)
+    print(f"Court API stub listening on http://{args.host}:{args.port} (set API_URL to use it)")
+    server.serve_forever()
@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import random
+from collections import Counter
+
+import fakeredis
+
+from app.utils.research_queue import ResearchQueueConsumer, enqueue_research
+
+STREAM = "harness:research_stream"
+GROUP = "harness_workers"
+
+
+async def worker(consumer: ResearchQueueConsumer, processed: Counter, remaining: set, *, crash_after: int = None):
+    """Process jobs like the research worker does, optionally dying without acknowledging a job."""
+    handled = 0
+    while remaining:
+        for job in await consumer.reclaim() + await consumer.read(count=2, block_ms=50):
+            if not await consumer.acquire(job):
+                if not job.reclaimed:
+                    await consumer.ack(job, release=False)
+                continue
+
+            if crash_after is not None and handled >= crash_after:
+                job.heartbeat_task.cancel()
+                print(f"{consumer.consumer_name} crashed holding {job.research_id}")
+                return
+
+            # Stands in for the worker's processing_ended_at check
+            if job.research_id not in remaining:
+                await consumer.ack(job)
+                continue
+
+            await asyncio.sleep(random.uniform(0.001, 0.02))
+            processed[job.research_id] += 1
+            remaining.discard(job.research_id)
+            handled += 1
+            await consumer.ack(job)
+
+
+async def main(jobs: int, workers: int, visibility_timeout_ms: int):
+    server = fakeredis.FakeServer()
+    sync_client = fakeredis.FakeRedis(server=server)
+    async_client = fakeredis.FakeAsyncRedis(server=server)
+
+    def consumer(name: str) -> ResearchQueueConsumer:
+        return ResearchQueueConsumer(async_client, name, stream=STREAM, group=GROUP,
+                                     visibility_timeout_ms=visibility_timeout_ms)
+
+    await consumer("setup").setup()
+
+    research_ids = [f"research-{i}" for i in range(jobs)]
+    for research_id in research_ids:
+        enqueue_research(research_id, sync_client, stream=STREAM)
+    # The same research submitted twice must still be processed once
+    enqueue_research(research_ids[0], sync_client, stream=STREAM)
+
+    processed = Counter()
+    remaining = set(research_ids)
+    await asyncio.wait_for(asyncio.gather(
+        worker(consumer("crashing-worker"), processed, remaining, crash_after=1),
+        *[worker(consumer(f"worker-{i}"), processed, remaining) for i in range(workers)],
+    ), timeout=30)
+
+    duplicates = {research_id: count for research_id, count in processed.items() if count > 1}
+    missing = [research_id for research_id in research_ids if research_id not in processed]
+    print(f"processed: {sum(processed.values())}/{jobs}, duplicates: {duplicates}, missing: {missing}, "
+          f"pending: {await consumer('check').pending()}")
+    if duplicates or missing:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the research queue against an in-memory Redis.")
+    parser.add_argument('--jobs', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--visibility-timeout-ms', type=int, default=300)
+    args = parser.parse_args()
+    asyncio.run(main(args.jobs, args.workers, args.visibility_timeout_ms))
@@ -1,4 +1,8 @@
 import os
 
 
-API_URL = os.getenv('API_URL', 'http://192.168.0.161:8000')
\ No newline at end of file
+API_URL = os.getenv('API_URL', 'http://192.168.0.161:8000')
+
+# PDFs analysed at the same time by a process, across its researches, and how long a single analysis may take
+PDF_ANALYSIS_CONCURRENCY = int(os.getenv('PDF_ANALYSIS_CONCURRENCY', 5))
+PDF_ANALYSIS_TIMEOUT_S = int(os.getenv('PDF_ANALYSIS_TIMEOUT_S', 180))
@@ -1,3 +1,5 @@
+# USD per 1000 tokens. Cached input tokens are billed at the "cached" rate instead of "input",
+# reasoning tokens are part of the output tokens.
 llm_costs = {
     "gpt-4o-mini-2024-07-18": {
         "input": 0.000150,
@@ -9,6 +11,21 @@ llm_costs = {
         "output": 0.004400,
         "cached": 0.000550
     },
+    "o4-mini": {
+        "input": 0.001100,
+        "output": 0.004400,
+        "cached": 0.000275
+    },
+    "gpt-4.1": {
+        "input": 0.002000,
+        "output": 0.008000,
+        "cached": 0.000500
+    },
+    "gpt-4.1-mini": {
+        "input": 0.000400,
+        "output": 0.001600,
+        "cached": 0.000100
+    },
     "gemini-2.0-flash": {
         "input": 0.000100,
         "output": 0.000400,
@@ -21,4 +38,4 @@ llm_costs = {
 
 hf_per_hour = 1.60
 image_cost = 0.003
-modal_cost_per_sec = 0.0004
\ No newline at end of file
+modal_cost_per_sec = 0.0004
@@ -0,0 +1,8 @@
+from app.exceptions.app_exception import AppException
+
+
+class FetchCancelled(AppException):
+    """The caller fetching a value for concurrent callers was cancelled, the others have to fetch it themselves."""
+
+    def __init__(self, key: str):
+        super().__init__(f"Fetch of {key} was cancelled")
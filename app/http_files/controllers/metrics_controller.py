@@ -0,0 +1,40 @@
+import time
+
+from flask import Flask, Response, g, request
+
+from app.http_files.decorators.auth_decorators import protected_metrics_route
+from app.http_files.decorators.common_decorators import handle_exceptions
+from app.utils.metrics import CONTENT_TYPE, METRICS_ENABLED, http_request_duration, http_requests, \
+    http_requests_in_progress, registry
+
+
+@handle_exceptions
+@protected_metrics_route
+def index():
+    """Metrics of this process in the Prometheus text format"""
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+def init_request_metrics(app: Flask) -> None:
+    """Count and time every request, by its route rule so path parameters don't make new series"""
+    if not METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def start_request_metrics():
+        g.request_started_at = time.perf_counter()
+        http_requests_in_progress.inc()
+
+    @app.after_request
+    def record_request_metrics(response):
+        if (started_at := g.get('request_started_at')) is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            http_requests.inc(method=request.method, endpoint=endpoint, status=str(response.status_code))
+            http_request_duration.observe(time.perf_counter() - started_at, method=request.method, endpoint=endpoint)
+        return response
+
+    @app.teardown_request
+    def end_request_metrics(error=None):
+        # Also runs when a handler raised, unlike after_request
+        if g.pop('request_started_at', None) is not None:
+            http_requests_in_progress.dec()
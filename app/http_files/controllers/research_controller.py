@@ -1,14 +1,15 @@
-import os
+from datetime import datetime
+from functools import partial
 
-from flask import g
+from flask import g, request
 
 from app.http_files.decorators.auth_decorators import protected_route
 from app.http_files.decorators.common_decorators import handle_exceptions
 from app.http_files.resources.research_resource import ResearchResource
 from app.http_files.schemas.research_request_schema import ResearchRequestSchema
-from app.models.research_model import Research
-from app.utils.api_utils import paginate_all, validate_request
-from app.utils.redis_utils import redis_worker_pubsub_client
+from app.models.research_model import Research, ResearchStatus
+from app.utils.api_utils import int_arg, paginate_all, validate_request
+from app.utils.research_queue import enqueue_research
 
 
 @handle_exceptions
@@ -16,8 +17,13 @@ from app.utils.redis_utils import redis_worker_pubsub_client
 def store():
     """Start a new research process"""
     validate_request(ResearchRequestSchema)
-    research = Research.create({'query': g.validated['message']})
-    redis_worker_pubsub_client.publish(os.getenv("REDIS_WORKER_PUBSUB_CHANNEL", "worker:new_research"), str(research.id))
+    research = Research.create({
+        'query': g.validated['message'],
+        'created_by_user_id': g.user.id,
+        'status': ResearchStatus.QUEUED,
+        'queued_at': datetime.now(),
+    })
+    enqueue_research(research.id)
     return ResearchResource(research).to_response()
 
 @handle_exceptions
@@ -25,7 +31,12 @@ def store():
 def show(research_id: str):
     """Get a research by ID"""
     research = Research.find_by_id_or_fail(research_id)
-    return ResearchResource(research).to_response()
+    return ResearchResource(
+        research,
+        with_events=request.args.get('with_events', 'true').lower() != 'false',
+        events_after=int_arg('events_after', 0),
+        events_limit=int_arg('events_limit'),
+    ).to_response()
 
 @handle_exceptions
 @protected_route
@@ -39,4 +50,4 @@ def destroy(research_id: str):
 @protected_route
 def index():
     """Get all research"""
-    return paginate_all(Research, resource=ResearchResource)
\ No newline at end of file
+    return paginate_all(Research, resource=partial(ResearchResource, with_events=False))
\ No newline at end of file
@@ -1,35 +1,35 @@
 import json
-import threading
-from typing import Dict, Set
 
+from bson import ObjectId
 from flask import request
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 
+from app.http_files.resources.research_resource import ResearchResource
+from app.models.research_model import Research
+from app.utils.logger import setup_logger
 from app.utils.redis_utils import redis_events_pubsub_client
 
-# Track active connections per research_id
-active_connections: Dict[str, Set[str]] = {}
-connection_lock = threading.Lock()
+logger = setup_logger(__name__)
+
+# Every research publishes on research:{research_id}; one pattern subscription serves all of them
+RESEARCH_CHANNEL_PATTERN = "research:*"
+LISTENER_RETRY_DELAY_S = 1
 
 def init_socketio(app):
     """Initialize SocketIO with the Flask app"""
     socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+    # A single Redis subscriber per process fans messages out to per-research socket.io rooms
+    socketio.start_background_task(redis_listener, socketio)
     
     @socketio.on('connect')
     def handle_connect():
-        print(f"Client connected: {request.sid}")
+        logger.info(f"Client connected: {request.sid}")
         emit('connected', {'message': 'Connected to research stream'})
 
     @socketio.on('disconnect')
     def handle_disconnect():
-        print(f"Client disconnected: {request.sid}")
-        # Clean up from all research channels
-        with connection_lock:
-            for research_id, connections in active_connections.items():
-                connections.discard(request.sid)
-                if not connections:
-                    # Stop listening if no more connections for this research_id
-                    del active_connections[research_id]
+        # socket.io removes the client from all its rooms on disconnect
+        logger.info(f"Client disconnected: {request.sid}")
 
     @socketio.on('subscribe')
     def handle_subscribe(data):
@@ -39,22 +39,31 @@ def init_socketio(app):
             emit('error', {'message': 'research_id is required'})
             return
         
-        print(f"Client {request.sid} subscribing to research: {research_id}")
+        logger.info(f"Client {request.sid} subscribing to research: {research_id}", extra={'research_id': research_id})
         
-        with connection_lock:
-            if research_id not in active_connections:
-                active_connections[research_id] = set()
-                # Start Redis listener for this research_id in a separate thread
-                thread = threading.Thread(
-                    target=redis_listener,
-                    args=(research_id, socketio),
-                    daemon=True
-                )
-                thread.start()
-            
-            active_connections[research_id].add(request.sid)
+        join_room(research_id)
         
         emit('subscribed', {'research_id': research_id, 'message': 'Subscribed to research updates'})
+        # Sent after subscribing, so deltas with a sequence <= the snapshot's event_sequence can be dropped
+        emit_snapshot(research_id)
+
+    @socketio.on('snapshot')
+    def handle_snapshot(data):
+        """Send the full research, or only the events after `after`, e.g. when a sequence gap is detected"""
+        research_id = data.get('research_id')
+        if not research_id:
+            emit('error', {'message': 'research_id is required'})
+            return
+
+        try:
+            after = int(data.get('after') or 0)
+        except (TypeError, ValueError):
+            after = -1
+        if after < 0:
+            emit('error', {'message': 'after must be a non-negative integer'})
+            return
+
+        emit_snapshot(research_id, after=after)
 
     @socketio.on('unsubscribe')
     def handle_unsubscribe(data):
@@ -64,55 +73,49 @@ def init_socketio(app):
             emit('error', {'message': 'research_id is required'})
             return
         
-        print(f"Client {request.sid} unsubscribing from research: {research_id}")
+        logger.info(f"Client {request.sid} unsubscribing from research: {research_id}",
+                    extra={'research_id': research_id})
         
-        with connection_lock:
-            if research_id in active_connections:
-                active_connections[research_id].discard(request.sid)
-                if not active_connections[research_id]:
-                    del active_connections[research_id]
+        leave_room(research_id)
         
         emit('unsubscribed', {'research_id': research_id, 'message': 'Unsubscribed from research updates'})
 
     return socketio
 
 
-def redis_listener(research_id: str, socketio):
-    """Listen for Redis pub/sub messages for a specific research_id"""
-    pubsub = redis_events_pubsub_client.pubsub()
-    channel_name = f"research:{research_id}"
-    pubsub.subscribe(channel_name)
-    
-    print(f"Started Redis listener for channel: {channel_name}")
-    
-    try:
-        for message in pubsub.listen():
-            if message['type'] == 'message':
+def emit_snapshot(research_id: str, *, after: int = 0):
+    """Emit the current state of a research to the requesting client"""
+    research = Research.find_by_id(research_id) if ObjectId.is_valid(research_id) else None
+    if not research:
+        emit('error', {'message': f'Research {research_id} not found'})
+        return
+
+    emit('research_snapshot', ResearchResource(research, events_after=after).dump())
+
+
+def redis_listener(socketio):
+    """Listen for Redis pub/sub messages of all researches and emit them to the research's room"""
+    while True:
+        pubsub = redis_events_pubsub_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.psubscribe(RESEARCH_CHANNEL_PATTERN)
+            logger.info(f"Started Redis listener for pattern: {RESEARCH_CHANNEL_PATTERN}")
+
+            for message in pubsub.listen():
+                if message['type'] != 'pmessage':
+                    continue
+
                 try:
-                    event_data = json.loads(message['data'])
-                    
-                    # Check if we still have active connections for this research_id
-                    with connection_lock:
-                        if research_id not in active_connections:
-                            print(f"No active connections for {research_id}, stopping listener")
-                            break
-                        
-                        connections = active_connections[research_id].copy()
-                    
-                    # Emit to all connected clients for this research_id
-                    for sid in connections:
-                        socketio.emit('update_research', event_data, room=sid)
-                        
+                    research_id = message['channel'].decode('utf-8').split(':', 1)[1]
+                    socketio.emit('research_delta', json.loads(message['data']), to=research_id)
                 except json.JSONDecodeError as e:
-                    print(f"Failed to decode Redis message: {e}")
+                    logger.warning(f"Failed to decode Redis message: {e}")
                 except Exception as e:
-                    print(f"Error processing Redis message: {e}")
-    
-    except Exception as e:
-        print(f"Redis listener error for {research_id}: {e}")
-    finally:
-        pubsub.close()
-        # Clean up connections
-        with connection_lock:
-            if research_id in active_connections:
-                del active_connections[research_id] 
\ No newline at end of file
+                    logger.exception(f"Error processing Redis message: {e}")
+
+        except Exception as e:
+            logger.exception(f"Redis listener error: {e}")
+        finally:
+            pubsub.close()
+
+        socketio.sleep(LISTENER_RETRY_DELAY_S)
@@ -1,3 +1,4 @@
+import hmac
 import os
 from datetime import datetime
 from functools import wraps
@@ -9,6 +10,7 @@ from app.exceptions.database_not_initialized import DatabaseNotInitialized
 from app.exceptions.unauthorised_exception import UnauthorisedException
 from app.models.auth_model import Auth
 from app.utils.api_utils import get_bearer_auth_token
+from app.utils.metrics import METRICS_TOKEN, auth_attempts
 
 
 def _authenticate_user():
@@ -37,7 +39,15 @@ def _authenticate_user():
 def protected_route(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        _authenticate_user()
+        try:
+            _authenticate_user()
+        except UnauthorisedException:
+            auth_attempts.inc(result='rejected')
+            raise
+        except Exception:
+            auth_attempts.inc(result='error')
+            raise
+        auth_attempts.inc(result='accepted')
         return func(*args, **kwargs)
 
     wrapper.__name__ = f"{func.__name__}_{id(func)}"
@@ -56,4 +66,17 @@ def protected_admin_route(func):
         return func(*args, **kwargs)
 
     wrapper.__name__ = f"{func.__name__}_{id(func)}"
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+
+def protected_metrics_route(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = get_bearer_auth_token()
+        if not token or not METRICS_TOKEN or not hmac.compare_digest(token, METRICS_TOKEN):
+            raise UnauthorisedException()
+
+        return func(*args, **kwargs)
+
+    wrapper.__name__ = f"{func.__name__}_{id(func)}"
+    return wrapper
@@ -1,23 +1,40 @@
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 from app.http_files.resources.resource_base import ResourceBase
+from app.utils.usage_utils import cached_token_rate
 
 if TYPE_CHECKING:
     from app.models.research_model import Research
 
 class ResearchResource(ResourceBase):
 
+    def __init__(self, data: 'Research | list[Research]', *, with_events: bool = True, events_after: int = 0,
+                 events_limit: Optional[int] = None):
+        super().__init__(data)
+        self._with_events = with_events
+        self._events_after = events_after
+        self._events_limit = events_limit
+
     def to_dict(self, research: 'Research'):
-        return {
+        data = {
             '_id': research.id,
             'query': research.query,
             'created_by_user_id': research.created_by_user_id,
-            'events': research.get('events', []),
+            'event_sequence': research.get('event_sequence', 0) or len(research.get('events', [])),
             'error': research.error,
             'result': research.result,
             'report': research.report,
             'created_at': research.created_at,
+            'status': research.status,
+            'usage': research.usage,
+            'cached_token_rate': cached_token_rate((research.usage or {}).get('total')),
+            'queued_at': research.queued_at,
             'processing_started_at': research.processing_started_at,
             'processing_ended_at': research.processing_ended_at,
             'is_active': research.get('is_active', False)
-        }
\ No newline at end of file
+        }
+
+        if self._with_events:
+            data['events'] = research.get_events(after=self._events_after, limit=self._events_limit)
+
+        return data
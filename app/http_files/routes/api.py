@@ -1,7 +1,8 @@
 from flask import Flask
 
 from app.http_files.controllers import user_controller, sign_in_with_apple_controller, sign_in_with_google_controller, \
-    auth_controller, research_controller
+    auth_controller, research_controller, metrics_controller
+from app.utils.metrics import METRICS_TOKEN
 
 
 def init_routes(app: Flask) -> None:
@@ -18,6 +19,10 @@ def init_routes(app: Flask) -> None:
     app.route('/research', methods=['GET'])(research_controller.index)
     app.route('/research/<research_id>', methods=['GET'])(research_controller.show)
     app.route('/research/<research_id>', methods=['DELETE'])(research_controller.destroy)
+
+    # Traffic, auth failures and LLM usage aren't public, the endpoint needs METRICS_TOKEN
+    if METRICS_TOKEN:
+        app.route('/metrics', methods=['GET'])(metrics_controller.index)
     
     
 
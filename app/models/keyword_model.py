@@ -11,4 +11,6 @@ class Keyword(ModelBase):
     search_keyword: str = None
     analysed_results: int = None
     relevant_results: int = None
+    skipped_results: int = None
+    pruned_results: int = None
 
@@ -1,18 +1,22 @@
 # app/models/model_base.py
 import re
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional, TypeVar, ClassVar, Any, get_type_hints
+from typing import Optional, TypeVar, ClassVar, Any, Mapping, Iterator
 from typing import TYPE_CHECKING
 
 from bson import ObjectId
-from pymongo import TEXT
+from pymongo import TEXT, ReturnDocument
 
 from app.db.mongo import get_db
 from app.exceptions.database_not_initialized import DatabaseNotInitialized
 from app.exceptions.http_exception import HttpException
 from app.models.utils.has_observers import HasObservers
 from app.models.utils.has_relationships import HasRelationships
+from app.models.utils.model_schema import ModelSchema
+from app.utils.metrics import timed_operation
+from app.utils.tracing import SPAN_KIND_CLIENT, stage
 
 if TYPE_CHECKING:
     from pymongo.collection import Collection
@@ -37,7 +41,7 @@ class ModelBase(HasRelationships, HasObservers):
 
         self.clean: dict[str, Any] = {}
 
-        for key in self.model_fields().keys():
+        for key in self.schema().fields:
             super().__setattr__(key, kwargs.get(key))
 
     @classmethod
@@ -53,56 +57,78 @@ class ModelBase(HasRelationships, HasObservers):
             raise DatabaseNotInitialized()
         return db[self.__class__.__name__.lower()]
 
-    def save(self: T) -> T:
+    def save(self: T, *, refresh: bool = True) -> T:
+        """
+        Persist the model in a single round-trip.
+        :param refresh: Reload the stored document from the write result. With False the
+                        write is acknowledged but the instance keeps its local state.
+        """
         if self._id:
-            self._update()
+            self._update(refresh=refresh)
         else:
             self._create()
-        self.refresh()
         return self
 
     @classmethod
-    def model_fields(cls) -> dict[str, Any]:
-        annotations = {}
-        for base in cls.__mro__:
-            if hasattr(base, '__annotations__'):
-                annotations.update(get_type_hints(base))
+    @contextmanager
+    def _operation(cls, operation: str) -> Iterator[None]:
+        """Trace, count and time a Mongo operation on the model's collection."""
+        collection = cls.__name__.lower()
+        with stage(f"mongo {operation}", kind=SPAN_KIND_CLIENT, collection=collection), \
+                timed_operation(collection, operation):
+            yield
 
-        del annotations["protected"]
-        del annotations["searchable"]
+    @classmethod
+    def schema(cls) -> ModelSchema:
+        # Looked up in the class' own __dict__ so subclasses never reuse their parent's schema
+        schema = cls.__dict__.get('_schema')
+        if schema is None:
+            schema = ModelSchema.compile(cls)
+            cls._schema = schema
+        return schema
 
-        return annotations
+    @classmethod
+    def model_fields(cls) -> Mapping[str, Any]:
+        return cls.schema().annotations
 
     @classmethod
-    def fillable_fields(cls) -> list[str]:
-        return [f for f in cls.model_fields().keys() if f not in cls.protected]
+    def fillable_fields(cls) -> tuple[str, ...]:
+        return cls.schema().fillable
 
     @classmethod
-    def all_fields(cls) -> list[str]:
-        return [key for key in cls.model_fields().keys()]
+    def all_fields(cls) -> tuple[str, ...]:
+        return cls.schema().fields
 
-    def _update(self):
+    def _update(self, *, refresh: bool = True):
         [observer.on_updating(self) for observer in self.observers]
-        (self.collection()).update_one(
-            self._query({'_id': self._id}),
-            {
-                '$set': {key: self.get(key) for key in self.fillable_fields() if self.is_dirty(key)},
-                '$currentDate': {'updated_at': True}
-            }
-        )
-        self.refresh()
+        query = self._query({'_id': self._id})
+        update = {
+            '$set': {key: getattr(self, key) for key in self.fillable_fields() if self.is_dirty(key)},
+            '$currentDate': {'updated_at': True}
+        }
+        with self._operation('update'):
+            if refresh:
+                data = (self.collection()).find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+            else:
+                (self.collection()).update_one(query, update)
+        if refresh:
+            self._fill(data)
+        else:
+            super().__setattr__('updated_at', datetime.now())
+            self.clean = {}
         [observer.on_updated(self) for observer in self.observers]
 
     def _create(self):
         [observer.on_creating(self) for observer in self.observers]
         data = self._query({
-            **{key: self.get(key) for key in self.fillable_fields()},
+            **{key: getattr(self, key) for key in self.fillable_fields()},
             'created_at': self.get('created_at') or datetime.now(),
             'updated_at': self.get('updated_at') or datetime.now(),
         })
-        result = (self.collection()).insert_one(data)
-        self._id = result.inserted_id
-        self.refresh()
+        # insert_one adds the generated _id to data, which is then exactly the stored document
+        with self._operation('insert'):
+            (self.collection()).insert_one(data)
+        self._fill(data)
         [observer.on_created(self) for observer in self.observers]
 
     @classmethod
@@ -113,15 +139,22 @@ class ModelBase(HasRelationships, HasObservers):
 
     @classmethod
     def all(cls: type[T]) -> list[T]:
-        return [cls(**data) for data in (cls.collection_cls()).find(cls._query({}))]
+        with cls._operation('find'):
+            documents = list((cls.collection_cls()).find(cls._query({})))
+        return [cls(**data) for data in documents]
 
     def refresh(self: T) -> T:
-        data = (self.collection()).find_one({'_id': self._id})
+        with self._operation('find_one'):
+            data = (self.collection()).find_one({'_id': self._id})
+        self._fill(data)
+        return self
+
+    def _fill(self, data: Optional[dict[str, any]]) -> None:
+        """Hydrate the instance from a stored document and mark it clean."""
         if data:
             for key, value in data.items():
                 setattr(self, key, value)
             self.clean = {}
-        return self
 
     @classmethod
     def search(cls: type[T], query: str | dict[str, any] | ObjectId, limit: Optional[int] = 10,
@@ -220,11 +253,22 @@ class ModelBase(HasRelationships, HasObservers):
 
     @classmethod
     def find(cls: type[T], query: dict[str, any], **kwargs) -> list[T]:
-        return [cls(**data) for data in (cls.collection_cls()).find(cls._query(query), **kwargs)]
+        with cls._operation('find'):
+            documents = list((cls.collection_cls()).find(cls._query(query), **kwargs))
+        return [cls(**data) for data in documents]
 
     @classmethod
     def find_one(cls: type[T], query: dict[str, any], **kwargs) -> Optional[T]:
-        data = (cls.collection_cls()).find_one(cls._query(query), **kwargs)
+        with cls._operation('find_one'):
+            data = (cls.collection_cls()).find_one(cls._query(query), **kwargs)
+        return cls(**data) if data else None
+
+    @classmethod
+    def find_one_and_update(cls: type[T], query: dict[str, any], update: dict[str, any], **kwargs) -> Optional[T]:
+        with cls._operation('find_one_and_update'):
+            data = (cls.collection_cls()).find_one_and_update(
+                cls._query(query), update, return_document=ReturnDocument.AFTER, **kwargs
+            )
         return cls(**data) if data else None
 
     @classmethod
@@ -241,25 +285,35 @@ class ModelBase(HasRelationships, HasObservers):
 
     @classmethod
     def exists(cls, query: dict[str, any]) -> bool:
-        return (cls.collection_cls()).count_documents(cls._query(query)) > 0
+        with cls._operation('count'):
+            return (cls.collection_cls()).count_documents(cls._query(query)) > 0
+
+    @classmethod
+    def distinct(cls, key: str, query: dict[str, any] = None) -> list[any]:
+        with cls._operation('distinct'):
+            return (cls.collection_cls()).distinct(key, cls._query(query))
 
     @classmethod
     def first(cls: type[T], **kwargs) -> Optional[T]:
-        data = (cls.collection_cls()).find_one(cls._query({}), **kwargs)
+        with cls._operation('find_one'):
+            data = (cls.collection_cls()).find_one(cls._query({}), **kwargs)
         return cls(**data) if data else None
 
     @classmethod
     def delete_many(cls, query: dict[str, any], **kwargs) -> None:
-        (cls.collection_cls()).delete_many(cls._query(query), **kwargs)
+        with cls._operation('delete_many'):
+            (cls.collection_cls()).delete_many(cls._query(query), **kwargs)
 
     def delete(self) -> None:
         [observer.on_deleting(self) for observer in self.observers]
-        (self.collection()).delete_one(self._query({'_id': self._id}))
+        with self._operation('delete'):
+            (self.collection()).delete_one(self._query({'_id': self._id}))
         [observer.on_deleted(self) for observer in self.observers]
 
     @classmethod
     def delete_one(cls, query: dict[str, any], **kwargs) -> None:
-        (cls.collection_cls()).delete_one(cls._query(query), **kwargs)
+        with cls._operation('delete'):
+            (cls.collection_cls()).delete_one(cls._query(query), **kwargs)
 
     @classmethod
     def update_many(cls, query: dict[str, any], data: dict[str, any]) -> None:
@@ -278,30 +332,34 @@ class ModelBase(HasRelationships, HasObservers):
                 # For other operations like "$unset", simply add/merge them
                 update_data[key] = value
 
-        (cls.collection_cls()).update_many(cls._query(query), update_data)
+        with cls._operation('update_many'):
+            (cls.collection_cls()).update_many(cls._query(query), update_data)
 
-    def update(self: T, data: dict[str, any]) -> T:
+    def update(self: T, data: dict[str, any], *, refresh: bool = True) -> T:
         for key, value in data.items():
             self.clean[key] = self.get(key)
             setattr(self, key, value)
-        self.save()
+        self.save(refresh=refresh)
         return self
 
     @classmethod
     def count(cls, query: dict[str, any] = None, **kwargs) -> int:
-        return (cls.collection_cls()).count_documents(cls._query(query), **kwargs)
+        with cls._operation('count'):
+            return (cls.collection_cls()).count_documents(cls._query(query), **kwargs)
 
     @classmethod
     def aggregate(cls, pipeline: list[dict[str, any]]) -> list[dict[str, any]]:
-        cursor = (cls.collection_cls()).aggregate(pipeline)
-        return cursor.to_list(length=None)
+        with cls._operation('aggregate'):
+            cursor = (cls.collection_cls()).aggregate(pipeline)
+            return cursor.to_list(length=None)
 
     @classmethod
     def insert_many(cls, data: list[dict[str, any]]) -> None:
         for d in data:
             d.update(cls._query({'created_at': datetime.now(), 'updated_at': datetime.now()}))
 
-        (cls.collection_cls()).insert_many(data)
+        with cls._operation('insert_many'):
+            (cls.collection_cls()).insert_many(data)
 
     @classmethod
     def update_or_create(cls: type[T], query: dict[str, any], data: dict[str, any]) -> T:
@@ -333,7 +391,7 @@ class ModelBase(HasRelationships, HasObservers):
 
     def __setattr__(self, key: str, value: any) -> None:
         """Override the default setattr to track changes to the model."""
-        if key in self.model_fields().keys():
+        if key in self.schema().field_set:
             if not self.is_dirty(key):
                 self.clean[key] = self.get(key)
 
@@ -359,7 +417,7 @@ class ModelBase(HasRelationships, HasObservers):
 
     def dict(self, *args, **kwargs):
         """Override the default dict method."""
-        data = {key: self.serialise(getattr(self, key)) for key in self.all_fields()}
+        data = {key: self.serialise(getattr(self, key)) for key in self.schema().fields}
         return data
 
     def serialise(self, val):
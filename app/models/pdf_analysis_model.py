@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from pymongo import ASCENDING
+
+from app.models.model_base import ModelBase
+
+
+class PdfAnalysis(ModelBase):
+
+    cache_key: str = None
+    pdf_content_hash: str = None
+    scope_hash: str = None
+    prompt_version: str = None
+    model: str = None
+    result: dict = None
+    expires_at: datetime = None
+
+    @classmethod
+    def create_indexes(cls):
+        collection = cls.collection_cls()
+        collection.create_index([('cache_key', ASCENDING)], name='pdf_analysis_cache_key', unique=True)
+        # Mongo's TTL monitor removes entries once expires_at has passed
+        collection.create_index([('expires_at', ASCENDING)], name='pdf_analysis_expires_at', expireAfterSeconds=0)
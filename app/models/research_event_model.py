@@ -0,0 +1,19 @@
+from bson import ObjectId
+from pymongo import ASCENDING
+
+from app.models.model_base import ModelBase
+
+
+class ResearchEvent(ModelBase):
+
+    research_id: ObjectId = None
+    sequence: int = None
+    event: dict = None
+
+    @classmethod
+    def create_indexes(cls):
+        cls.collection_cls().create_index(
+            [('research_id', ASCENDING), ('sequence', ASCENDING)],
+            name='research_event_sequence',
+            unique=True,
+        )
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Optional
 
 from bson import ObjectId
 
@@ -10,17 +10,31 @@ from app.observers.research_observer import ResearchObserver
 if TYPE_CHECKING:
     pass
 
+
+class ResearchStatus:
+    QUEUED = 'queued'
+    PROCESSING = 'processing'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+
 @register_observer(ResearchObserver)
 class Research(ModelBase):
 
     query: str = None
     created_by_user_id: ObjectId = None
+    # Only populated on researches created before events moved to the research_event collection
     events: list[dict] = []
+    event_sequence: int = 0
     error: str = None
     result: str = None
     report: str = None
     is_active: bool = False
+    status: str = None
+    # LLM usage and cost, in total and per agent, see usage_utils.record_llm_usage
+    usage: dict = None
     
+    queued_at: datetime = None
     processing_started_at: datetime = None
     processing_ended_at: datetime = None
     
@@ -28,4 +42,21 @@ class Research(ModelBase):
         from app.models.user_model import User
         return self.belongs_to(User, 'created_by_user_id')
 
+    def get_events(self, *, after: int = 0, limit: Optional[int] = None) -> list[dict]:
+        """
+        Get the events of this research in order: the embedded events of a research created before the
+        research_event collection, which take the first sequence numbers, then the logged ones.
+        :param after: Sequence number of the last event already seen (sequence numbers start at 1).
+        :param limit: Maximum number of events to return.
+        """
+        events = list((self.events or [])[after:after + limit if limit else None])
+        if limit and len(events) >= limit:
+            return events
 
+        from app.models.research_event_model import ResearchEvent
+        research_events = ResearchEvent.find(
+            {'research_id': self.id, 'sequence': {'$gt': max(after, len(self.events or []))}},
+            sort=[('sequence', 1)],
+            limit=limit - len(events) if limit else 0,
+        )
+        return events + [research_event.event for research_event in research_events]
@@ -1,10 +1,18 @@
 from typing import TYPE_CHECKING, Optional
 
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
 from app.models.model_base import ModelBase
+from app.utils.logger import setup_logger
 
 if TYPE_CHECKING:
     pass
 
+logger = setup_logger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
 
 class ResearchTrace(ModelBase):
 
@@ -19,4 +27,23 @@ class ResearchTrace(ModelBase):
     legal_provisions: Optional[list[str]] = None
     metadata: Optional[str] = None
 
+    @classmethod
+    def create_indexes(cls):
+        collection = cls.collection_cls()
+        keys = [('research_id', ASCENDING), ('pdf_file_name', ASCENDING)]
+        # Replaced by the unique index, MongoDB doesn't allow two indexes of the same keys
+        if 'research_trace_pdf_file_name' in collection.index_information():
+            collection.drop_index('research_trace_pdf_file_name')
+        # One verdict per PDF of a research, also when two keywords find the PDF at the same time
+        try:
+            collection.create_index(keys, name='research_trace_pdf_file_name_unique', unique=True)
+        except OperationFailure as e:
+            if e.code != DUPLICATE_KEY_ERROR:
+                raise
+            logger.warning(f"Unique index of research traces not created, remove the duplicate traces: {e}")
+            collection.create_index(keys, name='research_trace_pdf_file_name')
 
+    @classmethod
+    def analysed_pdf_file_names(cls, research_id: str) -> set[str]:
+        """PDFs of a research that already have a verdict, relevant or not."""
+        return set(cls.distinct('pdf_file_name', {'research_id': research_id}))
@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, ClassVar, Mapping, get_origin, get_type_hints
+
+
+@dataclass(frozen=True)
+class ModelSchema:
+    """
+    Field layout of a model class, resolved once per class instead of on every attribute access.
+    """
+    annotations: Mapping[str, Any]
+    fields: tuple[str, ...]
+    field_set: frozenset[str]
+    fillable: tuple[str, ...]
+    fillable_set: frozenset[str]
+    protected: frozenset[str]
+    defaults: Mapping[str, Any]
+
+    @classmethod
+    def compile(cls, model_cls: type) -> 'ModelSchema':
+        annotations = {}
+        for base in model_cls.__mro__:
+            if hasattr(base, '__annotations__'):
+                annotations.update(get_type_hints(base))
+
+        # Class-level configuration (protected, searchable, ...) is not part of the document
+        annotations = {key: hint for key, hint in annotations.items() if get_origin(hint) is not ClassVar}
+
+        fields = tuple(annotations.keys())
+        protected = frozenset(getattr(model_cls, 'protected', None) or [])
+        fillable = tuple(f for f in fields if f not in protected)
+        defaults = {f: getattr(model_cls, f) for f in fields if hasattr(model_cls, f)}
+
+        return cls(
+            annotations=MappingProxyType(annotations),
+            fields=fields,
+            field_set=frozenset(fields),
+            fillable=fillable,
+            fillable_set=frozenset(fillable),
+            protected=protected,
+            defaults=MappingProxyType(defaults),
+        )
@@ -3,8 +3,10 @@ import os
 from flask import Flask
 from flask_cors import CORS
 
+from app.http_files.controllers.metrics_controller import init_request_metrics
 from app.http_files.controllers.research_websocket_controller import init_socketio
 from app.http_files.routes.api import init_routes
+from app.models.research_event_model import ResearchEvent
 
 def create_app():
     app = Flask(__name__)
@@ -15,8 +17,11 @@ def create_app():
     if os.getenv('TEST_ENV'):
         app.config['TESTING'] = True
 
+    init_request_metrics(app)
     init_routes(app)
     init_socketio(app)
+
+    ResearchEvent.create_indexes()
     
     return app
 
@@ -0,0 +1,12 @@
+from app.config.config import load_env
+
+load_env()
+
+from app.utils.logger import setup_logging
+
+setup_logging('bench')
+
+from app.modules.bench.app import run
+
+if __name__ == "__main__":
+    run()
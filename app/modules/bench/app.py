@@ -0,0 +1,87 @@
+import argparse
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import Any
+
+from app.modules.bench.scenarios import SCALES, SCENARIOS
+from app.modules.bench.stores import setup_court_api_stub, setup_stores
+from app.utils.logger import set_console_level
+
+# Allowed slowdown against the baseline before a result counts as a regression, 0.2 = 20 %
+BENCH_MAX_REGRESSION = float(os.getenv('BENCH_MAX_REGRESSION', 0.2))
+# Counts that must stay at zero, whatever the baseline
+FAILURE_COUNTS = ('failed', 'lost_deliveries')
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], max_regression: float) -> list[str]:
+    """Regressions of results against a baseline run: lower throughput or higher p95 latency beyond max_regression."""
+    regressions = []
+    for scenario, scales in results.items():
+        for scale, result in scales.items():
+            name = f"{scenario}[{scale}]"
+            regressions += [f"{name}: {key} {result[key]}" for key in FAILURE_COUNTS if result.get(key)]
+
+            if not (base := baseline.get(scenario, {}).get(scale)):
+                continue
+            if base.get('throughput') and (result['throughput'] or 0) < base['throughput'] * (1 - max_regression):
+                regressions.append(f"{name}: throughput {result['throughput']}/s, baseline {base['throughput']}/s")
+            if base.get('p95_ms') and (result['p95_ms'] or 0) > base['p95_ms'] * (1 + max_regression):
+                regressions.append(f"{name}: p95 {result['p95_ms']}ms, baseline {base['p95_ms']}ms")
+    return regressions
+
+
+def run_suite(scenarios: list[str], scales: list[str], *, live_stores: bool = False) -> dict[str, Any]:
+    stores = setup_stores(live_stores)
+    setup_court_api_stub()
+
+    results: dict[str, dict[str, Any]] = {}
+    for scenario in scenarios:
+        for scale in scales:
+            result = SCENARIOS[scenario](stores, SCALES[scale])
+            results.setdefault(scenario, {})[scale] = result.summary()
+            print(f"{scenario}[{scale}]: {json.dumps(results[scenario][scale])}", file=sys.stderr, flush=True)
+    return results
+
+
+def run():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the research pipeline, events, models, pagination and websocket fan-out at several "
+                    "scales, against in-memory stores unless --live-stores. Researches use scripted model responses, "
+                    "or the recorded ones when LLM_MODE is record or replay.")
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                        help="scenario to run, repeatable, all by default")
+    parser.add_argument('--scale', action='append', choices=list(SCALES), help="repeatable, small by default")
+    parser.add_argument('--live-stores', action='store_true', help="use the configured MongoDB and Redis")
+    parser.add_argument('--output', help="write the results as JSON to this file, e.g. to use as a baseline")
+    parser.add_argument('--baseline', help="results JSON of an earlier run to compare against")
+    parser.add_argument('--max-regression', type=float, default=BENCH_MAX_REGRESSION)
+    parser.add_argument('--verbose', action='store_true', help="show the logs of the benchmarked code")
+    args = parser.parse_args()
+    if not args.verbose:
+        set_console_level(logging.WARNING)
+
+    results = run_suite(args.scenario or list(SCENARIOS), args.scale or ['small'], live_stores=args.live_stores)
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'stores': 'live' if args.live_stores else 'memory',
+        'results': results,
+    }
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['baseline'] = args.baseline
+    report['regressions'] = compare(results, baseline['results'] if args.baseline else {}, args.max_regression)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if report['regressions']:
+        print(f"\033[91m{len(report['regressions'])} regressions:\n" + '\n'.join(report['regressions']) + "\033[0m",
+              file=sys.stderr)
+        raise SystemExit(1)
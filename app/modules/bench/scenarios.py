@@ -0,0 +1,258 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable
+
+from bson import ObjectId
+
+from app.modules.bench.stores import Stores
+
+QUERIES = [
+    "Nájomca poškodil byt a odmieta nahradiť škodu. Môže prenajímateľ žiadať náhradu škody podľa § 420 OZ?",
+    "Zamestnávateľ dal zamestnancovi výpoveď pre nadbytočnosť a hneď prijal nového. Je výpoveď platná?",
+    "Zhotoviteľ nedokončil dielo v termíne. Môže objednávateľ odstúpiť od zmluvy o dielo a žiadať zmluvnú pokutu?",
+]
+
+# Parameters of each scale, every scenario reads the ones it needs
+SCALES = {
+    'small': {'researches': 2, 'keywords': 2, 'pdfs_per_keyword': 3, 'events': 200, 'rows': 200, 'pages': 20,
+              'per_page': 10, 'subscribers': 5, 'deltas': 50},
+    'medium': {'researches': 5, 'keywords': 3, 'pdfs_per_keyword': 5, 'events': 1000, 'rows': 1000, 'pages': 50,
+               'per_page': 25, 'subscribers': 20, 'deltas': 200},
+    'large': {'researches': 10, 'keywords': 5, 'pdfs_per_keyword': 10, 'events': 5000, 'rows': 5000, 'pages': 100,
+              'per_page': 50, 'subscribers': 50, 'deltas': 500},
+}
+
+FANOUT_TIMEOUT_S = 5
+
+
+@dataclass
+class ScenarioResult:
+    ops: int = 0
+    seconds: float = 0.0
+    latencies_s: list[float] = field(default_factory=list)
+    counts: dict[str, float] = field(default_factory=dict)
+
+    def summary(self) -> dict[str, Any]:
+        latencies = sorted(self.latencies_s)
+        return {
+            'ops': self.ops,
+            'seconds': round(self.seconds, 4),
+            'throughput': round(self.ops / self.seconds, 2) if self.seconds else None,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+            **self.counts,
+        }
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+
+
+def timed(result: ScenarioResult, fn: Callable[[], Any]) -> Any:
+    started_at = time.perf_counter()
+    value = fn()
+    result.latencies_s.append(time.perf_counter() - started_at)
+    return value
+
+
+def per_op(result: ScenarioResult, stores: Stores, before: tuple[int, int]) -> None:
+    mongo_ops, redis_commands = stores.totals()
+    result.counts['mongo_ops_per_op'] = round((mongo_ops - before[0]) / result.ops, 2)
+    result.counts['redis_commands_per_op'] = round((redis_commands - before[1]) / result.ops, 2)
+
+
+def create_research(**data) -> 'Research':
+    from app.models.research_model import Research, ResearchStatus
+    return Research.create({'query': QUERIES[0], 'status': ResearchStatus.QUEUED, **data})
+
+
+def bench_process_research(stores: Stores, scale: dict[str, int]) -> ScenarioResult:
+    """
+    Whole researches against the court API stub, one at a time, with scripted model responses, or the ones
+    recorded to LLM_REPLAY_DIR when LLM_MODE is record or replay.
+    """
+    from app.ai.model_provider import LLM_MODE, LLM_REPLAY_DIR, LLM_REPLAY_FALLBACK, ReplayModelProvider, \
+        set_model_provider
+    from app.ai.scripted_model import ScriptedModelProvider
+    from app.models.research_model import ResearchStatus
+    from app.modules.worker.app import process_research
+
+    provider = ScriptedModelProvider(keywords=scale['keywords'], pdfs_per_keyword=scale['pdfs_per_keyword'])
+    if LLM_MODE in ('record', 'replay'):
+        provider = ReplayModelProvider(LLM_MODE, LLM_REPLAY_DIR,
+                                       fallback=provider if LLM_REPLAY_FALLBACK == 'scripted' else None)
+    set_model_provider(provider)
+    result = ScenarioResult(ops=scale['researches'])
+    before = stores.totals()
+
+    async def run():
+        failed, events, llm_requests = 0, 0, 0
+        for i in range(scale['researches']):
+            research = create_research(query=QUERIES[i % len(QUERIES)])
+            started_at = time.perf_counter()
+            await process_research(research)
+            result.latencies_s.append(time.perf_counter() - started_at)
+            research.refresh()
+            failed += research.status != ResearchStatus.COMPLETED
+            events += research.event_sequence
+            llm_requests += ((research.usage or {}).get('total') or {}).get('requests', 0)
+        return failed, events, llm_requests
+
+    started_at = time.perf_counter()
+    failed, events, llm_requests = asyncio.run(run())
+    result.seconds = time.perf_counter() - started_at
+    result.counts['failed'] = failed
+    result.counts['events_per_op'] = round(events / result.ops, 2)
+    result.counts['llm_requests_per_op'] = round(llm_requests / result.ops, 2)
+    if isinstance(provider, ReplayModelProvider):
+        result.counts.update({f"replay_{key}": value for key, value in provider.stats.items()})
+    per_op(result, stores, before)
+    return result
+
+
+def bench_research_event(stores: Stores, scale: dict[str, int]) -> ScenarioResult:
+    """Events appended and published across a few researches, as concurrent tool calls produce them."""
+    from app.utils.research_utils import research_event
+
+    research_ids = [create_research().id for _ in range(max(1, scale['researches']))]
+    result = ScenarioResult(ops=scale['events'])
+    before = stores.totals()
+
+    started_at = time.perf_counter()
+    for i in range(scale['events']):
+        timed(result, lambda: research_event(research_ids[i % len(research_ids)], 'analysing_pdf',
+                                             {'pdf_file_name': f"decision_{i}.pdf"}))
+    result.seconds = time.perf_counter() - started_at
+    per_op(result, stores, before)
+    return result
+
+
+def bench_model_crud(stores: Stores, scale: dict[str, int]) -> ScenarioResult:
+    """Create, find by id, update, query and delete rows of ResearchTrace, each counted as an operation."""
+    from app.models.research_trace_model import ResearchTrace
+
+    research_id = str(ObjectId())
+    rows = scale['rows']
+    result = ScenarioResult(ops=rows * 5)
+    before = stores.totals()
+
+    started_at = time.perf_counter()
+    traces = [
+        timed(result, lambda: ResearchTrace.create({
+            'research_id': research_id,
+            'pdf_file_name': f"decision_{i}.pdf",
+            'search_keyword': 'náhrada škody',
+            'is_relevant': i % 2 == 0,
+            'summary': 'Súd posudzoval zodpovednosť nájomcu za škodu na byte.',
+            'relevant_parts': ['Podľa § 420 Občianskeho zákonníka každý zodpovedá za škodu.'],
+            'legal_provisions': ['§ 420 Občianskeho zákonníka'],
+        }))
+        for i in range(rows)
+    ]
+    for trace in traces:
+        timed(result, lambda: ResearchTrace.find_by_id(trace.id))
+        timed(result, lambda: trace.update({'is_relevant': not trace.is_relevant}))
+        timed(result, lambda: ResearchTrace.find_one({'research_id': research_id, 'pdf_file_name': trace.pdf_file_name}))
+    for trace in traces:
+        timed(result, trace.delete)
+    result.seconds = time.perf_counter() - started_at
+    per_op(result, stores, before)
+    return result
+
+
+def bench_paginate_all(stores: Stores, scale: dict[str, int]) -> ScenarioResult:
+    """Pages of the research listing, as served by the research controller."""
+    from flask import Flask
+
+    from app.http_files.resources.research_resource import ResearchResource
+    from app.models.research_model import Research
+    from app.utils.api_utils import paginate_all
+
+    user_id = ObjectId()
+    Research.insert_many([
+        {'query': QUERIES[i % len(QUERIES)], 'created_by_user_id': user_id, 'status': 'completed',
+         'created_at': datetime.now(), 'updated_at': datetime.now()}
+        for i in range(scale['rows'])
+    ])
+    last_page = max(1, scale['rows'] // scale['per_page'])
+    app = Flask(__name__)
+    result = ScenarioResult(ops=scale['pages'])
+    before = stores.totals()
+
+    started_at = time.perf_counter()
+    for i in range(scale['pages']):
+        with app.test_request_context(query_string={'page': i % last_page + 1, 'per_page': scale['per_page']}):
+            timed(result, lambda: paginate_all(
+                Research, query={'created_by_user_id': user_id},
+                resource=partial(ResearchResource, with_events=False),
+            ))
+    result.seconds = time.perf_counter() - started_at
+    per_op(result, stores, before)
+    return result
+
+
+def bench_websocket_fanout(stores: Stores, scale: dict[str, int]) -> ScenarioResult:
+    """
+    Deltas published to Redis until every socket.io client subscribed to the research received them,
+    through the API's Redis listener. Latency is from publishing a delta to its last delivery.
+    """
+    import json
+
+    import fakeredis
+    from flask import Flask
+
+    import app.http_files.controllers.research_websocket_controller as websocket_controller
+    from app.utils.research_utils import redis_events_pubsub_client
+
+    research_id = str(create_research().id)
+    listener_client = fakeredis.FakeRedis(server=stores.fake_server) if stores.fake_server \
+        else websocket_controller.redis_events_pubsub_client
+    websocket_controller.redis_events_pubsub_client = listener_client
+    app = Flask(__name__)
+    socketio = websocket_controller.init_socketio(app)
+    clients = [socketio.test_client(app) for _ in range(scale['subscribers'])]
+    for client in clients:
+        client.emit('subscribe', {'research_id': research_id})
+        client.get_received()
+    # The listener subscribes in a background task
+    deadline = time.monotonic() + FANOUT_TIMEOUT_S
+    while not listener_client.pubsub_numpat() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    result = ScenarioResult(ops=scale['deltas'])
+    lost = 0
+    started_at = time.perf_counter()
+    for sequence in range(1, scale['deltas'] + 1):
+        delta = {'research_id': research_id, 'sequence': sequence, 'event': {'type': 'searching'}, 'changes': {}}
+        published_at = time.perf_counter()
+        redis_events_pubsub_client.publish(f"research:{research_id}", json.dumps(delta))
+        pending = set(range(len(clients)))
+        deadline = time.monotonic() + FANOUT_TIMEOUT_S
+        while pending and time.monotonic() < deadline:
+            pending = {i for i in pending if not any(
+                message['name'] == 'research_delta' for message in clients[i].get_received()
+            )}
+            if pending:
+                time.sleep(0.0005)
+        lost += len(pending)
+        result.latencies_s.append(time.perf_counter() - published_at)
+    result.seconds = time.perf_counter() - started_at
+    result.counts['subscribers'] = len(clients)
+    result.counts['lost_deliveries'] = lost
+
+    for client in clients:
+        client.disconnect()
+    return result
+
+
+SCENARIOS: dict[str, Callable[[Stores, dict[str, int]], ScenarioResult]] = {
+    'process_research': bench_process_research,
+    'research_event': bench_research_event,
+    'model_crud': bench_model_crud,
+    'paginate_all': bench_paginate_all,
+    'websocket_fanout': bench_websocket_fanout,
+}
@@ -0,0 +1,93 @@
+import os
+import tempfile
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+
+from app.cmd.court_api_stub import make_server
+
+
+@dataclass
+class Stores:
+    """Operation counters of the Mongo and Redis stores the benchmarks run against, see setup_stores."""
+    mongo_ops: Counter
+    redis_commands: Counter
+    # Redis server of the in-memory stores, None for the live ones
+    fake_server: Any = None
+
+    def totals(self) -> tuple[int, int]:
+        return sum(self.mongo_ops.values()), sum(self.redis_commands.values())
+
+
+class Counting:
+    """Proxy counting the method calls made on an object, per method name."""
+
+    def __init__(self, target: Any, counter: Counter, prefix: str = ''):
+        self._target = target
+        self._counter = counter
+        self._prefix = prefix
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._target, name)
+        if not callable(attribute) or name.startswith('_'):
+            return attribute
+
+        def call(*args, **kwargs):
+            self._counter[f"{self._prefix}{name}"] += 1
+            return attribute(*args, **kwargs)
+        return call
+
+
+class CountingDatabase:
+    """Database proxy whose collections count their operations."""
+
+    def __init__(self, db: Any, counter: Counter):
+        self._db = db
+        self._counter = counter
+
+    def __getitem__(self, name: str) -> Counting:
+        return Counting(self._db[name], self._counter)
+
+    def __getattr__(self, name: str):
+        return getattr(self._db, name)
+
+
+def setup_stores(live: bool = False) -> Stores:
+    """Route the models and the Redis clients of the pipeline through counting proxies, in memory unless live."""
+    import app.db.mongo as mongo
+    import app.utils.cache as cache
+    import app.utils.research_utils as research_utils
+
+    if live:
+        db, events_client, cache_client = mongo.get_db(), research_utils.redis_events_pubsub_client, cache.r
+        fake_server = None
+    else:
+        import fakeredis
+        import mongomock
+        db = mongomock.MongoClient()['bench']
+        fake_server = fakeredis.FakeServer()
+        events_client, cache_client = fakeredis.FakeRedis(server=fake_server), fakeredis.FakeRedis(server=fake_server)
+
+    stores = Stores(Counter(), Counter(), fake_server)
+    mongo.db = CountingDatabase(db, stores.mongo_ops)
+    research_utils.redis_events_pubsub_client = Counting(events_client, stores.redis_commands)
+    cache.r = Counting(cache_client, stores.redis_commands)
+    return stores
+
+
+def setup_court_api_stub(latency_ms: int = 0) -> str:
+    """Serve the court API stub on a free port and point the court API client and the PDF caches at it."""
+    import app.utils.pdf_text as pdf_text
+    from app.utils.court_api_client import court_api_client
+    from app.utils.pdf_cache import pdf_cache
+
+    server = make_server(port=0, latency_ms=latency_ms)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    court_api_client.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # Empty caches, so every PDF is fetched and parsed once like in a fresh deployment
+    cache_dir = tempfile.mkdtemp(prefix='bench-research-')
+    pdf_cache.directory = os.path.join(cache_dir, 'pdf')
+    pdf_text.PDF_TEXT_CACHE_DIR = os.path.join(cache_dir, 'pdf_text')
+    return court_api_client.base_url
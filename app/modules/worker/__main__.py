@@ -1,8 +1,10 @@
 from app.config.config import load_env
-from app.utils.logger import setup_logger
 
 load_env()
-logger = setup_logger(__name__)
+
+from app.utils.logger import setup_logging
+
+setup_logging('worker')
 
 import asyncio
 
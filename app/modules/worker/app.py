@@ -1,79 +1,185 @@
 import asyncio
 import os
+import time
 from datetime import datetime
 
-import redis.asyncio as redis
 from agents import Runner
+from bson import ObjectId
 
 from app.ai.agents.orchestrator_agent import orchestrator_agent
 from app.ai.contexts.research_scope_context import ResearchScopeContext
 from app.config.config import load_env
-from app.models.research_model import Research
-from app.utils.logger import setup_logger
-from app.utils.redis_utils import redis_worker_pubsub_client
+from app.models.pdf_analysis_model import PdfAnalysis
+from app.models.research_event_model import ResearchEvent
+from app.models.research_model import Research, ResearchStatus
+from app.models.research_trace_model import ResearchTrace
+from app.utils.agent_input import agent_run_config
+from app.utils.logger import log_context, setup_logger
+from app.utils.metrics import research_duration, research_queue_depth, researches, researches_in_flight, \
+    start_metrics_server
+from app.utils.pdf_analysis_cache import invalidate_analyses
+from app.utils.redis_utils import async_redis_worker_client
+from app.utils.research_queue import ResearchJob, ResearchQueueConsumer
 from app.utils.research_utils import research_event
+from app.utils.tracing import current_span, format_trace_summary, research_trace
+from app.utils.usage_utils import format_usage
 
 load_env()
 logger = setup_logger(__name__)
 
+# Researches processed at the same time by this worker
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 4))
+# Researches of one user processed at the same time across all workers
+WORKER_MAX_ACTIVE_PER_USER = int(os.getenv("WORKER_MAX_ACTIVE_PER_USER", 2))
+WORKER_REQUEUE_DELAY_S = 1
 
-redis_worker_pubsub_client = redis.Redis(
-    host=os.getenv("REDIS_HOST", "localhost"), 
-    port=int(os.getenv("REDIS_PORT", 6379)), 
-    db=int(os.getenv("REDIS_WORKER_PUBSUB_DB", 11))
-)
+# Ids of the researches this worker is processing right now
+in_flight: set[str] = set()
+researches_in_flight.callback = lambda: len(in_flight)
+job_tasks: set[asyncio.Task] = set()
 
 
 async def process_research(research: 'Research'):
-    context = ResearchScopeContext()
-    context.research_id = research.id
+    started_at = time.perf_counter()
+    with log_context(research_id=str(research.id)), research_trace(research.id) as tracer:
+        context = ResearchScopeContext()
+        context.research_id = research.id
+        
+        started = {
+            'status': ResearchStatus.PROCESSING,
+            'is_active': True,
+            'processing_started_at': datetime.now(),
+        }
+        research.update(started)
+        
+        try:
+            research_event(research.id, 'started', changes=started)
+            
+            result = await Runner.run(
+                starting_agent=orchestrator_agent,
+                input=research.query,
+                max_turns=40,
+                context=context,
+                run_config=agent_run_config(orchestrator_agent.name),
+            )
+            research.refresh()
+            research.update({'result': result.final_output, 'status': ResearchStatus.COMPLETED})
+        except Exception as e:
+            research.update({'error': str(e), 'status': ResearchStatus.FAILED})
+        finally:
+            ended = {
+                'status': research.status,
+                'is_active': False,
+                'processing_ended_at': datetime.now(),
+            }
+            research.update(ended)
+            researches.inc(status=research.status)
+            research_duration.observe(time.perf_counter() - started_at, status=research.status)
+            research_event(research.id, 'ended', changes={
+                **ended,
+                'result': research.result,
+                'report': research.report,
+                'error': research.error,
+                'usage': research.usage,
+            })
+            logger.info(f"LLM usage of research {research.id}:\n{format_usage(research.usage)}")
+            if tracer:
+                current_span().set(status=research.status)
+                logger.info(f"Stages of research {research.id}:\n{format_trace_summary(tracer)}")
     
-    research.update({
+
+
+async def has_user_reached_limit(consumer: 'ResearchQueueConsumer', research: 'Research') -> bool:
+    if not research.created_by_user_id:
+        return False
+
+    active_ids = Research.distinct('_id', {
+        '_id': {'$ne': research.id},
+        'created_by_user_id': research.created_by_user_id,
         'is_active': True,
-        'processing_started_at': datetime.now(),
     })
-    
+    # Researches of crashed workers stay marked active, only those whose lock is held are still processed
+    return await consumer.locked(active_ids) >= WORKER_MAX_ACTIVE_PER_USER
+
+
+async def process_job(consumer: 'ResearchQueueConsumer', job: 'ResearchJob', slots: asyncio.Semaphore):
     try:
-        research_event(research.id, 'started')
-        
-        result = await Runner.run(
-            starting_agent=orchestrator_agent,
-            input=research.query,
-            max_turns=40,
-            context=context,
-        )
-        research.refresh()
-        research.update({'result': result.final_output})
-    except Exception as e:
-        research.update({'error': str(e)})
+        if not await consumer.acquire(job):
+            logger.warning(f"Research {job.research_id} is processed by another worker, skipping...")
+            # A reclaimed job may still be locked by the crashed worker, it is retried once the lock expires
+            if not job.reclaimed:
+                await consumer.ack(job, release=False)
+            return
+
+        # Acknowledged once handled, a job failing before is reclaimed when its visibility timeout expires
+        handled = False
+        try:
+            research = Research.find_by_id(job.research_id) if ObjectId.is_valid(job.research_id) else None
+            if research and not research.processing_ended_at and await has_user_reached_limit(consumer, research):
+                # Back of the queue, so one user's burst of submissions can't occupy every worker
+                await asyncio.sleep(WORKER_REQUEUE_DELAY_S)
+                await consumer.requeue(job)
+                return
+
+            handled = True
+            if not research:
+                logger.warning(f"Research not found: {job.research_id}...")
+            elif research.processing_ended_at:
+                logger.warning(f"Research already processed: {job.research_id}...")
+            else:
+                waited = (datetime.now() - research.queued_at).total_seconds() if research.queued_at else 0
+                in_flight.add(job.research_id)
+                depth = await consumer.depth()
+                research_queue_depth.set(depth)
+                stats = (f"waited {waited:.1f}s, queue depth {depth}, "
+                         f"in flight {len(in_flight)}/{WORKER_CONCURRENCY}")
+                logger.info(f"Processing research {job.research_id}{' (reclaimed)' if job.reclaimed else ''}: {stats}",
+                            extra={'research_id': job.research_id})
+                await process_research(research)
+        finally:
+            in_flight.discard(job.research_id)
+            try:
+                if handled:
+                    await consumer.ack(job, release=False)
+            finally:
+                # Stops the heartbeat whatever failed above, so the lock expires and the job can be reclaimed
+                await consumer.release(job)
     finally:
-        research.update({
-            'is_active': False,
-            'processing_ended_at': datetime.now(),
-        })
-        research_event(research.id, 'ended')
-    
+        slots.release()
+
+
+def log_job_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and (error := task.exception()):
+        logger.error(f"Job failed: {error}", exc_info=error)
 
 
 async def run():
-    print("\033[96m🚀 Worker started\033[0m")
-    async with redis_worker_pubsub_client.pubsub() as pubsub:
-        await pubsub.subscribe(os.getenv("REDIS_WORKER_PUBSUB_CHANNEL", "worker:new_research"))
-        print(f"\033[94m📡 Listening on channel: {os.getenv('REDIS_WORKER_PUBSUB_CHANNEL', 'worker:new_research')}\033[0m")
-        
-        async for message in pubsub.listen():
-            if message['type'] == 'message':
-                research_id = message['data'].decode('utf-8')
-                if research := Research.find_by_id(research_id):
-                    print(f"\033[92m✨ Processing research: {research_id}...\033[0m")
-                    asyncio.create_task(process_research(research))
-                else:
-                    print(f"\033[93m⚠️ Research not found: {research_id}...\033[0m")
-
-
-
-async def run_as_db_polling():
-    if pending_researches := Research.find({"processing_started_at": {"$exists": False}}):
-        tasks = [process_research(research) for research in pending_researches]
-        for task in tasks:
-            asyncio.create_task(task)
\ No newline at end of file
+    logger.info("Worker started")
+    ResearchEvent.create_indexes()
+    PdfAnalysis.create_indexes()
+    ResearchTrace.create_indexes()
+    invalidate_analyses()
+
+    consumer = ResearchQueueConsumer(async_redis_worker_client)
+    await consumer.setup()
+    logger.info(f"Consuming stream: {consumer.stream} as {consumer.consumer_name}")
+    if server := start_metrics_server():
+        logger.info(f"Serving metrics on port {server.server_address[1]}")
+
+    # Jobs are only taken from the stream when a slot is free, the rest stay queued for other workers
+    slots = asyncio.Semaphore(WORKER_CONCURRENCY)
+    while True:
+        await slots.acquire()
+        # Jobs left behind by crashed workers first, then new ones
+        jobs = await consumer.reclaim(count=1) or await consumer.read(count=1)
+        if not jobs:
+            slots.release()
+            # Idle, the queue drained since the last job
+            research_queue_depth.set(await consumer.depth())
+            continue
+
+        task = asyncio.create_task(process_job(consumer, jobs[0], slots))
+        # The event loop only keeps weak references to tasks
+        job_tasks.add(task)
+        task.add_done_callback(job_tasks.discard)
+        task.add_done_callback(log_job_failure)
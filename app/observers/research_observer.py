@@ -10,4 +10,13 @@ class ResearchObserver(ObserverBase):
 
     def on_creating(self, research: 'Research'):
         # research.created_by_user_id = g.user.id
-        pass
+        if research.get('event_sequence') is None:
+            # $inc on a null field fails, so the event log counter has to start as a number
+            research.set('event_sequence', 0)
+        if research.usage is None:
+            # Same for the usage counters, which are $inc-ed into usage.total and usage.agents
+            research.set('usage', {})
+
+    def on_deleted(self, research: 'Research'):
+        from app.models.research_event_model import ResearchEvent
+        ResearchEvent.delete_many({'research_id': research.id})
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from agents import ModelSettings, RunConfig
+
+from app.ai.contexts.research_scope_context import ResearchScopeContext
+from app.ai.model_provider import get_model_provider
+from app.utils.report_input import REPORT_INPUT_MAX_TOKENS
+from app.utils.tokenisor import MESSAGE_OVERHEAD_TOKENS, count_part_tokens, count_tokens, truncate_to_tokens
+
+# Input tokens an agent call may use, instructions and tool schemas excluded
+AGENT_INPUT_MAX_TOKENS = {
+    'keyword_agent': int(os.getenv('KEYWORD_AGENT_INPUT_MAX_TOKENS', 16000)),
+    'results_analyser_agent': int(os.getenv('RESULTS_ANALYSER_INPUT_MAX_TOKENS', 12000)),
+    'report_agent': REPORT_INPUT_MAX_TOKENS,
+    # Output of the get_research_results tool, read by the orchestrator
+    'research_results': int(os.getenv('RESEARCH_RESULTS_MAX_TOKENS', 16000)),
+}
+
+Item = str | dict[str, Any]
+
+
+@dataclass
+class InputSection:
+    """
+    One user message of an agent input. Items are in priority order: when the budget runs out, the last
+    ones are dropped and replaced by `summarise(dropped)`, or by a note saying how many were left out.
+    Required sections are filled first and truncated rather than dropped.
+
+    Kept items are sent in the order of `positions` when given, e.g. their creation order, so a section
+    that only grows between calls still starts with what the previous call sent.
+    """
+    name: str
+    items: list[Item]
+    positions: Optional[list[int]] = None
+    title: Optional[str] = None
+    required: bool = False
+    priority: int = 0
+    empty: Optional[str] = None
+    summarise: Optional[Callable[[list[Item]], str]] = None
+
+
+@dataclass
+class AssembledInput:
+    messages: list[dict[str, Any]]
+    tokens: int
+    max_tokens: int
+    dropped: dict[str, int] = field(default_factory=dict)
+    truncated: list[str] = field(default_factory=list)
+
+    def report(self) -> str:
+        dropped = ', '.join(f"{name}: {count}" for name, count in self.dropped.items()) or 'nothing'
+        truncated = f", truncated {', '.join(self.truncated)}" if self.truncated else ''
+        return f"{self.tokens}/{self.max_tokens} tokens, dropped {dropped}{truncated}"
+
+
+def scope_text(scope: ResearchScopeContext) -> str:
+    """The research scope as sent to every agent, rendered the same way each time so it can be cached."""
+    return scope.model_dump_json(exclude={'research_id'})
+
+
+def agent_run_config(agent_name: str, scope: Optional[ResearchScopeContext] = None) -> RunConfig:
+    """
+    Run config of an agent: the configured model provider (see LLM_MODE) and, given the scope, the provider
+    cache shared by the calls of the agent for the same scope, as they share the prompt prefix of the agent's
+    instructions and the scope.
+    """
+    kwargs = {}
+    if (model_provider := get_model_provider()) is not None:
+        kwargs['model_provider'] = model_provider
+    if scope is not None:
+        key = hashlib.sha256(scope_text(scope).encode('utf-8')).hexdigest()[:16]
+        kwargs['model_settings'] = ModelSettings(extra_args={'prompt_cache_key': f"{agent_name}:{key}"})
+    return RunConfig(**kwargs)
+
+
+def item_tokens(items: list[Item]) -> list[int]:
+    """Token counts of items, text items counted in one batch."""
+    texts = [item for item in items if isinstance(item, str)]
+    text_tokens = iter(count_tokens(texts))
+    return [next(text_tokens) if isinstance(item, str) else count_part_tokens(item) for item in items]
+
+
+def fit_items(items: list[Item], max_tokens: int) -> tuple[list[Item], list[Item], int]:
+    """The leading items that fit in max_tokens, the dropped rest, and the tokens used."""
+    used = 0
+    for i, tokens in enumerate(item_tokens(items)):
+        if used + tokens > max_tokens:
+            return items[:i], items[i:], used
+        used += tokens
+    return items, [], used
+
+
+def json_items(values: list[Any]) -> list[str]:
+    return [json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str) for value in values]
+
+
+def _message(parts: list[Item]) -> dict[str, Any]:
+    # Consecutive text items are sent as one text part
+    content, texts = [], []
+    for part in parts:
+        if isinstance(part, str):
+            texts.append(part)
+            continue
+        if texts:
+            content.append({"type": "input_text", "text": '\n'.join(texts)})
+            texts = []
+        content.append(part)
+    if texts:
+        content.append({"type": "input_text", "text": '\n'.join(texts)})
+    return {"role": "user", "content": content}
+
+
+def assemble_input(sections: list[InputSection], max_tokens: int) -> AssembledInput:
+    """
+    Agent input messages, one per section in the given order, within max_tokens. Required sections are
+    filled first, the others by priority and then order. The same sections and budget always give the
+    same input.
+
+    Providers cache the longest prompt prefix seen before, so sections go from the most to the least stable:
+    the scope first (right after the agent's instructions), growing histories next and per call
+    instructions last.
+    """
+    budget = max_tokens
+    parts: dict[str, list[Item]] = {}
+    assembled = AssembledInput(messages=[], tokens=0, max_tokens=max_tokens)
+
+    fill_order = sorted(range(len(sections)), key=lambda i: (
+        bool(sections[i].items) and not sections[i].required, sections[i].priority, i
+    ))
+    for section in (sections[i] for i in fill_order):
+        items = section.items or ([section.empty] if section.empty else [])
+        if not items:
+            continue
+        title = [section.title] if section.title else []
+        overhead = MESSAGE_OVERHEAD_TOKENS + sum(item_tokens(title))
+        budget -= overhead
+
+        # The placeholder of an empty section is always sent, it's what tells the agent there is nothing yet
+        if section.required or not section.items:
+            section_parts, used = list(items), sum(item_tokens(items))
+            if used > budget:
+                text = truncate_to_tokens('\n'.join(item for item in items if isinstance(item, str)), budget)
+                section_parts = [text] + [item for item in items if not isinstance(item, str)]
+                used = sum(item_tokens(section_parts))
+                assembled.truncated.append(section.name)
+            budget -= used
+            parts[section.name] = title + section_parts
+            continue
+
+        kept, dropped, used = fit_items(items, budget)
+        budget -= used
+        if section.positions and section.items:
+            kept = [item for _, item in sorted(zip(section.positions, kept), key=lambda pair: pair[0])]
+        if dropped:
+            assembled.dropped[section.name] = len(dropped)
+            note = section.summarise(dropped) if section.summarise else \
+                f"[{len(dropped)} further entries left out to fit the input size]"
+            note = truncate_to_tokens(note, budget)
+            budget -= sum(item_tokens([note])) if note else 0
+            kept = kept + [note] if note else kept
+        if kept:
+            parts[section.name] = title + kept
+        else:
+            budget += overhead
+
+    assembled.messages = [_message(parts[section.name]) for section in sections if section.name in parts]
+    assembled.tokens = max_tokens - budget
+    return assembled
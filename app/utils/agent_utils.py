@@ -1,86 +1,128 @@
-import json
+import time
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
-from agents import Agent, AgentHooks, RunContextWrapper, Tool
+from agents import Agent, AgentHooks, ModelResponse, RunContextWrapper, Tool
 from bson import ObjectId
-from colorama import Fore, Style
 
 from app.ai.contexts.research_scope_context import ResearchScopeContext
-from app.models.research_model import Research
-from app.utils.redis_utils import redis_events_pubsub_client
+from app.utils.logger import setup_logger
+from app.utils.metrics import agent_runs, llm_request_duration, llm_requests, llm_tokens
+from app.utils.research_utils import append_research_event, publish_research_delta
+from app.utils.tracing import SPAN_KIND_CLIENT, Tracer, current_span
+from app.utils.usage_utils import agent_model_name, record_llm_usage
 
+logger = setup_logger(__name__)
 
-class PrintHooks(AgentHooks):
-    def __init__(self, display_name: str):
+
+class UsageHooks(AgentHooks):
+    """Accounts the usage and latency of every model call of the agent to its research and to the metrics."""
+
+    def __init__(self):
+        # Start of the running model call per run, an agent runs in several researches at once
+        self._llm_started_at: dict[int, float] = {}
+
+    async def on_llm_start(self, context: RunContextWrapper, agent: Agent, system_prompt, input_items) -> None:
+        self._llm_started_at[id(context)] = time.monotonic()
+
+    async def on_llm_end(self, context: RunContextWrapper, agent: Agent, response: ModelResponse) -> None:
+        started_at = self._llm_started_at.pop(id(context), None)
+        latency_s = time.monotonic() - started_at if started_at is not None else 0
+        model = agent_model_name(agent)
+        try:
+            record_llm_usage(getattr(context.context, 'research_id', None), agent.name, model, response.usage,
+                             latency_s)
+        except Exception as e:
+            logger.warning(f"Failed to record LLM usage of {agent.name}: {e}")
+
+        usage = response.usage
+        llm_requests.inc(agent=agent.name, model=model)
+        llm_request_duration.observe(latency_s, agent=agent.name, model=model)
+        llm_tokens.inc(usage.input_tokens, agent=agent.name, model=model, kind='input')
+        llm_tokens.inc(usage.input_tokens_details.cached_tokens or 0, agent=agent.name, model=model, kind='cached')
+        llm_tokens.inc(usage.output_tokens, agent=agent.name, model=model, kind='output')
+
+
+class TracingHooks(UsageHooks):
+    """
+    Spans of the agent's runs, model calls and tool calls in the research trace, see app.utils.tracing.
+    A run's context and the contexts of its tool calls share the run's usage, which identifies the run.
+    """
+
+    @staticmethod
+    def _tracer() -> Optional[Tracer]:
+        # Hooks run in tasks copied from the run's caller, so they see the stage that started the run
+        span = current_span()
+        return span.tracer if span else None
+
+    async def on_start(self, context: RunContextWrapper, agent: Agent) -> None:
+        agent_runs.inc(agent=agent.name)
+        if tracer := self._tracer():
+            tracer.open(('agent', id(context.usage)), f"agent {agent.name}", current_span(), agent=agent.name)
+
+    async def on_end(self, context: RunContextWrapper, agent: Agent, output: Any) -> None:
+        if tracer := self._tracer():
+            tracer.close(('agent', id(context.usage)))
+
+    async def on_llm_start(self, context: RunContextWrapper, agent: Agent, system_prompt, input_items) -> None:
+        await super().on_llm_start(context, agent, system_prompt, input_items)
+        if tracer := self._tracer():
+            tracer.open(('llm', id(context)), f"llm {agent.name}", tracer.open_spans.get(('agent', id(context.usage))),
+                        kind=SPAN_KIND_CLIENT, model=agent_model_name(agent))
+
+    async def on_llm_end(self, context: RunContextWrapper, agent: Agent, response: ModelResponse) -> None:
+        await super().on_llm_end(context, agent, response)
+        if tracer := self._tracer():
+            tracer.close(('llm', id(context)), input_tokens=response.usage.input_tokens,
+                         output_tokens=response.usage.output_tokens)
+
+    async def on_tool_start(self, context: RunContextWrapper, agent: Agent, tool: Tool) -> None:
+        if (tracer := self._tracer()) and (tool_call_id := getattr(context, 'tool_call_id', None)):
+            tracer.open(('tool', tool_call_id), f"tool {tool.name}", tracer.open_spans.get(('agent', id(context.usage))),
+                        tool=tool.name)
+
+    async def on_tool_end(self, context: RunContextWrapper, agent: Agent, tool: Tool, result: Any) -> None:
+        if (tracer := self._tracer()) and (tool_call_id := getattr(context, 'tool_call_id', None)):
+            tracer.close(('tool', tool_call_id))
+
+
+class LogHooks(TracingHooks):
+    """
+    Logs the agent's runs and tool calls, with their outputs. Agents that run once per PDF pass sampled=True,
+    so only a share of their runs is logged, see app.utils.logger.
+    """
+
+    def __init__(self, display_name: str, *, sampled: bool = False):
+        super().__init__()
         self.event_counter = 0
         self.display_name = display_name
+        self.sampled = sampled
 
-    def _get_agent_color(self) -> str:
-        """Get a consistent color for this agent based on display name"""
-        # Create a simple hash-based color assignment
-        agent_colors = {
-            "orchestrator_agent": Fore.BLUE,
-            "scraping_agent": Fore.CYAN,
-            "pdf_analyser_agent": Fore.MAGENTA,
-            "pdf_reader_agent": Fore.YELLOW,
-            "scraping_results_analyser_agent": Fore.GREEN,  
-            "law_agent": Fore.RED,
-            "report_agent": Fore.CYAN,
-        }
-        # Default color if agent not in mapping
-        return agent_colors.get(self.display_name, Fore.WHITE)
-
-    def _get_event_style(self, event_type: str) -> str:
-        """Get style modifier based on event type"""
-        styles = {
-            "start": Style.BRIGHT,
-            "end": Style.DIM,
-            "handoff": Style.BRIGHT,
-            "tool_start": "",
-            "tool_end": Style.DIM,
-        }
-        return styles.get(event_type, "")
+    def _log(self, message: str, **fields) -> None:
+        self.event_counter += 1
+        logger.info(f"({self.display_name}) {self.event_counter}: {message}",
+                    extra={'agent': self.display_name, 'sampled': self.sampled, **fields})
 
     async def on_start(self, context: RunContextWrapper, agent: Agent) -> None:
-        self.event_counter += 1
-        color = self._get_agent_color()
-        style = self._get_event_style("start")
-        print(f"{color}{style}### ({self.display_name}) {self.event_counter}: Agent {agent.name} started{Style.RESET_ALL}\n")
+        await super().on_start(context, agent)
+        self._log(f"Agent {agent.name} started")
 
     async def on_end(self, context: RunContextWrapper, agent: Agent, output: Any) -> None:
-        self.event_counter += 1
-        color = self._get_agent_color()
-        style = self._get_event_style("end")
-        print(
-            f"{color}{style}### ({self.display_name}) {self.event_counter}: Agent {agent.name} ended with output {output}{Style.RESET_ALL}\n"
-        )
+        await super().on_end(context, agent, output)
+        self._log(f"Agent {agent.name} ended", output=output)
 
     async def on_handoff(self, context: RunContextWrapper, agent: Agent, source: Agent) -> None:
-        self.event_counter += 1
-        color = self._get_agent_color()
-        style = self._get_event_style("handoff")
-        print(
-            f"{color}{style}### ({self.display_name}) {self.event_counter}: Agent {source.name} handed off to {agent.name}{Style.RESET_ALL}\n"
-        )
+        self._log(f"Agent {source.name} handed off to {agent.name}")
 
     async def on_tool_start(self, context: RunContextWrapper, agent: Agent, tool: Tool) -> None:
-        self.event_counter += 1
-        color = self._get_agent_color()
-        style = self._get_event_style("tool_start")
-        print(
-            f"{color}{style}### ({self.display_name}) {self.event_counter}: Agent {agent.name} started tool {tool.name}{Style.RESET_ALL}\n"
-        )
+        await super().on_tool_start(context, agent, tool)
+        self._log(f"Agent {agent.name} started tool {tool.name}", tool=tool.name)
 
     async def on_tool_end(
         self, context: RunContextWrapper, agent: Agent, tool: Tool, result: str
     ) -> None:
-        self.event_counter += 1
-        color = self._get_agent_color()
-        style = self._get_event_style("tool_end")
-        print(
-            f"{color}{style}### ({self.display_name}) {self.event_counter}: Agent {agent.name} ended tool {tool.name} with result {result}{Style.RESET_ALL}\n"
-        )
+        await super().on_tool_end(context, agent, tool, result)
+        self._log(f"Agent {agent.name} ended tool {tool.name}", tool=tool.name, result=result)
 
 
 class ResearchHooks(AgentHooks):
@@ -96,17 +138,16 @@ class ResearchHooks(AgentHooks):
             **data
         }
         
-        if research := Research.find_by_id(research_id):
-            research.update({'events': research.get('events', []) + [event_data]})
-        else:
-            print(f"Research with ID {research_id} not found")
+        if not (logged_event := append_research_event(research_id, event_data)):
+            logger.warning(f"Research with ID {research_id} not found")
+            return
         
         try:
-            redis_events_pubsub_client.publish(f"research:{research_id}", json.dumps(event_data))
+            publish_research_delta(logged_event)
         except Exception as e:
-            print(f"Failed to publish event to Redis: {e}")
+            logger.warning(f"Failed to publish event to Redis: {e}")
             
-        print(event_data)
+        logger.debug(f"Published {event_type} event", extra=event_data)
 
     async def on_agent_start(self, context: RunContextWrapper[ResearchScopeContext], agent: Agent) -> None:
         self.event_counter += 1
@@ -12,6 +12,20 @@ if TYPE_CHECKING:
     from app.models.model_base import ModelBase
 
 
+def int_arg(name: str, default: int = None, *, minimum: int = 0) -> int | None:
+    """An integer query string argument, a 400 error when it isn't one or is below minimum."""
+    value = request.args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise HttpException('invalid_request', 400, message=f"{name} must be an integer")
+    if number < minimum:
+        raise HttpException('invalid_request', 400, message=f"{name} must be at least {minimum}")
+    return number
+
+
 def validate_request(schema, *, exclude_unset=False):
     try:
         json_data = request.get_json()
@@ -1,43 +1,53 @@
-from typing import TYPE_CHECKING
+from typing import Any, Optional
 
-from google.genai.types import GenerateContentResponseUsageMetadata
+from agents.usage import Usage
 from openai.types import CompletionUsage
 
 from app.config.costs import llm_costs
+from app.utils.logger import setup_logger
 
-if TYPE_CHECKING:
-    from app.models.episode_model import Episode
+try:
+    from google.genai.types import GenerateContentResponseUsageMetadata
+except ImportError:
+    GenerateContentResponseUsageMetadata = None
 
+logger = setup_logger(__name__)
 
-def calculate_llm_costs(usage: CompletionUsage | GenerateContentResponseUsageMetadata, model = "gpt-4o-mini-2024-07-18") -> float:
+
+def model_costs(model: str) -> Optional[dict[str, float]]:
     """
-    Calculate the cost of an OpenAI API call based on the usage and the model used.
+    Prices of a model, also for its dated snapshots (e.g. o4-mini-2025-04-16 is priced as o4-mini).
+    None if the model isn't in config/costs.py.
     """
-    if type(usage) == GenerateContentResponseUsageMetadata:
-        input_tokens = usage.prompt_token_count
-        output_tokens = usage.candidates_token_count
-    elif type(usage) == CompletionUsage:
-        input_tokens = usage.prompt_tokens
-        output_tokens = usage.completion_tokens
-    else:
-        raise ValueError("Invalid usage type")
-
-    cost = (llm_costs[model]["input"] / 1000) * input_tokens
-    cost += (llm_costs[model]["output"] / 1000) * output_tokens
-    return cost
+    if model in llm_costs:
+        return llm_costs[model]
+    prefixes = [name for name in llm_costs if model.startswith(f"{name}-")]
+    return llm_costs[max(prefixes, key=len)] if prefixes else None
 
 
-def increase_costs_for_episode_from_usage(episode: 'Episode', usage: CompletionUsage | GenerateContentResponseUsageMetadata, model="gpt-4o-mini-2024-07-18"):
-    """
-    Increase the cost of an episode by the cost of the given usage.
-    """
-    increase_costs_for_episode(episode, calculate_llm_costs(usage, model))
+def usage_tokens(usage: Any) -> tuple[int, int, int]:
+    """Input, cached input and output tokens of an agents, OpenAI or Gemini usage."""
+    if isinstance(usage, Usage):
+        return usage.input_tokens, usage.input_tokens_details.cached_tokens or 0, usage.output_tokens
+    if isinstance(usage, CompletionUsage):
+        cached = usage.prompt_tokens_details.cached_tokens if usage.prompt_tokens_details else 0
+        return usage.prompt_tokens, cached or 0, usage.completion_tokens
+    if GenerateContentResponseUsageMetadata and isinstance(usage, GenerateContentResponseUsageMetadata):
+        return usage.prompt_token_count, usage.cached_content_token_count or 0, usage.candidates_token_count
+    raise ValueError("Invalid usage type")
 
 
-def increase_costs_for_episode(episode: 'Episode', cost: float):
+def calculate_llm_costs(usage: Usage | CompletionUsage, model = "gpt-4o-mini-2024-07-18") -> float:
     """
-    Increase the cost of an episode by the given amount.
+    Calculate the cost of an OpenAI API call based on the usage and the model used.
+    Models without prices cost 0, with a warning.
     """
-    episode.cost = (episode.cost or 0) + cost
-    print("Cost:", "$", cost, " Total:", "$", episode.cost)
-    episode.save()
\ No newline at end of file
+    if not (costs := model_costs(model)):
+        logger.warning(f"No prices for model {model}, its usage is accounted at no cost")
+        return 0.0
+
+    input_tokens, cached_tokens, output_tokens = usage_tokens(usage)
+    cost = (costs["input"] / 1000) * (input_tokens - cached_tokens)
+    cost += (costs.get("cached", costs["input"]) / 1000) * cached_tokens
+    cost += (costs["output"] / 1000) * output_tokens
+    return cost
@@ -0,0 +1,143 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Optional
+
+import httpx
+
+from app.config.core import API_URL
+from app.exceptions.app_exception import AppException
+from app.utils.metrics import pdf_download_duration, pdf_downloads
+
+try:
+    import h2  # noqa: F401 - enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+
+class CircuitOpenError(AppException):
+
+    def __init__(self, base_url: str):
+        super().__init__(f"Circuit open for {base_url}, requests are failing fast")
+
+
+class CircuitBreaker:
+    """
+    Fails fast after `failure_threshold` consecutive failures, then lets a single trial request
+    through every `reset_timeout_s` until one succeeds.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout_s:
+            # Half-open: the next failure re-opens the circuit for another reset timeout
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class CourtApiClient:
+    """
+    Async client of the court decisions API with a shared keep-alive connection pool, retries with
+    jittered exponential backoff and a circuit breaker.
+    """
+
+    def __init__(self, base_url: str = API_URL, *, timeout_s: float = 30, max_retries: int = 3,
+                 backoff_base_s: float = 0.5, max_connections: int = 20, circuit_breaker: CircuitBreaker = None):
+        self.base_url = base_url
+        self.timeout_s = timeout_s
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.max_connections = max_connections
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout_s,
+                http2=HTTP2_AVAILABLE,
+                trust_env=False,  # never route the internal API through a proxy
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def get(self, path: str, params: dict[str, Any] = None) -> httpx.Response:
+        """
+        GET a path of the API. Connection errors, timeouts and 429/5xx responses are retried,
+        other HTTP errors are raised as httpx.HTTPStatusError right away.
+        """
+        for attempt in range(self.max_retries + 1):
+            if not self.circuit_breaker.allow():
+                raise CircuitOpenError(self.base_url)
+
+            try:
+                response = await self.client.get(path, params=params)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    # A 4xx is an answer from a healthy server
+                    self.circuit_breaker.record_success()
+                    response.raise_for_status()
+                    return response
+                error = httpx.HTTPStatusError(f"Server responded with {response.status_code}",
+                                              request=response.request, response=response)
+            except httpx.TransportError as e:
+                error = e
+
+            self.circuit_breaker.record_failure()
+            if attempt == self.max_retries:
+                raise error
+
+            # Full jitter keeps concurrent researches from retrying in lockstep
+            await asyncio.sleep(random.uniform(0, self.backoff_base_s * 2 ** attempt))
+
+    async def search(self, query: str, n_results: int = 50) -> dict[str, Any]:
+        response = await self.get("/search", params={"query": query, "n_results": n_results})
+        return response.json()
+
+    async def get_pdf(self, pdf_file_name: str) -> bytes:
+        started_at = time.perf_counter()
+        try:
+            response = await self.get(f"/pdf/{pdf_file_name}")
+        except Exception:
+            pdf_downloads.inc(result='error')
+            raise
+        pdf_downloads.inc(result='ok')
+        pdf_download_duration.observe(time.perf_counter() - started_at)
+        return response.content
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+court_api_client = CourtApiClient(
+    API_URL,
+    timeout_s=float(os.getenv('API_TIMEOUT_S', 30)),
+    max_retries=int(os.getenv('API_MAX_RETRIES', 3)),
+    max_connections=int(os.getenv('API_MAX_CONNECTIONS', 20)),
+)
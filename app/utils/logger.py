@@ -1,30 +1,174 @@
+import atexit
+import copy
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Iterator, Optional
 
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_DIR = os.getenv('LOG_DIR', os.path.join(os.getcwd(), 'logs'))
+LOG_FILE_MAX_MB = int(os.getenv('LOG_FILE_MAX_MB', 10))
+# Console lines as text, or as the same JSON as the log file
+LOG_CONSOLE_FORMAT = os.getenv('LOG_CONSOLE_FORMAT', 'text')
+# Longer messages and field values, e.g. agent outputs and tool results, are cut to this many characters
+LOG_MAX_FIELD_CHARS = int(os.getenv('LOG_MAX_FIELD_CHARS', 2000))
+# Share of the records logged with extra={'sampled': True} that are kept, warnings and errors are always kept
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 0.1))
+# Records waiting for the writer thread, beyond which new ones are dropped rather than block the caller
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
 
-def setup_logger(module_name):
-    # Create logs directory
-    os.makedirs("logs", exist_ok=True)
+# Fields of the running research, e.g. research_id, added to every record logged in its context
+_log_context: ContextVar[dict[str, Any]] = ContextVar('log_context', default={})
+_listener: Optional[QueueListener] = None
+_console_handler: Optional[logging.Handler] = None
 
-    # Get logger for the module
-    logger = logging.getLogger(module_name)
+# Attributes every LogRecord has, anything else was passed in extra
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+def truncate(value: str, limit: int = LOG_MAX_FIELD_CHARS) -> str:
+    if len(value) <= limit:
+        return value
+    return f"{value[:limit]}… ({len(value) - limit} more characters)"
+
+
+def _loggable(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return truncate(value if isinstance(value, str) else str(value))
+
+
+def record_fields(record: logging.LogRecord) -> dict[str, Any]:
+    # A kept sampled record carries its sample_rate instead
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES and key != 'sampled'}
+
+
+@contextmanager
+def log_context(**fields) -> Iterator[None]:
+    """Add fields to every record logged inside the block, also in tasks it starts."""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a share of the high-volume records, those logged with extra={'sampled': True}."""
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'sampled', False) or record.levelno >= logging.WARNING:
+            return True
+        record.sample_rate = self.rate
+        return random.random() < self.rate
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Hands records to the writer thread. Everything that needs the caller is done here: the message is
+    formatted and truncated, and the log context, a context variable, is added to the record.
+    """
 
-    # Avoid adding handlers multiple times
-    if not logger.handlers:
-        # Create rotating file handler
-        file_handler = RotatingFileHandler(
-            os.path.join(os.getcwd(), 'logs', f"{module_name}.log"),
-            maxBytes=1024 * 1024,
-            backupCount=5
-        )
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = truncate(record.getMessage())
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        for key, value in record_fields(record).items():
+            setattr(record, key, _loggable(value))
+        for key, value in _log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, _loggable(value))
+        return record
 
-        # Create formatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(formatter)
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Logging must never stall the event loop, a burst beyond the queue's size is lost
+            pass
 
-        # Add handler to logger
-        logger.addHandler(file_handler)
-        logger.setLevel(logging.INFO)  # Set appropriate level
 
-    return logger
\ No newline at end of file
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **record_fields(record),
+        }
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Console lines, prefixed by the research the record belongs to."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        research_id = getattr(record, 'research_id', None)
+        return f"[{research_id}] {line}" if research_id else line
+
+
+def setup_logging(service: str = 'app') -> None:
+    """
+    Route the records of every logger through a queue to a background thread, which writes them as JSON
+    lines to logs/{service}.jsonl and as text to the console. Only the first call of a process has an effect.
+    """
+    global _listener, _console_handler
+    if _listener is not None:
+        return
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    file_handler = RotatingFileHandler(os.path.join(LOG_DIR, f"{service}.jsonl"),
+                                       maxBytes=LOG_FILE_MAX_MB * 1024 * 1024, backupCount=5, encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+    _console_handler = logging.StreamHandler(sys.stderr)
+    _console_handler.setFormatter(JsonFormatter() if LOG_CONSOLE_FORMAT == 'json' else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _listener = QueueListener(log_queue, file_handler, _console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    handler = ContextQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter())
+    root = logging.getLogger()
+    root.addHandler(handler)
+    # Libraries only log their warnings, e.g. httpx logs every request at INFO
+    root.setLevel(logging.WARNING)
+    logging.getLogger('app').setLevel(LOG_LEVEL)
+
+
+def set_console_level(level: int) -> None:
+    """Raise the console's level, e.g. to keep the output of a command line tool readable."""
+    if _console_handler is not None:
+        _console_handler.setLevel(level)
+
+
+def setup_logger(module_name):
+    setup_logging()
+    logger = logging.getLogger(module_name)
+    if not module_name.startswith('app.'):
+        # Modules run as scripts are named __main__
+        logger.setLevel(LOG_LEVEL)
+    return logger
@@ -0,0 +1,271 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterator, Optional
+
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Bearer token of the API's /metrics endpoint, which is only served when it is set
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+# Port of the worker's metrics endpoint, 0 to not serve it
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', 9100))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Seconds, from a Mongo query to a whole research
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """A metric family with its labelled series, rendered in the Prometheus text exposition format."""
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues, extra: dict[str, str] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        return '\n'.join(header + self.samples())
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            return [f"{self.name}{self._labels(key)} {_format_value(value)}" for key, value in self._values.items()]
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), *,
+                 callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+        # Read on every scrape, for values owned by other code, e.g. the size of a set
+        self.callback = callback
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        """In progress count: incremented for the duration of the block."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list[str]:
+        if self.callback is not None:
+            try:
+                self.set(self.callback())
+            except Exception as e:
+                logger.warning(f"Failed to read gauge {self.name}: {e}")
+        with self._lock:
+            return [f"{self.name}{self._labels(key)} {_format_value(value)}" for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), *,
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # Per series: count per bucket (not cumulative), sum and count
+        self._values: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            counts, totals = self._values.setdefault(key, ([0] * len(self.buckets), [0.0, 0]))
+            counts[index] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._values.get(self._key(labels))
+        return int(series[1][1]) if series else 0
+
+    def samples(self) -> list[str]:
+        samples = []
+        with self._lock:
+            for key, (counts, (total, count)) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append(f"{self.name}_bucket{self._labels(key, {'le': _format_value(bound)})} {cumulative}")
+                samples.append(f"{self.name}_sum{self._labels(key)} {_format_value(total)}")
+                samples.append(f"{self.name}_count{self._labels(key)} {_format_value(count)}")
+        return samples
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), **kwargs) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, **kwargs))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self.metrics.values()) + '\n'
+
+
+registry = Registry()
+
+# HTTP API
+http_requests = registry.counter('http_requests_total', "HTTP requests handled", ('method', 'endpoint', 'status'))
+http_request_duration = registry.histogram('http_request_duration_seconds', "HTTP request duration",
+                                           ('method', 'endpoint'))
+http_requests_in_progress = registry.gauge('http_requests_in_progress', "HTTP requests being handled")
+auth_attempts = registry.counter('auth_attempts_total', "Authentications of protected routes", ('result',))
+
+# Stores
+mongo_operations = registry.counter('mongo_operations_total', "Mongo operations of the models",
+                                    ('collection', 'operation'))
+mongo_operation_duration = registry.histogram('mongo_operation_duration_seconds', "Mongo operation duration",
+                                              ('operation',))
+cache_requests = registry.counter('cache_requests_total', "Cache lookups by cache and result (hit or miss)",
+                                  ('cache', 'result'))
+redis_publishes = registry.counter('redis_publishes_total', "Messages published to Redis", ('channel',))
+
+# Research pipeline
+researches = registry.counter('researches_total', "Researches processed by status", ('status',))
+research_duration = registry.histogram('research_duration_seconds', "Duration of a whole research", ('status',))
+researches_in_flight = registry.gauge('researches_in_flight', "Researches being processed by this worker")
+research_queue_depth = registry.gauge('research_queue_depth', "Researches waiting for a worker or being processed")
+agent_runs = registry.counter('agent_runs_total', "Agent runs started", ('agent',))
+llm_requests = registry.counter('llm_requests_total', "Model calls", ('agent', 'model'))
+llm_request_duration = registry.histogram('llm_request_duration_seconds', "Model call latency", ('agent', 'model'))
+llm_tokens = registry.counter('llm_tokens_total', "Tokens of model calls by kind (input, cached, output)",
+                              ('agent', 'model', 'kind'))
+pdf_downloads = registry.counter('pdf_downloads_total', "PDF downloads from the court API by result", ('result',))
+pdf_download_duration = registry.histogram('pdf_download_duration_seconds', "PDF download duration")
+
+
+@contextmanager
+def timed_operation(collection: str, operation: str) -> Iterator[None]:
+    """Count and time a Mongo operation."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    mongo_operations.inc(collection=collection, operation=operation)
+    with mongo_operation_duration.time(operation=operation):
+        yield
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = WORKER_METRICS_PORT, host: str = '0.0.0.0') -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on a background thread, for processes without an HTTP server of their own."""
+    if not METRICS_ENABLED or not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        # E.g. another worker on the same host serves the port, set WORKER_METRICS_PORT per worker
+        logger.warning(f"Metrics server not started, port {port} unavailable: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics').start()
+    return server
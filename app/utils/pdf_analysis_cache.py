@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from app.ai.agents.pdf_analyser_agent import PDFAnalyserResult, pdf_analyser_agent
+from app.ai.contexts.research_scope_context import ResearchScopeContext
+from app.models.pdf_analysis_model import PdfAnalysis
+from app.utils.metrics import cache_lookup
+from app.utils.pdf_text import PDF_INPUT_FORMAT
+from app.utils.text_utils import normalise_text
+
+PDF_ANALYSIS_CACHE_TTL_DAYS = int(os.getenv('PDF_ANALYSIS_CACHE_TTL_DAYS', 30))
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# Changes whenever the analyser's instructions, output schema or input format change, invalidating earlier verdicts
+PROMPT_VERSION = _sha256(
+    pdf_analyser_agent.instructions + json.dumps(PDFAnalyserResult.model_json_schema(), sort_keys=True)
+    + PDF_INPUT_FORMAT
+)[:16]
+
+
+def scope_hash(context: ResearchScopeContext) -> str:
+    return _sha256(f"{normalise_text(context.problem_description)}\n{normalise_text(context.question)}")
+
+
+def analysis_cache_key(pdf_content_hash: str, context: ResearchScopeContext, search_keyword: str = None) -> str:
+    # The keyword selects the text windows of the PDF the analyser is given
+    keyword = normalise_text(search_keyword or '')
+    return _sha256(f"{pdf_content_hash}:{scope_hash(context)}:{keyword}:{PROMPT_VERSION}:{pdf_analyser_agent.model}")
+
+
+def get_cached_analysis(pdf_content_hash: str, context: ResearchScopeContext, *,
+                        search_keyword: str = None) -> Optional[PDFAnalyserResult]:
+    """Verdict of an earlier analysis of the same PDF content for an equivalent scope and keyword, relevant or not."""
+    analysis = PdfAnalysis.find_one({
+        'cache_key': analysis_cache_key(pdf_content_hash, context, search_keyword),
+        # The TTL monitor runs about once a minute, expired entries may still be there
+        'expires_at': {'$gt': datetime.now()},
+    })
+    cache_lookup('pdf_analysis', analysis is not None)
+    return PDFAnalyserResult(**analysis.result) if analysis else None
+
+
+def store_analysis(pdf_content_hash: str, context: ResearchScopeContext, result: PDFAnalyserResult, *,
+                   search_keyword: str = None) -> None:
+    query = {'cache_key': analysis_cache_key(pdf_content_hash, context, search_keyword)}
+    update = {
+        '$set': {
+            'pdf_content_hash': pdf_content_hash,
+            'scope_hash': scope_hash(context),
+            'prompt_version': PROMPT_VERSION,
+            'model': pdf_analyser_agent.model,
+            'result': result.model_dump(),
+            'expires_at': datetime.now() + timedelta(days=PDF_ANALYSIS_CACHE_TTL_DAYS),
+        },
+        '$setOnInsert': {'created_at': datetime.now()},
+        '$currentDate': {'updated_at': True},
+    }
+    try:
+        PdfAnalysis.find_one_and_update(query, update, upsert=True)
+    except DuplicateKeyError:
+        # A concurrent analysis of the same PDF inserted the entry first, it is updated instead
+        PdfAnalysis.find_one_and_update(query, update)
+
+
+def invalidate_analyses(*, pdf_content_hash: str = None) -> None:
+    """Drop verdicts of older prompt versions, or all verdicts of one PDF."""
+    if pdf_content_hash:
+        PdfAnalysis.delete_many({'pdf_content_hash': pdf_content_hash})
+    else:
+        PdfAnalysis.delete_many({'prompt_version': {'$ne': PROMPT_VERSION}})
@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from app.utils.court_api_client import court_api_client
+from app.utils.metrics import cache_lookup
+from app.utils.single_flight import single_flight
+
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(os.getcwd(), 'cache', 'pdf'))
+PDF_CACHE_MAX_MB = int(os.getenv('PDF_CACHE_MAX_MB', 2048))
+PDF_CACHE_MEMORY_MB = int(os.getenv('PDF_CACHE_MEMORY_MB', 64))
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class PdfCache:
+    """
+    Content-addressed cache of court decision PDFs.
+
+    Files are stored once per content hash under blobs/, and names/ maps a pdf_file_name to the hash of
+    its content. Court decisions never change, so entries are only dropped by the size bound: the least
+    recently used blobs (by mtime, touched on every hit) are evicted once the directory exceeds max_bytes.
+    All writes go through a temporary file and os.replace, so several worker processes can share the
+    directory. Recently used PDFs are also kept in memory, up to memory_bytes.
+    """
+
+    def __init__(self, directory: str = PDF_CACHE_DIR, *, max_bytes: int = PDF_CACHE_MAX_MB * 1024 * 1024,
+                 memory_bytes: int = PDF_CACHE_MEMORY_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_size = 0
+        self._disk_size: Optional[int] = None
+        # Writes run in threads, the size is updated and the directory evicted by one of them at a time
+        self._disk_lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def get_or_fetch(self, pdf_file_name: str, fetch: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Get a PDF from the cache, or fetch it once even when requested concurrently, and store it."""
+        if (content := self._memory_get(pdf_file_name)) is not None:
+            self.stats['memory_hits'] += 1
+            cache_lookup('pdf', True)
+            return content
+
+        return await single_flight(self._inflight, pdf_file_name, lambda: self._read_or_fetch(pdf_file_name, fetch))
+
+    async def _read_or_fetch(self, pdf_file_name: str, fetch: Callable[[], Awaitable[bytes]]) -> bytes:
+        content = await asyncio.to_thread(self.read, pdf_file_name)
+        cache_lookup('pdf', content is not None)
+        if content is not None:
+            self.stats['disk_hits'] += 1
+        else:
+            self.stats['misses'] += 1
+            content = await fetch()
+            await asyncio.to_thread(self.write, pdf_file_name, content)
+
+        self._memory_put(pdf_file_name, content)
+        return content
+
+    def content_hash(self, pdf_file_name: str) -> Optional[str]:
+        """Hash of a cached PDF's content, None if the PDF was never cached."""
+        try:
+            with open(self._name_path(pdf_file_name), 'r') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def read(self, pdf_file_name: str) -> Optional[bytes]:
+        if not (content_hash := self.content_hash(pdf_file_name)):
+            return None
+
+        blob_path = self._blob_path(content_hash)
+        try:
+            with open(blob_path, 'rb') as f:
+                content = f.read()
+            os.utime(blob_path)
+        except FileNotFoundError:
+            # Evicted by this or another process since the name was written
+            return None
+        return content
+
+    def write(self, pdf_file_name: str, content: bytes) -> str:
+        content_hash = sha256(content)
+        blob_path = self._blob_path(content_hash)
+        if not os.path.exists(blob_path):
+            self._atomic_write(blob_path, content)
+            self._track_disk_size(len(content))
+        self._atomic_write(self._name_path(pdf_file_name), content_hash.encode('utf-8'))
+        return content_hash
+
+    def evict(self, target_bytes: int) -> None:
+        """Delete least recently used blobs until the cache holds at most target_bytes."""
+        with self._disk_lock:
+            self._evict(target_bytes)
+
+    def _evict(self, target_bytes: int) -> None:
+        blobs = []
+        for root, _, files in os.walk(os.path.join(self.directory, 'blobs')):
+            for file in files:
+                if file.startswith('.tmp-'):
+                    # Another process is writing it
+                    continue
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(blob_size for _, blob_size, _ in blobs)
+        for _, blob_size, path in sorted(blobs):
+            if size <= target_bytes:
+                break
+            try:
+                os.remove(path)
+                self.stats['evictions'] += 1
+            except FileNotFoundError:
+                pass
+            size -= blob_size
+        # Names pointing to evicted blobs are treated as misses and overwritten on the next fetch
+        self._disk_size = size
+
+    def _track_disk_size(self, added_bytes: int) -> None:
+        with self._disk_lock:
+            if self._disk_size is None:
+                self._evict(self.max_bytes)
+            else:
+                self._disk_size += added_bytes
+
+            if self._disk_size > self.max_bytes:
+                # Evict below the bound so the directory isn't rescanned on every write
+                self._evict(int(self.max_bytes * 0.9))
+
+    def _memory_get(self, pdf_file_name: str) -> Optional[bytes]:
+        content = self._memory.get(pdf_file_name)
+        if content is not None:
+            self._memory.move_to_end(pdf_file_name)
+        return content
+
+    def _memory_put(self, pdf_file_name: str, content: bytes) -> None:
+        if len(content) > self.memory_bytes or pdf_file_name in self._memory:
+            return
+        self._memory[pdf_file_name] = content
+        self._memory_size += len(content)
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, 'blobs', content_hash[:2], f"{content_hash}.pdf")
+
+    def _name_path(self, pdf_file_name: str) -> str:
+        return os.path.join(self.directory, 'names', sha256(pdf_file_name.encode('utf-8')))
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+pdf_cache = PdfCache()
+
+
+async def get_pdf(pdf_file_name: str) -> bytes:
+    """Get a decision PDF, downloading it from the court decisions API only on a cache miss."""
+    return await pdf_cache.get_or_fetch(pdf_file_name, lambda: court_api_client.get_pdf(pdf_file_name))
@@ -0,0 +1,199 @@
+import asyncio
+import base64
+import io
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from app.utils.logger import setup_logger
+from app.utils.pdf_cache import PDF_CACHE_DIR, sha256
+from app.utils.result_ranker import BM25, tokenise
+
+try:
+    import pypdf
+    PDF_TEXT_EXTRACTION_AVAILABLE = True
+except ImportError:
+    PDF_TEXT_EXTRACTION_AVAILABLE = False
+
+logger = setup_logger(__name__)
+
+PDF_TEXT_CACHE_DIR = os.getenv('PDF_TEXT_CACHE_DIR', os.path.join(os.path.dirname(PDF_CACHE_DIR), 'pdf_text'))
+# Upper bound of the text sent to an agent instead of a whole PDF
+PDF_EXCERPT_MAX_CHARS = int(os.getenv('PDF_EXCERPT_MAX_CHARS', 12000))
+PDF_WINDOW_CHARS = int(os.getenv('PDF_WINDOW_CHARS', 1500))
+# Less text than this means a scanned decision without a text layer, which only the model can read
+MIN_EXTRACTED_CHARS = 500
+
+HEADER_MAX_CHARS = 1500
+VERDICT_MAX_CHARS = 2500
+
+# Identifies what the PDF analyser is given for a PDF, part of its cached verdicts' key. Bump the leading
+# number whenever pdf_input_content, the excerpt or the layout of the analyser's input changes.
+PDF_INPUT_FORMAT = (f"2:{PDF_TEXT_EXTRACTION_AVAILABLE}:{PDF_EXCERPT_MAX_CHARS}:{PDF_WINDOW_CHARS}:"
+                    f"{MIN_EXTRACTED_CHARS}:{HEADER_MAX_CHARS}:{VERDICT_MAX_CHARS}")
+
+# Markers of Slovak court decisions, matched case-insensitively on the extracted text
+VERDICT_START = re.compile(r'\b(rozhodol|rozhodla|rozhodli)\b[^\n]{0,80}?\btakto\s*:', re.IGNORECASE)
+REASONING_START = re.compile(r'^\s*o\s*d\s*[ôo]\s*v\s*o\s*d\s*n\s*e\s*n\s*i\s*e\b', re.IGNORECASE | re.MULTILINE)
+INSTRUCTION_START = re.compile(r'^\s*pou[čc]enie\b', re.IGNORECASE | re.MULTILINE)
+
+
+@dataclass
+class DecisionSections:
+    header: str = ''
+    verdict: str = ''
+    reasoning: str = ''
+
+
+@dataclass
+class DecisionExcerpt:
+    pdf_file_name: str
+    header: str
+    verdict: str
+    windows: list[str] = field(default_factory=list)
+    complete: bool = False
+
+    def render(self) -> str:
+        parts = [f"<decision file_name=\"{self.pdf_file_name}\" excerpt=\"{'false' if self.complete else 'true'}\">"]
+        if self.header:
+            parts.append(f"<header>\n{self.header}\n</header>")
+        if self.verdict:
+            parts.append(f"<verdict>\n{self.verdict}\n</verdict>")
+        parts += [f"<reasoning_excerpt>\n{window}\n</reasoning_excerpt>" for window in self.windows]
+        parts.append("</decision>")
+        return '\n'.join(parts)
+
+
+def extract_text(pdf_content: bytes) -> Optional[str]:
+    """Plain text of a PDF, None if it has no usable text layer or can't be parsed."""
+    if not PDF_TEXT_EXTRACTION_AVAILABLE:
+        return None
+    try:
+        reader = pypdf.PdfReader(io.BytesIO(pdf_content))
+        text = '\n'.join(page.extract_text() or '' for page in reader.pages)
+    except Exception as e:
+        logger.warning(f"Error extracting PDF text: {e}")
+        return None
+
+    text = re.sub(r'[ \t]+', ' ', text)
+    text = re.sub(r'\n\s*\n+', '\n\n', text).strip()
+    return text if len(text) >= MIN_EXTRACTED_CHARS else None
+
+
+def cached_text(pdf_content: bytes) -> Optional[str]:
+    """
+    extract_text cached on disk per content hash. Failed extractions are remembered as empty files,
+    so scanned decisions aren't parsed again on every analysis.
+    """
+    path = os.path.join(PDF_TEXT_CACHE_DIR, f"{sha256(pdf_content)}.txt")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read() or None
+    except FileNotFoundError:
+        pass
+
+    text = extract_text(pdf_content)
+    if PDF_TEXT_EXTRACTION_AVAILABLE:
+        os.makedirs(PDF_TEXT_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=PDF_TEXT_CACHE_DIR, prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text or '')
+        os.replace(tmp_path, path)
+    return text
+
+
+def split_sections(text: str) -> DecisionSections:
+    """Split a decision into the header (court, parties), the verdict and the reasoning, dropping the instruction."""
+    if instruction := INSTRUCTION_START.search(text):
+        text = text[:instruction.start()]
+
+    reasoning = REASONING_START.search(text)
+    verdict = VERDICT_START.search(text, 0, reasoning.start() if reasoning else len(text))
+    if not reasoning:
+        # Unknown layout, everything after the header is searched for relevant windows
+        header = text[:min(verdict.start(), HEADER_MAX_CHARS)] if verdict else ''
+        return DecisionSections(header=header.strip(), reasoning=text[len(header):].strip())
+
+    return DecisionSections(
+        header=text[:verdict.start() if verdict else min(reasoning.start(), HEADER_MAX_CHARS)].strip(),
+        verdict=text[verdict.start():reasoning.start()].strip() if verdict else '',
+        reasoning=text[reasoning.end():].strip(),
+    )
+
+
+def split_windows(text: str, window_chars: int = PDF_WINDOW_CHARS) -> list[str]:
+    """Consecutive paragraphs joined into windows of about window_chars."""
+    windows, current = [], ''
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        while len(paragraph) > window_chars:
+            cut = paragraph.rfind(' ', 0, window_chars)
+            cut = cut if cut > 0 else window_chars
+            if current:
+                windows.append(current)
+                current = ''
+            windows.append(paragraph[:cut])
+            paragraph = paragraph[cut:].strip()
+        if current and len(current) + len(paragraph) > window_chars:
+            windows.append(current)
+            current = ''
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        windows.append(current)
+    return windows
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    return text if len(text) <= max_chars else text[:max_chars].rsplit(' ', 1)[0] + ' […]'
+
+
+def decision_excerpt(pdf_file_name: str, text: str, query: str, *,
+                     max_chars: int = PDF_EXCERPT_MAX_CHARS) -> DecisionExcerpt:
+    """
+    The header, the verdict and the reasoning windows best matching the query by BM25, in document order,
+    within max_chars. A short decision is returned whole.
+    """
+    sections = split_sections(text)
+    header = _truncate(sections.header, HEADER_MAX_CHARS)
+    verdict = _truncate(sections.verdict, VERDICT_MAX_CHARS)
+    windows = split_windows(sections.reasoning)
+
+    budget = max_chars - len(header) - len(verdict)
+    if sum(len(window) for window in windows) <= budget:
+        return DecisionExcerpt(pdf_file_name, header, verdict, windows, complete=True)
+
+    scores = BM25([tokenise(window) for window in windows]).scores(tokenise(query))
+    selected = []
+    for i in sorted(range(len(windows)), key=lambda i: (-scores[i], i)):
+        if len(windows[i]) <= budget:
+            selected.append(i)
+            budget -= len(windows[i])
+    return DecisionExcerpt(pdf_file_name, header, verdict, [windows[i] for i in sorted(selected)])
+
+
+def estimate_pdf_tokens(pdf_content: bytes) -> int:
+    """Tokens a model is billed for reading a PDF, estimated from its text, or its size for scanned PDFs."""
+    if text := cached_text(pdf_content):
+        # Imported here, tokenisor imports this module for its file parts
+        from app.utils.tokenisor import num_tokens_from_string
+        return num_tokens_from_string(text)
+    return len(pdf_content) // 4
+
+
+async def pdf_input_content(pdf_file_name: str, pdf_content: bytes, query: str) -> list[dict[str, Any]]:
+    """
+    Agent input content for a decision: the relevant text windows when the text can be extracted,
+    otherwise the whole PDF as a file.
+    """
+    text = await asyncio.to_thread(cached_text, pdf_content)
+    if text:
+        excerpt = await asyncio.to_thread(decision_excerpt, pdf_file_name, text, query)
+        return [{"type": "input_text", "text": excerpt.render()}]
+
+    return [{
+        "type": "input_file",
+        "filename": pdf_file_name,
+        "file_data": f"data:application/pdf;base64,{base64.b64encode(pdf_content).decode('utf-8')}",
+    }]
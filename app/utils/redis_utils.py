@@ -1,6 +1,7 @@
 import os
 
 import redis
+import redis.asyncio
 
 redis_events_pubsub_client = redis.Redis(
     host=os.getenv("REDIS_HOST", "localhost"), 
@@ -12,4 +13,11 @@ redis_worker_pubsub_client = redis.Redis(
     host=os.getenv("REDIS_HOST", "localhost"), 
     port=int(os.getenv("REDIS_PORT", 6379)), 
     db=int(os.getenv("REDIS_WORKER_PUBSUB_DB", 11))
-)
\ No newline at end of file
+)
+
+# The worker's client of the same database, for asyncio code such as the research queue consumer
+async_redis_worker_client = redis.asyncio.Redis(
+    host=os.getenv("REDIS_HOST", "localhost"),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    db=int(os.getenv("REDIS_WORKER_PUBSUB_DB", 11))
+)
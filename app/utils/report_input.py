@@ -0,0 +1,162 @@
+import asyncio
+import base64
+import os
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from app.models.research_trace_model import ResearchTrace
+from app.utils.logger import setup_logger
+from app.utils.pdf_cache import get_pdf, pdf_cache
+from app.utils.pdf_text import cached_text, decision_excerpt, estimate_pdf_tokens
+from app.utils.result_ranker import BM25, tokenise
+from app.utils.tokenisor import count_tokens, num_tokens_from_string
+
+logger = setup_logger(__name__)
+
+# Token budget of the court decisions part of the report agent's input
+REPORT_INPUT_MAX_TOKENS = int(os.getenv('REPORT_INPUT_MAX_TOKENS', 60000))
+# Best ranked cases attached as whole PDFs, on top of their stored excerpts
+REPORT_FULL_PDF_TOP_N = int(os.getenv('REPORT_FULL_PDF_TOP_N', 0))
+# Text windows of a cached decision added to a case
+REPORT_CASE_EXCERPT_CHARS = int(os.getenv('REPORT_CASE_EXCERPT_CHARS', 4000))
+REPORT_PDF_TIMEOUT_S = int(os.getenv('REPORT_PDF_TIMEOUT_S', 60))
+
+
+@dataclass
+class ReportCase:
+    trace: ResearchTrace
+    brief: str
+    detail: str
+    brief_tokens: int
+    detail_tokens: int
+    level: str = 'omitted'  # omitted, brief, detail, excerpt or pdf
+    excerpt: Optional[str] = None
+    pdf_content: Optional[bytes] = None
+
+
+@dataclass
+class ReportInput:
+    content: list[dict[str, Any]] = field(default_factory=list)
+    tokens: int = 0
+    cases: int = 0
+    levels: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def omitted_cases(self) -> int:
+        return self.levels.get('omitted', 0)
+
+
+def render_brief(trace: ResearchTrace) -> str:
+    return f"<case file_name=\"{trace.pdf_file_name}\" brief=\"true\">{trace.metadata or ''} — {trace.summary or ''}</case>"
+
+
+def render_detail(trace: ResearchTrace) -> str:
+    parts = [f"<case file_name=\"{trace.pdf_file_name}\">", f"metadata: {trace.metadata or ''}",
+             f"summary: {trace.summary or ''}"]
+    if trace.legal_provisions:
+        parts.append(f"legal_provisions: {'; '.join(trace.legal_provisions)}")
+    if trace.relevant_parts:
+        parts.append("relevant_parts:")
+        parts += [f"- \"{part}\"" for part in trace.relevant_parts]
+    parts.append("</case>")
+    return '\n'.join(parts)
+
+
+def rank_traces(traces: list[ResearchTrace], query: str) -> list[ResearchTrace]:
+    """
+    Most relevant cases first, by BM25 of their stored findings against the scope. Ties are ordered by file name,
+    as concurrent searches store the same cases in a different order each run.
+    """
+    documents = [
+        tokenise(' '.join([trace.summary or '', *(trace.relevant_parts or []), *(trace.legal_provisions or [])]))
+        for trace in traces
+    ]
+    scores = BM25(documents).scores(tokenise(query)) if traces else []
+    return [traces[i] for i in sorted(range(len(traces)), key=lambda i: (-scores[i], traces[i].pdf_file_name or '', i))]
+
+
+def local_excerpt(trace: ResearchTrace, query: str) -> Optional[str]:
+    """Relevant windows of a decision whose PDF is already cached on disk, never downloading it."""
+    if (pdf_content := pdf_cache.read(trace.pdf_file_name)) is None or not (text := cached_text(pdf_content)):
+        return None
+    return decision_excerpt(trace.pdf_file_name, text, query, max_chars=REPORT_CASE_EXCERPT_CHARS).render()
+
+
+async def _download(pdf_file_name: str) -> Optional[bytes]:
+    try:
+        return await asyncio.wait_for(get_pdf(pdf_file_name), timeout=REPORT_PDF_TIMEOUT_S)
+    except Exception as e:
+        logger.warning(f"Error downloading PDF {pdf_file_name} for the report: {e}")
+        return None
+
+
+async def build_report_input(research_id: str, query: str, *, max_tokens: int = REPORT_INPUT_MAX_TOKENS,
+                             full_pdf_top_n: int = REPORT_FULL_PDF_TOP_N) -> ReportInput:
+    """
+    Input content of the report agent from the stored findings of the research's relevant cases, within
+    max_tokens regardless of how many cases were found.
+
+    Cases are ranked against the query and the budget is spent greedily: every case gets a one-line brief
+    (the lowest ranked are omitted once even those don't fit), then, best first, cases are upgraded to their
+    summary, provisions and relevant parts, then to text windows of their locally cached decision, and the
+    top full_pdf_top_n to the whole PDF. The result is the same for the same findings and budget.
+    """
+    traces = rank_traces(ResearchTrace.find({'research_id': research_id, 'is_relevant': True}), query)
+    briefs, details = [render_brief(trace) for trace in traces], [render_detail(trace) for trace in traces]
+    cases = [
+        ReportCase(trace, brief, detail, brief_tokens, detail_tokens)
+        for trace, brief, detail, brief_tokens, detail_tokens
+        in zip(traces, briefs, details, count_tokens(briefs), count_tokens(details))
+    ]
+
+    budget = max_tokens
+    for case in cases:
+        if case.brief_tokens <= budget:
+            case.level = 'brief'
+            budget -= case.brief_tokens
+
+    for case in cases:
+        if case.level == 'brief' and case.detail_tokens - case.brief_tokens <= budget:
+            case.level = 'detail'
+            budget -= case.detail_tokens - case.brief_tokens
+
+    for case in cases:
+        if case.level != 'detail' or budget <= 0:
+            continue
+        excerpt = await asyncio.to_thread(local_excerpt, case.trace, query)
+        if excerpt and (excerpt_tokens := num_tokens_from_string(excerpt)) <= budget:
+            case.level, case.excerpt = 'excerpt', excerpt
+            budget -= excerpt_tokens
+
+    top_cases = [case for case in cases if case.level in ('detail', 'excerpt')][:full_pdf_top_n]
+    pdf_contents = await asyncio.gather(*[_download(case.trace.pdf_file_name) for case in top_cases])
+    for case, pdf_content in zip(top_cases, pdf_contents):
+        if pdf_content is None:
+            continue
+        freed = num_tokens_from_string(case.excerpt) if case.excerpt else 0
+        if (pdf_tokens := await asyncio.to_thread(estimate_pdf_tokens, pdf_content)) <= budget + freed:
+            case.level, case.excerpt, case.pdf_content = 'pdf', None, pdf_content
+            budget += freed - pdf_tokens
+
+    report_input = ReportInput(tokens=max_tokens - budget, cases=len(cases))
+    for case in cases:
+        report_input.levels[case.level] = report_input.levels.get(case.level, 0) + 1
+        if case.level == 'omitted':
+            continue
+        text = case.brief if case.level == 'brief' else case.detail
+        if case.excerpt:
+            text = f"{text}\n{case.excerpt}"
+        report_input.content.append({"type": "input_text", "text": text})
+        if case.pdf_content:
+            report_input.content.append({
+                "type": "input_file",
+                "filename": case.trace.pdf_file_name,
+                "file_data": f"data:application/pdf;base64,{base64.b64encode(case.pdf_content).decode('utf-8')}",
+            })
+
+    if report_input.omitted_cases:
+        report_input.content.append({
+            "type": "input_text",
+            "text": f"{report_input.omitted_cases} further relevant cases were left out to fit the input size.",
+        })
+    return report_input
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import socket
+import uuid
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+import redis
+
+from app.utils.redis_utils import redis_worker_pubsub_client
+
+if TYPE_CHECKING:
+    import redis.asyncio
+
+RESEARCH_STREAM = os.getenv("REDIS_WORKER_STREAM", "worker:research_stream")
+RESEARCH_GROUP = os.getenv("REDIS_WORKER_GROUP", "research_workers")
+# A job whose worker stopped heartbeating for this long is handed to another worker
+VISIBILITY_TIMEOUT_MS = int(os.getenv("WORKER_VISIBILITY_TIMEOUT_S", 120)) * 1000
+STREAM_MAX_LEN = 10000
+
+
+def enqueue_research(research_id: str, client: redis.Redis = None, *, stream: str = RESEARCH_STREAM) -> str:
+    """
+    Add a research to the durable worker stream. The entry stays in Redis until a worker acknowledges it,
+    so jobs are not lost when no worker is connected.
+    """
+    client = client or redis_worker_pubsub_client
+    message_id = client.xadd(stream, {'research_id': str(research_id)}, maxlen=STREAM_MAX_LEN,
+                             approximate=True)
+    return message_id.decode('utf-8') if isinstance(message_id, bytes) else message_id
+
+
+def default_consumer_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+@dataclass
+class ResearchJob:
+    message_id: str
+    research_id: str
+    reclaimed: bool = False
+    heartbeat_task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+
+class ResearchQueueConsumer:
+    """
+    Consumer of the research stream within the worker consumer group.
+
+    Delivery is at-least-once: a job is acknowledged only after it was processed, and jobs of a crashed
+    worker are reclaimed with XAUTOCLAIM once they were idle for the visibility timeout. Running jobs are
+    kept alive by a heartbeat. A per-research lock makes sure a research is processed by a single worker
+    even when it was enqueued twice or reclaimed while still running.
+    """
+
+    def __init__(self, client: 'redis.asyncio.Redis', consumer_name: str = None, *, stream: str = RESEARCH_STREAM,
+                 group: str = RESEARCH_GROUP, visibility_timeout_ms: int = VISIBILITY_TIMEOUT_MS):
+        self.client = client
+        self.consumer_name = consumer_name or default_consumer_name()
+        self.stream = stream
+        self.group = group
+        self.visibility_timeout_ms = visibility_timeout_ms
+
+    async def setup(self) -> None:
+        try:
+            await self.client.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def read(self, count: int = 1, block_ms: int = 5000) -> list[ResearchJob]:
+        """Read jobs that were never delivered to any worker."""
+        response = await self.client.xreadgroup(self.group, self.consumer_name, {self.stream: '>'}, count=count,
+                                                block=block_ms)
+        return [self._job(message_id, fields) for _, messages in response or [] for message_id, fields in messages]
+
+    async def reclaim(self, count: int = 10) -> list[ResearchJob]:
+        """Take over jobs of workers that stopped heartbeating."""
+        _, messages, *_ = await self.client.xautoclaim(self.stream, self.group, self.consumer_name,
+                                                       min_idle_time=self.visibility_timeout_ms, count=count)
+        return [self._job(message_id, fields, reclaimed=True) for message_id, fields in messages if fields]
+
+    async def acquire(self, job: ResearchJob) -> bool:
+        """Lock the job's research for this consumer and start heartbeating, False if another worker runs it."""
+        locked = await self.client.set(self._lock_key(job.research_id), self.consumer_name, nx=True,
+                                       px=self.visibility_timeout_ms)
+        if not locked:
+            owner = await self.client.get(self._lock_key(job.research_id))
+            if owner is None or self._decode(owner) != self.consumer_name:
+                return False
+
+        job.heartbeat_task = asyncio.create_task(self._heartbeat(job))
+        return True
+
+    async def ack(self, job: ResearchJob, *, release: bool = True) -> None:
+        await self.client.xack(self.stream, self.group, job.message_id)
+        if release:
+            await self.release(job)
+
+    async def release(self, job: ResearchJob) -> None:
+        """Stop heartbeating and unlock the job's research if this consumer holds the lock."""
+        if job.heartbeat_task:
+            job.heartbeat_task.cancel()
+            job.heartbeat_task = None
+
+        if self._decode(await self.client.get(self._lock_key(job.research_id))) == self.consumer_name:
+            await self.client.delete(self._lock_key(job.research_id))
+
+    async def requeue(self, job: ResearchJob) -> None:
+        """Move the job to the end of the stream, e.g. to let other users' researches go first."""
+        await self.release(job)
+        # In one transaction, so a crash in between can't leave the job queued twice
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.xadd(self.stream, {'research_id': job.research_id}, maxlen=STREAM_MAX_LEN, approximate=True)
+            pipe.xack(self.stream, self.group, job.message_id)
+            await pipe.execute()
+
+    async def locked(self, research_ids: list) -> int:
+        """Number of the researches locked by a worker, i.e. being processed right now."""
+        if not research_ids:
+            return 0
+        return await self.client.exists(*[self._lock_key(str(research_id)) for research_id in research_ids])
+
+    async def depth(self) -> int:
+        """Number of jobs waiting for a worker or being processed."""
+        for group in await self.client.xinfo_groups(self.stream):
+            if self._decode(group['name']) == self.group:
+                return (group.get('lag') or 0) + group['pending']
+        return 0
+
+    async def pending(self) -> int:
+        """Number of delivered but not yet acknowledged jobs in the group."""
+        summary = await self.client.xpending(self.stream, self.group)
+        return summary['pending'] if summary else 0
+
+    async def _heartbeat(self, job: ResearchJob) -> None:
+        while True:
+            await asyncio.sleep(self.visibility_timeout_ms / 3000)
+            # Re-claiming our own entry resets its idle time so XAUTOCLAIM leaves it alone
+            await self.client.xclaim(self.stream, self.group, self.consumer_name, min_idle_time=0,
+                                     message_ids=[job.message_id], justid=True)
+            await self.client.pexpire(self._lock_key(job.research_id), self.visibility_timeout_ms)
+
+    def _job(self, message_id, fields: dict, *, reclaimed: bool = False) -> ResearchJob:
+        research_id = fields.get(b'research_id', fields.get('research_id'))
+        return ResearchJob(message_id=self._decode(message_id), research_id=self._decode(research_id),
+                           reclaimed=reclaimed)
+
+    def _lock_key(self, research_id: str) -> str:
+        return f"{self.stream}:lock:{research_id}"
+
+    @staticmethod
+    def _decode(value) -> Optional[str]:
+        return value.decode('utf-8') if isinstance(value, bytes) else value
@@ -1,23 +1,67 @@
 import json
+from typing import Optional
 
 from bson import ObjectId
 
-from app.http_files.resources.research_resource import ResearchResource
+from app.models.research_event_model import ResearchEvent
 from app.models.research_model import Research
+from app.utils.metrics import redis_publishes
 from app.utils.redis_utils import redis_events_pubsub_client
+from app.utils.serialisation_helper import serialise
+from app.utils.tracing import SPAN_KIND_CLIENT, stage
 
 
-def research_event(research_id: str | ObjectId, event_type: str, event_data: dict = None):
+def append_research_event(research_id: str | ObjectId, event: dict) -> Optional[ResearchEvent]:
+    """
+    Append an event to the research event log.
+    The sequence number is reserved with an atomic update, so the research document is never rewritten.
+    Reserving it and inserting the event are two writes: when the insert fails the number stays unused, and
+    subscribers waiting for it resync from a snapshot, see `publish_research_delta`.
+    """
+    research_id = ObjectId(research_id) if isinstance(research_id, str) else research_id
+    # Researches created before the event log continue after their embedded events
+    research = Research.find_one_and_update(
+        {'_id': research_id},
+        [{'$set': {'event_sequence': {'$add': [
+            {'$max': [{'$ifNull': ['$event_sequence', 0]}, {'$size': {'$ifNull': ['$events', []]}}]}, 1,
+        ]}}}],
+        projection={'event_sequence': True},
+    )
+    if not research:
+        return None
+
+    return ResearchEvent.create({
+        'research_id': research_id,
+        'sequence': research.event_sequence,
+        'event': event,
+    })
+
+
+def publish_research_delta(research_event: ResearchEvent, changes: dict = None):
+    """
+    Publish a logged event on the research:{id} channel together with the research fields it changed.
+    Sequence numbers increase by one per event, so a subscriber that sees a gap should request a snapshot
+    (the socket.io 'snapshot' message with `after` set to its last sequence) and continue from the snapshot's
+    event_sequence: an event whose insert failed leaves a gap that is never filled.
+    """
+    delta = {
+        "research_id": research_event.research_id,
+        "sequence": research_event.sequence,
+        "event": research_event.event,
+        "changes": changes or {},
+    }
+    with stage('event publish', kind=SPAN_KIND_CLIENT, type=(research_event.event or {}).get('type')):
+        redis_events_pubsub_client.publish(f"research:{str(research_event.research_id)}", json.dumps(serialise(delta)))
+    redis_publishes.inc(channel='research')
+
+
+def research_event(research_id: str | ObjectId, event_type: str, event_data: dict = None, *, changes: dict = None):
     event = {
         "type": event_type,
         "data": event_data
     }
     
-    if research := Research.find_by_id(research_id):
-        research.update({
-            "events": research.get("events", []) + [event]
-        })
-        
-        redis_events_pubsub_client.publish(f"research:{str(research_id)}", json.dumps(ResearchResource(research).dump()))
-
+    with stage('event', type=event_type):
+        if logged_event := append_research_event(research_id, event):
+            publish_research_delta(logged_event, changes)
 
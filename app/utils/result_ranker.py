@@ -0,0 +1,100 @@
+import math
+import os
+from collections import Counter
+from typing import Any, Optional
+
+from app.utils.text_utils import normalise_text
+
+# Search results kept for the results analyser, and how much of each snippet it gets to see
+RESULTS_PRERANK_TOP_K = int(os.getenv('RESULTS_PRERANK_TOP_K', 20))
+RESULTS_SNIPPET_CHARS = int(os.getenv('RESULTS_SNIPPET_CHARS', 500))
+
+COMPACT_METADATA_FIELDS = ('file_name', 'court', 'case_number', 'date')
+
+# Diacritic-folded, as tokens are folded before they are compared
+STOPWORDS = frozenset("""
+a aby aj ak ako ale alebo ani avsak by bol bola boli bolo ci co do i ich je jeho jej ju k ked ktora ktore ktori ktory
+ku len na nad nie o od po pod pre pri s sa si so su ta tak tej ten to tu tym uz v vo z za ze zo
+""".split())
+
+# Common Slovak inflectional endings, longest first, stripped so that e.g. "zmluvy" and "zmluvou" match
+SUFFIXES = tuple(sorted("""
+ovia ami ach ych ymi ich imi ym im eho emu ou om ov ej iu ia ie ii a e i o u y
+""".split(), key=len, reverse=True))
+MIN_STEM_LENGTH = 3
+
+
+def stem(token: str) -> str:
+    """Strip a single inflectional ending, never shortening the token below MIN_STEM_LENGTH."""
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenise(text: Optional[str]) -> list[str]:
+    return [stem(token) for token in normalise_text(text).split() if token not in STOPWORDS and not token.isdigit()]
+
+
+class BM25:
+    """Okapi BM25 over a small in-memory corpus of token lists."""
+
+    def __init__(self, documents: list[list[str]], *, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_frequencies = [Counter(document) for document in documents]
+        self.lengths = [len(document) for document in documents]
+        self.average_length = sum(self.lengths) / len(documents) if documents else 0
+
+        document_frequencies = Counter(term for document in self.term_frequencies for term in document)
+        self.idf = {
+            term: math.log(1 + (len(documents) - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequencies.items()
+        }
+
+    def scores(self, query: list[str]) -> list[float]:
+        query_terms = Counter(term for term in query if term in self.idf)
+        scores = []
+        for term_frequency, length in zip(self.term_frequencies, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.average_length) if self.average_length else self.k1
+            score = 0.0
+            for term, query_count in query_terms.items():
+                if frequency := term_frequency.get(term):
+                    score += query_count * self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append(score)
+        return scores
+
+
+def compact_result(result: dict[str, Any], *, snippet_chars: int = RESULTS_SNIPPET_CHARS) -> dict[str, Any]:
+    """Only the content snippet and the metadata the results analyser decides on."""
+    content = (result.get('content') or '').strip()
+    if len(content) > snippet_chars:
+        content = content[:snippet_chars].rsplit(' ', 1)[0] + '…'
+
+    metadata = result.get('metadata') or {}
+    return {
+        'content': content,
+        'metadata': {field: metadata[field] for field in COMPACT_METADATA_FIELDS if metadata.get(field)},
+    }
+
+
+def result_text(result: dict[str, Any]) -> str:
+    metadata = result.get('metadata') or {}
+    return f"{result.get('content') or ''} {metadata.get('court') or ''}"
+
+
+def prerank_results(results: list[dict[str, Any]], *, problem_description: str = None, question: str = None,
+                    search_keyword: str = None, top_k: int = RESULTS_PRERANK_TOP_K) -> list[dict[str, Any]]:
+    """
+    Rank search results by BM25 of their snippets against the research scope and keep the top_k, compacted.
+    The search keyword counts twice as it is what the batch was retrieved for. Ties, including results
+    sharing no term with the scope, keep the vector search order.
+    """
+    results = [result for result in results if isinstance(result, dict)]
+    if len(results) > top_k:
+        query = tokenise(problem_description) + tokenise(question) + 2 * tokenise(search_keyword)
+        scores = BM25([tokenise(result_text(result)) for result in results]).scores(query)
+        ranked = sorted(range(len(results)), key=lambda i: (-scores[i], i))
+        results = [results[i] for i in ranked[:top_k]]
+
+    return [compact_result(result) for result in results]
@@ -0,0 +1,66 @@
+import asyncio
+import hashlib
+import os
+from typing import Any, Awaitable, Callable
+
+import redis
+
+from app.utils.cache import Cache
+from app.utils.logger import setup_logger
+from app.utils.metrics import cache_lookup
+from app.utils.single_flight import single_flight
+from app.utils.text_utils import normalise_text
+
+logger = setup_logger(__name__)
+
+SEARCH_CACHE_TTL_M = int(os.getenv('SEARCH_CACHE_TTL_M', 24 * 60))
+# Failed searches are remembered briefly so a struggling API isn't hammered with the same query
+SEARCH_ERROR_CACHE_TTL_M = int(os.getenv('SEARCH_ERROR_CACHE_TTL_M', 1))
+
+# Searches currently running in this process, shared by identical concurrent requests
+_inflight: dict[str, asyncio.Future] = {}
+
+
+def normalise_query(query: str) -> str:
+    """Lowercased, diacritic-folded, de-duplicated and sorted tokens, so word order and accents don't matter."""
+    return ' '.join(sorted(set(normalise_text(query).split())))
+
+
+def search_cache_key(query: str, n_results: int) -> str:
+    digest = hashlib.sha256(f"{normalise_query(query)}|{n_results}".encode('utf-8')).hexdigest()
+    return f"search_results:{digest}"
+
+
+async def cached_search(query: str, n_results: int, search: Callable[[], Awaitable[dict[str, Any]]]) -> dict[str, Any]:
+    """
+    Get search results from the cache or run `search` once for all concurrent identical queries.
+    Results with an `error` key are cached for SEARCH_ERROR_CACHE_TTL_M only.
+    """
+    key = search_cache_key(query, n_results)
+    if (cached := _cache_get(key)) is not None:
+        return cached
+
+    async def search_and_cache() -> dict[str, Any]:
+        results = await search()
+        _cache_set(key, results, SEARCH_ERROR_CACHE_TTL_M if results.get('error') else SEARCH_CACHE_TTL_M)
+        return results
+
+    return await single_flight(_inflight, key, search_and_cache)
+
+
+def _cache_get(key: str):
+    # An unavailable cache must not fail the search itself
+    try:
+        value = Cache.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Search cache unavailable: {e}")
+        return None
+    cache_lookup('search', value is not None)
+    return value
+
+
+def _cache_set(key: str, value: Any, expire_in_m: int) -> None:
+    try:
+        Cache.set(key, value, expire_in_m)
+    except redis.RedisError as e:
+        logger.warning(f"Search cache unavailable: {e}")
@@ -0,0 +1,38 @@
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+from app.exceptions.fetch_cancelled import FetchCancelled
+
+T = TypeVar('T')
+
+
+async def single_flight(inflight: dict[str, asyncio.Future], key: str, fetch: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run `fetch` once for all concurrent callers of the same key, `inflight` holds the running fetches.
+    A cancelled caller only cancels its own wait: when the fetching one is cancelled, e.g. by its timeout,
+    the first waiter to resume fetches the value instead.
+    """
+    while (running := inflight.get(key)) is not None:
+        try:
+            return await asyncio.shield(running)
+        except FetchCancelled:
+            continue
+
+    future = asyncio.get_running_loop().create_future()
+    inflight[key] = future
+    try:
+        value = await fetch()
+        future.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        # Cancelling the shared future would cancel every waiter too
+        future.set_exception(FetchCancelled(key))
+        future.exception()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Retrieved so a failure nobody else awaited isn't reported as never retrieved
+        future.exception()
+        raise
+    finally:
+        del inflight[key]
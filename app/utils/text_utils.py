@@ -1,4 +1,5 @@
 import re
+import unicodedata
 
 
 def remove_markdown(text):
@@ -22,4 +23,14 @@ def remove_markdown(text):
 def count_words(text: str):
    # Split the text into words and count them
    words = text.split()
-   return len(words)
\ No newline at end of file
+   return len(words)
+
+
+def fold_diacritics(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def normalise_text(text: str | None) -> str:
+    """Lowercase, strip diacritics and punctuation and collapse whitespace."""
+    return ' '.join(re.findall(r'\w+', fold_diacritics(text or '').lower()))
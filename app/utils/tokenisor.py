@@ -1,10 +1,30 @@
+import base64
+import functools
+import json
 import math
+import time
 from io import BytesIO
-from typing import Union
+from typing import Any, Optional, Union
 
 import tiktoken
 from PIL import Image
 
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_ENCODING = "o200k_base"
+# Roughly what a chat message costs on top of its content, and the priming of the reply
+MESSAGE_OVERHEAD_TOKENS = 3
+REPLY_OVERHEAD_TOKENS = 3
+# Characters per token of Slovak text, used when an encoding can't be loaded (e.g. offline)
+FALLBACK_CHARS_PER_TOKEN = 3
+# Seconds before an encoding that failed to load is tried again
+ENCODING_RETRY_S = 60
+
+_encodings: dict[str, tiktoken.Encoding] = {}
+_encoding_failed_at: dict[str, float] = {}
+
 
 # o200k_base	• GPT-4o models (gpt-4o)
 # cl100k_base	• GPT-4 models (gpt-4)
@@ -13,10 +33,108 @@ from PIL import Image
 # • Embeddings models (text-embedding-ada-002, text-embedding-3-large, text-embedding-3-small)
 # • Fine-tuned models (ft:gpt-4, ft:gpt-3.5-turbo, ft:davinci-002, ft:babbage-002)
 
-def num_tokens_from_string(string: str, encoding_name: str = "o200k_base") -> int:
-    encoding = tiktoken.get_encoding(encoding_name)
-    num_tokens = len(encoding.encode(string))
-    return num_tokens
+def get_encoding(encoding_name: str = DEFAULT_ENCODING) -> Optional[tiktoken.Encoding]:
+    """
+    Encoding loaded once per process. None if it can't be loaded, e.g. when the BPE file can't be
+    downloaded, in which case token counts are estimated from the length of the text. A failed load is
+    retried after ENCODING_RETRY_S, so a network failure at startup doesn't last until a restart.
+    """
+    if (encoding := _encodings.get(encoding_name)) is not None:
+        return encoding
+    if time.monotonic() - _encoding_failed_at.get(encoding_name, -math.inf) < ENCODING_RETRY_S:
+        return None
+
+    try:
+        encoding = tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        _encoding_failed_at[encoding_name] = time.monotonic()
+        logger.warning(f"Tokeniser {encoding_name} unavailable, estimating token counts: {e}")
+        return None
+    _encodings[encoding_name] = encoding
+    return encoding
+
+
+@functools.lru_cache(maxsize=None)
+def encoding_name_for_model(model: Optional[str]) -> str:
+    if not model:
+        return DEFAULT_ENCODING
+    try:
+        return tiktoken.encoding_name_for_model(model)
+    except KeyError:
+        return DEFAULT_ENCODING
+
+
+def num_tokens_from_string(string: str, encoding_name: str = DEFAULT_ENCODING) -> int:
+    if (encoding := get_encoding(encoding_name)) is None:
+        return math.ceil(len(string) / FALLBACK_CHARS_PER_TOKEN)
+    return len(encoding.encode_ordinary(string))
+
+
+def count_tokens(strings: list[str], encoding_name: str = DEFAULT_ENCODING, *, num_threads: int = 8) -> list[int]:
+    """Token counts of many strings, encoded in parallel threads by tiktoken."""
+    if (encoding := get_encoding(encoding_name)) is None:
+        return [math.ceil(len(string) / FALLBACK_CHARS_PER_TOKEN) for string in strings]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(strings, num_threads=num_threads)]
+
+
+def truncate_to_tokens(string: str, max_tokens: int, encoding_name: str = DEFAULT_ENCODING) -> str:
+    """The beginning of a string that fits in max_tokens."""
+    if max_tokens <= 0:
+        return ''
+    if (encoding := get_encoding(encoding_name)) is None:
+        return string[:max_tokens * FALLBACK_CHARS_PER_TOKEN]
+    tokens = encoding.encode_ordinary(string)
+    return string if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+
+def _data_url_bytes(data_url: str) -> bytes:
+    return base64.b64decode(data_url.split(',', 1)[-1])
+
+
+def count_part_tokens(part: Any, encoding_name: str = DEFAULT_ENCODING) -> int:
+    """
+    Tokens of one content part of an agent input: input_text, input_file (PDF as a data URL),
+    input_image or any other value, counted as its JSON.
+    """
+    if isinstance(part, str):
+        return num_tokens_from_string(part, encoding_name)
+    if hasattr(part, 'model_dump_json'):
+        return num_tokens_from_string(part.model_dump_json(), encoding_name)
+    if not isinstance(part, dict):
+        return num_tokens_from_string(json.dumps(part, ensure_ascii=False, default=str), encoding_name)
+
+    if part.get('type') == 'input_text':
+        return num_tokens_from_string(part.get('text') or '', encoding_name)
+    if part.get('type') == 'input_file' and part.get('file_data'):
+        # Imported here, PDF parsing is only needed for file parts
+        from app.utils.pdf_text import estimate_pdf_tokens
+        return estimate_pdf_tokens(_data_url_bytes(part['file_data']))
+    if part.get('type') == 'input_image' and (image_url := part.get('image_url') or '').startswith('data:'):
+        return calculate_image_tokens(BytesIO(_data_url_bytes(image_url)), part.get('detail') or 'high')
+    return num_tokens_from_string(json.dumps(part, ensure_ascii=False, default=str), encoding_name)
+
+
+def estimate_input_tokens(agent_input: str | list[dict[str, Any]], *, model: str = None) -> int:
+    """
+    Estimated prompt tokens of an agent input as passed to Runner.run: a string or a list of messages,
+    each with a string or a list of content parts. Instructions and tool schemas are not included.
+    """
+    encoding_name = encoding_name_for_model(model)
+    if isinstance(agent_input, str):
+        return num_tokens_from_string(agent_input, encoding_name) + MESSAGE_OVERHEAD_TOKENS + REPLY_OVERHEAD_TOKENS
+
+    texts, tokens = [], REPLY_OVERHEAD_TOKENS
+    for message in agent_input:
+        tokens += MESSAGE_OVERHEAD_TOKENS
+        content = message.get('content') if isinstance(message, dict) else message
+        for part in content if isinstance(content, list) else [content]:
+            if isinstance(part, str):
+                texts.append(part)
+            elif isinstance(part, dict) and part.get('type') == 'input_text':
+                texts.append(part.get('text') or '')
+            else:
+                tokens += count_part_tokens(part, encoding_name)
+    return tokens + sum(count_tokens(texts, encoding_name))
 
 
 def calculate_image_tokens(image_path: Union[str, BytesIO], detail: str = "high") -> int:
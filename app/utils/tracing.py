@@ -0,0 +1,232 @@
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Finished research traces, one OTLP/JSON ExportTraceServiceRequest per line, as the OpenTelemetry
+# collector's file exporter writes them, so they can be loaded into any OTLP compatible viewer
+TRACES_FILE = os.getenv('TRACES_FILE', os.path.join(os.getcwd(), 'logs', 'traces.jsonl'))
+# The file is rotated to traces.jsonl.1 … .{TRACES_FILE_BACKUPS} once it exceeds this size, 0 to not export traces
+TRACES_FILE_MAX_MB = int(os.getenv('TRACES_FILE_MAX_MB', 50))
+TRACES_FILE_BACKUPS = int(os.getenv('TRACES_FILE_BACKUPS', 3))
+SERVICE_NAME = os.getenv('SERVICE_NAME', 'research-worker')
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+_export_lock = threading.Lock()
+
+
+@dataclass
+class Span:
+    tracer: 'Tracer'
+    name: str
+    span_id: str
+    parent_span_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    kind: int = SPAN_KIND_INTERNAL
+    error: Optional[str] = None
+
+    @property
+    def duration_s(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException | str] = None) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = str(error) or type(error).__name__
+
+    def otlp(self) -> dict[str, Any]:
+        span = {
+            'traceId': self.tracer.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or time.time_ns()),
+            'attributes': otlp_attributes(self.attributes),
+            'status': {'code': STATUS_ERROR, 'message': self.error} if self.error else {'code': STATUS_OK},
+        }
+        if self.parent_span_id:
+            span['parentSpanId'] = self.parent_span_id
+        return span
+
+
+class Tracer:
+    """
+    Spans of one research. The span of the running stage is held in a context variable, so stages started
+    inside it, also in other asyncio tasks, become its children. Agent hooks can't set it, they run in tasks
+    of their own, so they register their agent, model call and tool spans here, keyed by their run, and
+    stages inside a tool find their parent by the tool call id, see `stage`.
+    """
+
+    def __init__(self, research_id: str):
+        self.research_id = research_id
+        self.trace_id = secrets.token_hex(16)
+        self.spans: list[Span] = []
+        self.open_spans: dict[Any, Span] = {}
+
+    def start_span(self, name: str, parent: Optional[Span] = None, *, kind: int = SPAN_KIND_INTERNAL,
+                   **attributes) -> Span:
+        span = Span(self, name, secrets.token_hex(8), parent.span_id if parent else None, time.time_ns(),
+                    attributes=attributes, kind=kind)
+        self.spans.append(span)
+        return span
+
+    def open(self, key: Any, name: str, parent: Optional[Span] = None, **attributes) -> Span:
+        """Start a span ended later by `close` with the same key, for spans started and ended in separate hooks."""
+        span = self.open_spans[key] = self.start_span(name, parent, **attributes)
+        return span
+
+    def close(self, key: Any, error: Optional[str] = None, **attributes) -> Optional[Span]:
+        if span := self.open_spans.pop(key, None):
+            span.set(**attributes)
+            span.end(error)
+        return span
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Count, total and longest duration of the spans per name. Stages run concurrently, so totals overlap."""
+        summary: dict[str, dict[str, float]] = {}
+        for span in self.spans:
+            stats = summary.setdefault(span.name, {'count': 0, 'total_s': 0.0, 'max_s': 0.0})
+            stats['count'] += 1
+            stats['total_s'] += span.duration_s
+            stats['max_s'] = max(stats['max_s'], span.duration_s)
+        return summary
+
+    def otlp(self) -> dict[str, Any]:
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': otlp_attributes({'service.name': SERVICE_NAME})},
+                'scopeSpans': [{
+                    'scope': {'name': 'app.utils.tracing'},
+                    'spans': [span.otlp() for span in self.spans],
+                }],
+            }],
+        }
+
+    def export(self, path: str = TRACES_FILE) -> None:
+        if not TRACES_FILE_MAX_MB:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        line = json.dumps(self.otlp(), ensure_ascii=False, default=str)
+        with _export_lock:
+            _rotate(path, TRACES_FILE_MAX_MB * 1024 * 1024, TRACES_FILE_BACKUPS)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+def _rotate(path: str, max_bytes: int, backups: int) -> None:
+    """Shift path to path.1, path.1 to path.2 and so on once it exceeds max_bytes, dropping the oldest."""
+    try:
+        if os.path.getsize(path) < max_bytes:
+            return
+    except FileNotFoundError:
+        return
+    for i in range(backups - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    if backups:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+
+def otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    values = []
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            values.append({'key': key, 'value': {'boolValue': value}})
+        elif isinstance(value, int):
+            values.append({'key': key, 'value': {'intValue': str(value)}})
+        elif isinstance(value, float):
+            values.append({'key': key, 'value': {'doubleValue': value}})
+        else:
+            values.append({'key': key, 'value': {'stringValue': str(value)}})
+    return values
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def research_trace(research_id: str, **attributes) -> Iterator[Optional[Tracer]]:
+    """Trace a research: its root span is the parent of every stage, the trace is exported when it ends."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+
+    tracer = Tracer(str(research_id))
+    root = tracer.start_span('research', research_id=str(research_id), **attributes)
+    token = _current_span.set(root)
+    try:
+        yield tracer
+    except BaseException as e:
+        root.end(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        root.end()
+        # Spans of hooks that never ran their end hook, e.g. when the run failed
+        for key in list(tracer.open_spans):
+            tracer.close(key, error='not ended')
+        try:
+            tracer.export()
+        except OSError as e:
+            logger.warning(f"Failed to export the trace of research {research_id}: {e}")
+
+
+@contextmanager
+def stage(name: str, context: Any = None, *, kind: int = SPAN_KIND_INTERNAL, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Span of a pipeline stage, child of the running stage, or of the tool call when given the tool's context.
+    Does nothing outside a research trace.
+    """
+    parent = current_span()
+    if tool_call_id := getattr(context, 'tool_call_id', None):
+        parent = parent.tracer.open_spans.get(('tool', tool_call_id), parent) if parent else None
+    if parent is None:
+        yield None
+        return
+
+    span = parent.tracer.start_span(name, parent, kind=kind, **attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.end(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+def format_trace_summary(tracer: Tracer, limit: int = 15) -> str:
+    stages = sorted(tracer.summary().items(), key=lambda item: -item[1]['total_s'])[:limit]
+    return '\n'.join(
+        f"{name}: {stats['count']}x, {stats['total_s']:.2f}s total, {stats['max_s']:.2f}s max" for name, stats in stages
+    )
@@ -0,0 +1,73 @@
+import re
+from typing import Any, Optional
+
+from agents import Agent
+from agents.models import get_default_model
+from agents.usage import Usage
+from bson import ObjectId
+
+from app.models.research_model import Research
+from app.utils.cost_utils import calculate_llm_costs
+
+USAGE_FIELDS = ('requests', 'input_tokens', 'cached_tokens', 'output_tokens', 'reasoning_tokens', 'latency_ms', 'cost')
+
+
+def agent_model_name(agent: Agent) -> str:
+    if isinstance(agent.model, str):
+        return agent.model
+    return getattr(agent.model, 'model', None) or get_default_model()
+
+
+def usage_increments(usage: Usage, model: str, latency_s: float) -> dict[str, Any]:
+    return {
+        'requests': usage.requests or 1,
+        'input_tokens': usage.input_tokens,
+        'cached_tokens': usage.input_tokens_details.cached_tokens or 0,
+        'output_tokens': usage.output_tokens,
+        'reasoning_tokens': usage.output_tokens_details.reasoning_tokens or 0,
+        'latency_ms': round(latency_s * 1000),
+        'cost': calculate_llm_costs(usage, model),
+    }
+
+
+def record_llm_usage(research_id: Optional[str | ObjectId], agent_name: str, model: str, usage: Usage,
+                     latency_s: float) -> None:
+    """
+    Add the usage of one model call to the research's totals and to those of the agent that made it,
+    atomically, as agents of a research call the model concurrently.
+    """
+    if not research_id:
+        return
+    research_id = ObjectId(research_id) if isinstance(research_id, str) else research_id
+    # Agent names end up in a field path
+    agent_name = re.sub(r'[.$]', '_', agent_name)
+
+    increments = usage_increments(usage, model, latency_s)
+    Research.find_one_and_update(
+        {'_id': research_id},
+        {'$inc': {
+            **{f'usage.total.{field}': value for field, value in increments.items()},
+            **{f'usage.agents.{agent_name}.{field}': value for field, value in increments.items()},
+        }},
+        projection={'_id': True},
+    )
+
+
+def cached_token_rate(totals: Optional[dict]) -> float:
+    """Share of input tokens served from the provider's prompt cache."""
+    input_tokens = (totals or {}).get('input_tokens') or 0
+    return (totals.get('cached_tokens') or 0) / input_tokens if input_tokens else 0.0
+
+
+def format_usage(usage: Optional[dict]) -> str:
+    """One line per agent, the most expensive first."""
+    if not usage:
+        return "No LLM usage recorded"
+    agents = sorted((usage.get('agents') or {}).items(), key=lambda item: -(item[1].get('cost') or 0))
+    return '\n'.join(
+        f"{name}: {totals.get('requests', 0)} requests, {totals.get('input_tokens', 0)} input "
+        f"({totals.get('cached_tokens', 0)} cached, {cached_token_rate(totals):.0%}), {totals.get('output_tokens', 0)} output "
+        f"({totals.get('reasoning_tokens', 0)} reasoning) tokens, {totals.get('latency_ms', 0) / 1000:.1f}s, "
+        f"${totals.get('cost', 0):.4f}"
+        for name, totals in [('total', usage.get('total') or {}), *agents]
+    )
@@ -0,0 +1,54 @@
+import pytest
+
+from app.utils.agent_input import InputSection, assemble_input, fit_items, item_tokens
+
+ITEMS = [f"Rozhodnutie {i}: súd priznal náhradu škody podľa § 420 Občianskeho zákonníka. " * (i % 4 + 1)
+         for i in range(30)]
+
+
+@pytest.mark.parametrize('max_tokens', [0, 10, 100, 500, 100000])
+def test_fit_items_stays_within_budget(max_tokens):
+    kept, dropped, used = fit_items(ITEMS, max_tokens)
+
+    assert used == sum(item_tokens(kept)) <= max_tokens
+    assert kept + dropped == ITEMS
+    if dropped:
+        assert used + item_tokens(dropped[:1])[0] > max_tokens
+
+
+def sections() -> list[InputSection]:
+    return [
+        InputSection('scope', ["Náhrada škody spôsobenej nájomcom na prenajatom byte."], required=True),
+        InputSection('history', ITEMS, title="Previous results:"),
+        InputSection('cases', list(reversed(ITEMS)), priority=1),
+        InputSection('empty', [], empty="Nothing found yet."),
+        InputSection('instructions', ["Vyber relevantné rozhodnutia."], required=True),
+    ]
+
+
+@pytest.mark.parametrize('max_tokens', [60, 200, 1000, 3000, 100000])
+def test_assembled_input_stays_within_budget(max_tokens):
+    assembled = assemble_input(sections(), max_tokens)
+
+    assert assembled.tokens <= max_tokens
+    assert assembled == assemble_input(sections(), max_tokens)
+
+
+def test_sections_are_dropped_by_priority_and_noted():
+    assembled = assemble_input(sections(), 1000)
+    texts = [message['content'][0]['text'] for message in assembled.messages]
+
+    assert 'cases' in assembled.dropped
+    assert assembled.dropped.get('history', 0) < assembled.dropped['cases']
+    assert any('further entries left out' in text for text in texts)
+    assert texts[0].startswith("Náhrada škody") and texts[-1] == "Vyber relevantné rozhodnutia."
+    assert "Nothing found yet." in texts
+
+
+def test_required_section_is_truncated_not_dropped():
+    scope = "Náhrada škody. " * 2000
+    assembled = assemble_input([InputSection('scope', [scope], required=True)], 300)
+
+    assert assembled.truncated == ['scope']
+    assert assembled.tokens <= 300
+    assert scope.startswith(assembled.messages[0]['content'][0]['text'])
@@ -0,0 +1,51 @@
+from typing import ClassVar
+
+from app.models.model_base import ModelBase
+
+
+def make_models():
+    class Parent(ModelBase):
+        kind: ClassVar[str] = 'parent'
+        name: str = None
+
+    class Child(Parent):
+        aliases: ClassVar[list[str]] = []
+        age: int = 0
+
+    return Parent, Child
+
+
+def test_schema_is_compiled_once_per_class():
+    Parent, Child = make_models()
+
+    assert Parent.schema() is Parent.schema()
+    assert Child.schema() is Child.schema()
+    assert Parent.schema() is not Child.schema()
+
+
+def test_subclass_schema_does_not_leak_into_parent():
+    Parent, Child = make_models()
+    # The subclass first, so a schema cached on the parent would be found through inheritance
+    child_fields = Child.schema().fields
+    parent_fields = Parent.schema().fields
+
+    assert 'age' in child_fields and 'name' in child_fields
+    assert 'age' not in parent_fields
+    assert set(ModelBase.schema().fields) == {'_id', 'created_at', 'updated_at'}
+
+
+def test_class_vars_are_not_fields():
+    _, Child = make_models()
+    schema = Child.schema()
+
+    for class_var in ('kind', 'aliases', 'protected', 'searchable'):
+        assert class_var not in schema.field_set
+
+
+def test_protected_fields_are_not_fillable():
+    _, Child = make_models()
+    schema = Child.schema()
+
+    assert set(schema.fillable) == {'name', 'age'}
+    assert schema.protected == frozenset(ModelBase.protected)
+    assert schema.defaults['age'] == 0
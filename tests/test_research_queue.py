@@ -0,0 +1,116 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from app.utils.research_queue import ResearchQueueConsumer
+
+VISIBILITY_TIMEOUT_MS = 100
+
+
+@pytest.fixture
+def client():
+    return fakeredis.FakeAsyncRedis()
+
+
+def consumer(client, name: str) -> ResearchQueueConsumer:
+    return ResearchQueueConsumer(client, name, stream='test:stream', group='test_workers',
+                                 visibility_timeout_ms=VISIBILITY_TIMEOUT_MS)
+
+
+async def enqueue(client, research_id: str) -> None:
+    await client.xadd('test:stream', {'research_id': research_id})
+
+
+def test_acked_job_is_not_pending(client):
+    async def run():
+        worker = consumer(client, 'worker-1')
+        await worker.setup()
+        await enqueue(client, 'research-1')
+
+        job, = await worker.read(block_ms=10)
+        assert job.research_id == 'research-1' and not job.reclaimed
+        assert await worker.acquire(job)
+        assert await worker.pending() == 1
+
+        await worker.ack(job)
+        assert await worker.pending() == 0
+        assert await worker.locked(['research-1']) == 0
+
+    asyncio.run(run())
+
+
+def test_locked_research_is_not_acquired_twice(client):
+    async def run():
+        worker, other = consumer(client, 'worker-1'), consumer(client, 'worker-2')
+        await worker.setup()
+        await enqueue(client, 'research-1')
+        await enqueue(client, 'research-1')
+
+        first, second = await worker.read(count=2, block_ms=10)
+        assert await worker.acquire(first)
+        assert not await other.acquire(second)
+        assert await worker.locked(['research-1', 'research-2']) == 1
+
+        await worker.release(first)
+        assert await other.acquire(second)
+        await other.release(second)
+
+    asyncio.run(run())
+
+
+def test_job_of_a_stopped_worker_is_reclaimed(client):
+    async def run():
+        crashed, worker = consumer(client, 'worker-1'), consumer(client, 'worker-2')
+        await crashed.setup()
+        await enqueue(client, 'research-1')
+
+        job, = await crashed.read(block_ms=10)
+        assert await crashed.acquire(job)
+        # Crashed: it neither acks nor heartbeats anymore
+        job.heartbeat_task.cancel()
+        assert await worker.reclaim() == []
+
+        await asyncio.sleep(VISIBILITY_TIMEOUT_MS * 1.5 / 1000)
+        reclaimed, = await worker.reclaim()
+        assert reclaimed.message_id == job.message_id and reclaimed.reclaimed
+        # The crashed worker's lock expired with the visibility timeout
+        assert await worker.acquire(reclaimed)
+        await worker.ack(reclaimed)
+        assert await worker.pending() == 0
+
+    asyncio.run(run())
+
+
+def test_heartbeat_keeps_a_running_job(client):
+    async def run():
+        running, worker = consumer(client, 'worker-1'), consumer(client, 'worker-2')
+        await running.setup()
+        await enqueue(client, 'research-1')
+
+        job, = await running.read(block_ms=10)
+        assert await running.acquire(job)
+        await asyncio.sleep(VISIBILITY_TIMEOUT_MS * 1.5 / 1000)
+        assert await worker.reclaim() == []
+        await running.ack(job)
+
+    asyncio.run(run())
+
+
+def test_requeued_job_goes_to_the_end_of_the_stream(client):
+    async def run():
+        worker = consumer(client, 'worker-1')
+        await worker.setup()
+        await enqueue(client, 'research-1')
+        await enqueue(client, 'research-2')
+
+        job, = await worker.read(block_ms=10)
+        assert await worker.acquire(job)
+        await worker.requeue(job)
+
+        assert job.heartbeat_task is None
+        assert await worker.locked(['research-1']) == 0
+        assert await worker.pending() == 0
+        assert [job.research_id for job in await worker.read(count=10, block_ms=10)] == ['research-2', 'research-1']
+
+    asyncio.run(run())